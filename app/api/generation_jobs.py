@@ -0,0 +1,45 @@
+from fastapi import APIRouter, HTTPException
+
+from app.schemas.text_reports import LLMRequest
+from app.schemas.generation_jobs import GenerationJobCreated, GenerationJobInfo, GenerationJobResult
+from app.services.generation_jobs.generation_jobs import generation_job_manager, GenerationJobsFullError
+from app.services.llm_service import llm_service as llmService
+
+
+router = APIRouter(
+    prefix="/textreports/jobs",
+    tags=["textreports jobs"]
+)
+
+
+@router.post("/section", status_code=202)
+async def submit_section_job(request: LLMRequest, section_code: str = "1.7.", mode: str | None = None) -> GenerationJobCreated:
+    """Постановка генерации раздела в очередь. Возвращает ID задачи сразу.
+    mode: single / map_reduce, как у /textreports/report/generate/section"""
+    if mode is not None and mode not in llmService.GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown generation mode: {mode}")
+    try:
+        job = generation_job_manager.submit(request, section_code, mode=mode)
+    except GenerationJobsFullError as e:
+        raise HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "60"})
+    return GenerationJobCreated(id=job.id, status=job.status)
+
+
+@router.get("/{job_id}")
+async def get_job(job_id: str) -> GenerationJobInfo:
+    """Статус задачи и разбивка времени по этапам"""
+    job = generation_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    return job.info()
+
+
+@router.get("/{job_id}/result")
+async def get_job_result(job_id: str) -> GenerationJobResult:
+    """Результат генерации. Пока задача не завершена, result пустой"""
+    job = generation_job_manager.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Задача не найдена")
+    if job.status == "failed":
+        raise HTTPException(status_code=500, detail=job.error)
+    return GenerationJobResult(id=job.id, status=job.status, result=job.result)
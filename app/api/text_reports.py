@@ -1,13 +1,23 @@
-from fastapi import APIRouter, Depends, BackgroundTasks
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, BackgroundTasks, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse, PlainTextResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 import io
 
-from app.schemas.text_reports import TableStandart, LLMResponse, LLMRequest
+from app.schemas.text_reports import TableStandart, LLMResponse, LLMRequest, LLMCacheStats, LLMPromptCacheStats, LLMBackendStats, LLMQueueStats, ReportGenerateResponse, FinalResultsState, ExamCubeState
 from app.db.connect_db import get_async_session
 from app.services.table_rep_manager import table_rep_manager as tableRepManager
 from app.services.llm_service import llm_service as llmService
+from app.services.llm_service import promt as promtService
+from app.services.llm_service.generation_cache import generation_cache
+from app.services.llm_service.prompt_cache_stats import prompt_cache_stats
+from app.services.llm_service.llama_client import llama_client
+from app.services.llm_service.llm_scheduler import llm_scheduler, Priority
+from app.services.llm_service.llm_metrics import llm_metrics
 from app.services.report_to_file import get_file_by_data as getFileByData
+from app.services.report_pipeline import report_pipeline as reportPipeline
+from app.services.final_results.final_results import final_results_refresher
+from app.services.exam_cube.exam_cube import exam_cube_builder
+from app.utils.http.disconnect import cancel_on_disconnect
 
 
 router = APIRouter(
@@ -15,16 +25,68 @@ router = APIRouter(
     tags=["textreports"]
 )
 
+SSE_HEADERS = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
 
 # Запросы в БД !!!ТЕСТОВОЕ!!!
 @router.post("/db/test/query/all")
 async def test_querry(section_num: int, table_num: int, exam_year: int = 2025, exam_type_id: int = 4, subject_id: int = 2, session: AsyncSession = Depends(get_async_session)) -> TableStandart:
     return await tableRepManager.get_table_by_section(session, section_num, table_num, year=exam_year, exam_type_id=exam_type_id, subject_id=subject_id)
 
+@router.get("/db/final-results")
+async def get_final_results_state() -> FinalResultsState:
+    """Состояние представления итоговых результатов: создано ли, число строк, последний пересчёт"""
+    return await final_results_refresher.state()
+
+@router.post("/db/final-results/refresh", status_code=202)
+async def refresh_final_results() -> FinalResultsState:
+    """Запускает пересчёт представления итоговых результатов в фоне (например, после загрузки новых результатов)"""
+    final_results_refresher.trigger()
+    return await final_results_refresher.state()
+
+@router.get("/db/cube")
+async def get_exam_cube_state() -> ExamCubeState:
+    """Состояние куба итоговых результатов: собранные годы, последняя сборка"""
+    return await exam_cube_builder.state()
+
+@router.post("/db/cube/build", status_code=202)
+async def build_exam_cube(years: list[int] = Query(...)) -> ExamCubeState:
+    """Запускает пересборку куба итоговых результатов за годы в фоне (например, после загрузки результатов года)"""
+    if not exam_cube_builder.enabled:
+        raise HTTPException(status_code=409, detail="Exam cube is disabled (PG_EXAM_CUBE=0)")
+    exam_cube_builder.trigger(years)
+    return await exam_cube_builder.state()
+
 # Формирование раздела
 @router.post("/report/generate/section")
-async def generate_sections(request: LLMRequest, section_code: str = "1.7.", session: AsyncSession = Depends(get_async_session)) -> LLMResponse:
-    return await llmService.get_generated_text_on_subject_by_section(session, request, section_code)
+async def generate_sections(request: LLMRequest, http_request: Request, section_code: str = "1.7.", mode: str | None = None, session: AsyncSession = Depends(get_async_session)) -> LLMResponse:
+    """Формирование раздела. mode: single - один промт со всеми таблицами, map_reduce - выводы по группам таблиц и итоговый промт
+    (по умолчанию - map_reduce для разделов из LLAMA_MAP_REDUCE_SECTIONS)"""
+    if mode is not None and mode not in llmService.GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown generation mode: {mode}")
+    return await cancel_on_disconnect(http_request, llmService.get_generated_text_on_subject_by_section(session, request, section_code, mode=mode))
+
+@router.post("/report/generate/section/stream")
+async def generate_sections_stream(request: LLMRequest, section_code: str = "1.7.", session: AsyncSession = Depends(get_async_session)) -> StreamingResponse:
+    """Формирование раздела с потоковой отдачей текста (Server-Sent Events)"""
+    llm_scheduler.check_admission(Priority.BULK)
+    data = await promtService.get_report_generate_data(session=session, request=request, section_code=section_code)
+    return StreamingResponse(
+        llmService.stream_text_by_data(data, slot_key=section_code),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.post("/report/generate")
+async def generate_report(request: LLMRequest, http_request: Request, section_codes: list[str] = Query(["1.7.", "2.5."]), mode: str | None = None) -> ReportGenerateResponse:
+    """Формирование нескольких разделов отчёта: данные всех разделов собираются параллельно, генерация начинается по готовности промта.
+    mode: как у /textreports/report/generate/section, по умолчанию - режим каждого раздела (LLAMA_MAP_REDUCE_SECTIONS)"""
+    if mode is not None and mode not in llmService.GENERATION_MODES:
+        raise HTTPException(status_code=400, detail=f"Unknown generation mode: {mode}")
+    try:
+        return await cancel_on_disconnect(http_request, reportPipeline.generate_report(request, section_codes, mode=mode))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 @router.post("/file")
 async def get_file(section_num: int, exam_year: int = 2025, exam_type_id: int = 4, subject_id: int = 2, session: AsyncSession = Depends(get_async_session), background_tasks: BackgroundTasks = BackgroundTasks()):
@@ -46,5 +108,46 @@ def cleanup_buffer(buffer: io.BytesIO):
         print(f"Error cleaning buffer: {e}")
 
 @router.post("/generate")
-async def generate_text(request: str) -> LLMResponse:
-    return await llmService.get_text_by_request(request)
\ No newline at end of file
+async def generate_text(request: str, http_request: Request) -> LLMResponse:
+    return await cancel_on_disconnect(http_request, llmService.get_text_by_request(request))
+
+@router.post("/generate/stream")
+async def generate_text_stream(request: str) -> StreamingResponse:
+    """Генерация без системного промпта с потоковой отдачей текста (Server-Sent Events)"""
+    llm_scheduler.check_admission(Priority.INTERACTIVE)
+    return StreamingResponse(
+        llmService.stream_text_by_request(request),
+        media_type="text/event-stream",
+        headers=SSE_HEADERS
+    )
+
+@router.get("/llm/cache/stats")
+async def get_llm_cache_stats() -> LLMCacheStats:
+    """Статистика кэша результатов генерации"""
+    return await generation_cache.stats()
+
+@router.delete("/llm/cache")
+async def clear_llm_cache() -> LLMCacheStats:
+    """Очистка кэша результатов генерации"""
+    await generation_cache.clear()
+    return await generation_cache.stats()
+
+@router.get("/llm/prompt-cache/stats")
+async def get_llm_prompt_cache_stats() -> LLMPromptCacheStats:
+    """Переиспользование префикса промта в llama.cpp и сэкономленное время префилла"""
+    return prompt_cache_stats.stats()
+
+@router.get("/llm/backends")
+async def get_llm_backends() -> list[LLMBackendStats]:
+    """Состояние серверов llama.cpp: здоровье, занятость слотов, исключение из ротации"""
+    return llama_client.router.stats()
+
+@router.get("/llm/queue")
+async def get_llm_queue() -> LLMQueueStats:
+    """Состояние очереди к LLM: занятые места, ожидающие, оценка ожидания"""
+    return llm_scheduler.stats()
+
+@router.get("/llm/metrics", response_class=PlainTextResponse)
+async def get_llm_metrics() -> str:
+    """Гистограммы очереди, префилла и декодирования по разделам и размеру промта (формат Prometheus)"""
+    return llm_metrics.render()
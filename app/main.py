@@ -1,9 +1,56 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+import asyncio
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
 
-from app.api import qdrant, text_reports
+from app.api import qdrant, text_reports, generation_jobs
+from app.services.llm_service.llama_client import llama_client
+from app.services.llm_service.llm_scheduler import LLMQueueFullError
+from app.services.llm_service.promt import PromtDataTimeoutError
+from app.services.generation_jobs.generation_jobs import generation_job_manager
+from app.services.artifact_recorder.artifact_recorder import artifact_recorder
+from app.services.qdrant_service.section_examples import section_examples
+from app.services.final_results.final_results import final_results_refresher
+from app.services.exam_cube.exam_cube import exam_cube_builder
 
 
-app = FastAPI(title="Heavy Class Demo")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Открываем пул соединений с llama.cpp и запускаем обработчиков задач генерации на всё время работы приложения.
+    Разделы отчётов из Qdrant загружаем в память заранее, чтобы первая генерация не ждала Qdrant"""
+    artifact_recorder.start()
+    await asyncio.to_thread(section_examples.load)
+    await llama_client.start()
+    await generation_job_manager.start()
+    await final_results_refresher.start()
+    await exam_cube_builder.start()
+    yield
+    await exam_cube_builder.close()
+    await final_results_refresher.close()
+    await generation_job_manager.close()
+    await llama_client.close()
+    artifact_recorder.close()
+
+
+app = FastAPI(title="Heavy Class Demo", lifespan=lifespan)
+
+
+@app.exception_handler(LLMQueueFullError)
+async def llm_queue_full_handler(request: Request, exc: LLMQueueFullError) -> JSONResponse:
+    """Очередь к LLM заполнена: отказываем сразу, подсказывая, когда повторить"""
+    return JSONResponse(
+        status_code=429,
+        content={"detail": "Очередь генерации заполнена, повторите запрос позже"},
+        headers={"Retry-After": str(exc.retry_after)}
+    )
+
+
+
+@app.exception_handler(PromtDataTimeoutError)
+async def promt_data_timeout_handler(request: Request, exc: PromtDataTimeoutError) -> JSONResponse:
+    """Данные для промта не собраны за отведённое время"""
+    return JSONResponse(status_code=504, content={"detail": str(exc)})
 
 app.include_router(qdrant.router)
 app.include_router(text_reports.router)
+app.include_router(generation_jobs.router)
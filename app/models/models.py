@@ -404,3 +404,18 @@ class WorkPlansCompetencies(Base):
     __table_args__ = (
         UniqueConstraint("competencies_id", "work_plan_id", name='uniq_workplanCompet'),
     )
+
+
+class LastExamResults(Base):
+    """Служебная таблица: последние попытки участников (по одной на участника и схему экзамена),
+    материализуемые менеджерами запросов разделов один раз на окно лет и тип экзамена.
+    UNLOGGED - содержимое можно пересчитать, журнал WAL на него не тратится"""
+    __tablename__ = 'last_exam_results'
+
+    run_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    exam_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    created_at: Mapped[datetime] = mapped_column(TIMESTAMP, nullable=False, server_default=func.now())
+    
+    __table_args__ = (
+        {"prefixes": ["UNLOGGED"]},
+    )
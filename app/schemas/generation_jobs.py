@@ -0,0 +1,33 @@
+from pydantic import BaseModel
+
+from app.schemas.text_reports import LLMResponse
+
+
+class GenerationJobTimings(BaseModel):
+    queued: float = 0
+    promt: float = 0
+    llm: float = 0
+    total: float = 0
+
+
+class GenerationJobCreated(BaseModel):
+    id: str
+    status: str = "queued"
+
+
+class GenerationJobInfo(BaseModel):
+    id: str
+    status: str = "queued"  # queued / running / done / failed
+    stage: str = ""  # promt / llm
+    section_code: str = ""
+    mode: str = "single"  # single / map_reduce
+    created_at: float = 0
+    finished_at: float = 0
+    timings: GenerationJobTimings = GenerationJobTimings()
+    error: str = ""
+
+
+class GenerationJobResult(BaseModel):
+    id: str
+    status: str = "done"
+    result: LLMResponse | None = None
@@ -8,9 +8,29 @@ class LLMRequest(BaseModel):
     user_input: str = ""
 
 
+class LLMTimings(BaseModel):
+    total: float = 0
+    queue: float = 0
+    cache_hit: bool = False
+    coalesced: bool = False
+    prompt_tokens: int = 0
+    prompt_cached: int = 0
+    prompt_n: int = 0
+    prompt_ms: float = 0
+    predicted_n: int = 0
+    predicted_ms: float = 0
+    prompt_per_second: float = 0
+    predicted_per_second: float = 0
+
+
 class LLMResponse(BaseModel):
     text: str = ""
     time: float = 0
+    dropped: list[str] = []
+    timings: LLMTimings = LLMTimings()
+    mode: str = "single"
+    # Текст ошибки, если генерация не удалась (text тогда содержит "Ошибка генерации: ...")
+    error: str = ""
 
 
 class TableStandart(BaseModel):
@@ -19,10 +39,18 @@ class TableStandart(BaseModel):
     data: list[list[int | float | str]] = []
 
 
+class PromtBudgetReport(BaseModel):
+    budget: int = 0
+    tokens: int = 0
+    fitted: bool = True
+    dropped: list[str] = []
+
+
 class GenerateData(BaseModel):
     promt: str = ""
     obligatury_text: list[str] = []
     template: list[str] = []
+    budget: PromtBudgetReport = PromtBudgetReport()
 
 
 class LLMGenerateRequest(BaseModel):
@@ -33,3 +61,73 @@ class LLMGenerateResponse(BaseModel):
     success: bool
     text: str
     time: float = 0
+
+
+class LLMCacheStats(BaseModel):
+    enabled: bool = True
+    hits: int = 0
+    misses: int = 0
+    hit_rate: float = 0
+    entries: int = 0
+    size_bytes: int = 0
+
+
+class LLMPromptCacheStats(BaseModel):
+    requests: int = 0
+    prompt_tokens: int = 0
+    cached_tokens: int = 0
+    cached_ratio: float = 0
+    prompt_ms: float = 0
+    saved_ms: float = 0
+
+
+class LLMBackendStats(BaseModel):
+    url: str
+    healthy: bool = True
+    ejected: bool = False
+    busy_slots: int = 0
+    total_slots: int = 0
+    in_flight: int = 0
+    failures: int = 0
+
+
+class LLMQueueStats(BaseModel):
+    capacity: int = 0
+    running: int = 0
+    waiting: int = 0
+    queue_size: int = 0
+    estimated_wait: float = 0
+    service_time: float = 0
+    rejected: int = 0
+
+
+class ReportSectionResult(BaseModel):
+    section_code: str
+    response: LLMResponse | None = None
+    error: str = ""
+    promt_ready: float = 0
+    finished: float = 0
+
+
+class ReportGenerateResponse(BaseModel):
+    sections: list[ReportSectionResult] = []
+    time: float = 0
+
+
+class FinalResultsState(BaseModel):
+    enabled: bool = False
+    exists: bool = False
+    refreshing: bool = False
+    rows: int = 0
+    refreshed_at: float = 0
+    refresh_seconds: float = 0
+    error: str = ""
+
+
+class ExamCubeState(BaseModel):
+    enabled: bool = False
+    building: bool = False
+    years: list[int] = []
+    built_at: float = 0
+    build_seconds: float = 0
+    error: str = ""
@@ -0,0 +1,88 @@
+from os import getenv, makedirs, path
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+import json
+import logging
+import queue
+import time
+
+
+LLM_ARTIFACTS_ENABLED = getenv("LLM_ARTIFACTS_ENABLED", "0") == "1"
+LLM_ARTIFACTS_PATH = getenv("LLM_ARTIFACTS_PATH", "logs/llm_artifacts.jsonl")
+LLM_ARTIFACTS_MAX_BYTES = int(getenv("LLM_ARTIFACTS_MAX_BYTES", str(10 * 1024 * 1024)))
+LLM_ARTIFACTS_BACKUP_COUNT = int(getenv("LLM_ARTIFACTS_BACKUP_COUNT", "5"))
+
+
+class ArtifactRecorder:
+    """
+    Отладочная запись промтов и ответов LLM (вместо promt.txt/result.txt).
+    Запись - строка JSON с ID запроса; в файл её пишет фоновый поток, файлы ротируются по размеру и количеству.
+    Выключенный рекордер ничего не сериализует и не пишет
+    """
+    def __init__(self, file_path: str, max_bytes: int, backup_count: int, enabled: bool = False) -> None:
+        self.file_path = file_path
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.enabled = enabled
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._listener: QueueListener | None = None
+        self._file_handler: RotatingFileHandler | None = None
+        self._queue_handler: QueueHandler | None = None
+        self._logger = logging.getLogger("llm_artifacts")
+        self._logger.propagate = False
+        self._logger.setLevel(logging.INFO)
+
+    def start(self) -> None:
+        """Запускает фоновую запись, если она включена
+        """
+        if not self.enabled or self._listener is not None:
+            return
+        directory = path.dirname(self.file_path)
+        if directory:
+            makedirs(directory, exist_ok=True)
+        self._file_handler = RotatingFileHandler(
+            self.file_path, maxBytes=self.max_bytes, backupCount=self.backup_count, encoding="utf-8"
+        )
+        self._file_handler.setFormatter(logging.Formatter("%(message)s"))
+        self._listener = QueueListener(self._queue, self._file_handler)
+        self._listener.start()
+        self._queue_handler = QueueHandler(self._queue)
+        self._logger.addHandler(self._queue_handler)
+
+    def close(self) -> None:
+        """Дописывает очередь и закрывает файл
+        """
+        if self._listener is None:
+            return
+        self._logger.removeHandler(self._queue_handler)
+        self._listener.stop()
+        self._file_handler.close()
+        self._listener = None
+        self._file_handler = None
+        self._queue_handler = None
+
+    @property
+    def active(self) -> bool:
+        return self._listener is not None
+
+    def record(self, request_id: str, kind: str, text: str, **fields) -> None:
+        """Ставит запись в очередь, не блокируя обработку запроса
+
+        Args:
+            request_id (str): ID запроса (задачи генерации)
+            kind (str): Тип записи: promt, result (в режиме map-reduce ещё map_promt, map_result)
+            text (str): Текст
+        """
+        if self._listener is None:
+            return
+        self._logger.info(json.dumps(
+            {"time": round(time.time(), 3), "request_id": request_id, "kind": kind, **fields, "text": text},
+            ensure_ascii=False,
+        ))
+
+
+artifact_recorder = ArtifactRecorder(
+    file_path=LLM_ARTIFACTS_PATH,
+    max_bytes=LLM_ARTIFACTS_MAX_BYTES,
+    backup_count=LLM_ARTIFACTS_BACKUP_COUNT,
+    enabled=LLM_ARTIFACTS_ENABLED,
+)
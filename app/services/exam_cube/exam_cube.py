@@ -0,0 +1,121 @@
+import asyncio
+import time
+
+from app.db.connect_db import async_session
+from app.schemas.text_reports import ExamCubeState
+from app.storage.postgresql.exam_cube import ExamCube, PG_EXAM_CUBE
+from app.services.llm_service.promt_cache import promt_cache
+
+
+class ExamCubeBuilder:
+    """
+    Создание и пересборка куба итоговых результатов по годам.
+    Сборка идёт в фоне и одновременно только одна; запросы таблиц во время сборки читают прежние строки куба
+    """
+    def __init__(self, enabled: bool) -> None:
+        self.enabled = enabled
+        self.cube = ExamCube()
+        self.built_at = 0.0
+        self.build_seconds = 0.0
+        self.error = ""
+        self._task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Создаёт таблицы куба, если их нет
+        """
+        if not self.enabled:
+            return
+        try:
+            async with async_session() as session:
+                await self.cube.create(session)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ exam_cube start: {e}")
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    @property
+    def building(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    async def hasYears(self, first_year: int, last_year: int) -> bool:
+        """Можно ли считать таблицы по кубу: куб включён и собран за все годы диапазона.
+        Собранные годы читаются из БД, поэтому сборка в одном процессе приложения видна всем остальным
+
+        Args:
+            first_year (int): Первый год
+            last_year (int): Последний год (включительно)
+
+        Returns:
+            bool: Куб готов для диапазона
+        """
+        if not self.enabled:
+            return False
+        try:
+            async with async_session() as session:
+                return await self.cube.hasYears(session, first_year, last_year)
+        except Exception as e:
+            # Таблицы куба не созданы или БД недоступна - таблицы считаются по результатам экзаменов
+            print(f"⚠️ exam_cube years: {e}")
+            return False
+
+    def trigger(self, years: list[int]) -> bool:
+        """Запускает сборку куба за годы в фоне, если куб включён и сборка ещё не идёт
+
+        Args:
+            years (list[int]): Годы проведения экзаменов
+
+        Returns:
+            bool: Сборка запущена этим вызовом
+        """
+        if not self.enabled or self.building:
+            return False
+        self._task = asyncio.create_task(self.build(years))
+        return True
+
+    async def build(self, years: list[int]) -> None:
+        """Пересобирает куб за каждый год (каждый год - отдельная транзакция)
+
+        Args:
+            years (list[int]): Годы проведения экзаменов
+        """
+        started_at = time.perf_counter()
+        try:
+            async with async_session() as session:
+                await self.cube.create(session)
+                for year in years:
+                    rows = await self.cube.buildYear(session, year)
+                    print(f"Exam cube built for {year}: {rows} rows")
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ exam_cube build: {e}")
+            return
+        self.error = ""
+        self.built_at = time.time()
+        self.build_seconds = round(time.perf_counter() - started_at, 3)
+        # Версия данных кэша промтов считается по исходным таблицам, а куб отстаёт от них до пересборки
+        promt_cache.clear()
+
+    async def state(self) -> ExamCubeState:
+        result = ExamCubeState(
+            enabled=self.enabled,
+            building=self.building,
+            built_at=self.built_at,
+            build_seconds=self.build_seconds,
+            error=self.error,
+        )
+        if not self.enabled:
+            return result
+        try:
+            async with async_session() as session:
+                result.years = await self.cube.loadYears(session)
+        except Exception as e:
+            result.error = str(e)
+        return result
+
+
+exam_cube_builder = ExamCubeBuilder(enabled=PG_EXAM_CUBE)
@@ -0,0 +1,109 @@
+from os import getenv
+import asyncio
+import time
+
+from app.db.connect_db import async_session
+from app.schemas.text_reports import FinalResultsState
+from app.storage.postgresql.final_results import FinalResultsView, PG_FINAL_RESULTS_VIEW
+from app.services.llm_service.promt_cache import promt_cache
+
+
+# Как часто пересчитывать представление итоговых результатов (сек); 0 - только по запросу к API
+PG_FINAL_RESULTS_REFRESH_INTERVAL = float(getenv("PG_FINAL_RESULTS_REFRESH_INTERVAL", "0"))
+
+
+class FinalResultsRefresher:
+    """
+    Создание и пересчёт материализованного представления итоговых результатов.
+    Пересчёт идёт в фоне и одновременно только один; запросы таблиц во время пересчёта читают прежние данные
+    """
+    def __init__(self, refresh_interval: float, enabled: bool) -> None:
+        self.refresh_interval = refresh_interval
+        self.enabled = enabled
+        self.view = FinalResultsView()
+        self.refreshed_at = 0.0
+        self.refresh_seconds = 0.0
+        self.error = ""
+        self._task: asyncio.Task | None = None
+        self._loop_task: asyncio.Task | None = None
+
+    async def start(self) -> None:
+        """Создаёт представление, если его нет, и запускает периодический пересчёт
+        """
+        if not self.enabled:
+            return
+        self.trigger()
+        if self.refresh_interval > 0:
+            self._loop_task = asyncio.create_task(self._refresh_loop())
+
+    async def close(self) -> None:
+        tasks = [task for task in (self._loop_task, self._task) if task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._loop_task = None
+        self._task = None
+
+    @property
+    def refreshing(self) -> bool:
+        return self._task is not None and not self._task.done()
+
+    def trigger(self) -> bool:
+        """Запускает пересчёт в фоне, если он ещё не идёт
+
+        Returns:
+            bool: Пересчёт запущен этим вызовом
+        """
+        if self.refreshing:
+            return False
+        self._task = asyncio.create_task(self.refresh())
+        return True
+
+    async def refresh(self) -> None:
+        """Создаёт представление (первый раз) или пересчитывает его без блокировки чтения
+        """
+        started_at = time.perf_counter()
+        try:
+            async with async_session() as session:
+                if await self.view.exists(session):
+                    await self.view.refresh(session, concurrently=True)
+                    await session.commit()
+                else:
+                    await self.view.create(session)
+        except Exception as e:
+            self.error = str(e)
+            print(f"❌ final_results refresh: {e}")
+            return
+        self.error = ""
+        self.refreshed_at = time.time()
+        self.refresh_seconds = round(time.perf_counter() - started_at, 3)
+        # Версия данных кэша промтов считается по исходным таблицам, а представление отстаёт от них до пересчёта
+        promt_cache.clear()
+
+    async def _refresh_loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            self.trigger()
+
+    async def state(self) -> FinalResultsState:
+        result = FinalResultsState(
+            enabled=self.enabled,
+            refreshing=self.refreshing,
+            refreshed_at=self.refreshed_at,
+            refresh_seconds=self.refresh_seconds,
+            error=self.error,
+        )
+        try:
+            async with async_session() as session:
+                result.exists = await self.view.exists(session)
+                if result.exists:
+                    result.rows = await self.view.countRows(session)
+        except Exception as e:
+            result.error = str(e)
+        return result
+
+
+final_results_refresher = FinalResultsRefresher(
+    refresh_interval=PG_FINAL_RESULTS_REFRESH_INTERVAL,
+    enabled=PG_FINAL_RESULTS_VIEW,
+)
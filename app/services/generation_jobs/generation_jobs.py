@@ -0,0 +1,164 @@
+from os import getenv
+import asyncio
+import time
+import uuid
+
+from app.db.connect_db import async_session
+from app.schemas.text_reports import LLMRequest, LLMResponse
+from app.schemas.generation_jobs import GenerationJobInfo, GenerationJobTimings
+from app.services.llm_service import llm_service as llmService
+from app.services.llm_service import promt as promtService
+from app.services.llm_service.llama_client import LLAMA_MAX_CONCURRENCY
+from app.services.llm_service.llm_scheduler import Priority
+
+
+GENERATION_JOB_WORKERS = int(getenv("GENERATION_JOB_WORKERS", str(LLAMA_MAX_CONCURRENCY)))
+GENERATION_JOB_MAX_PENDING = int(getenv("GENERATION_JOB_MAX_PENDING", "100"))
+GENERATION_JOB_TTL = float(getenv("GENERATION_JOB_TTL", "3600"))
+
+
+class GenerationJobsFullError(Exception):
+    """Слишком много задач в очереди"""
+
+
+class GenerationJob:
+    """
+    Задача фоновой генерации раздела
+    """
+    def __init__(self, request: LLMRequest, section_code: str, mode: str = "single") -> None:
+        self.id = uuid.uuid4().hex
+        self.request = request
+        self.section_code = section_code
+        self.mode = mode
+        self.status = "queued"
+        self.stage = ""
+        self.created_at = time.time()
+        self.started_at = 0.0
+        self.finished_at = 0.0
+        self.timings = GenerationJobTimings()
+        self.result: LLMResponse | None = None
+        self.error = ""
+
+    def info(self) -> GenerationJobInfo:
+        return GenerationJobInfo(
+            id=self.id,
+            status=self.status,
+            stage=self.stage,
+            section_code=self.section_code,
+            mode=self.mode,
+            created_at=self.created_at,
+            finished_at=self.finished_at,
+            timings=self.timings,
+            error=self.error,
+        )
+
+
+class GenerationJobManager:
+    """
+    Очередь задач генерации разделов с пулом фоновых обработчиков.
+    Завершённые задачи хранятся GENERATION_JOB_TTL секунд
+    """
+    def __init__(self, workers: int, max_pending: int, ttl: float) -> None:
+        self.workers_count = workers
+        self.max_pending = max_pending
+        self.ttl = ttl
+        self._jobs: dict[str, GenerationJob] = {}
+        self._queue: asyncio.Queue[GenerationJob] = asyncio.Queue()
+        self._workers: list[asyncio.Task] = []
+
+    async def start(self) -> None:
+        """Запускает обработчиков задач и очистку устаревших результатов
+        """
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(self.workers_count)]
+        self._workers.append(asyncio.create_task(self._cleanup_loop()))
+
+    async def close(self) -> None:
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, request: LLMRequest, section_code: str, mode: str | None = None) -> GenerationJob:
+        """Ставит задачу в очередь и сразу возвращает её
+
+        Args:
+            request (LLMRequest): Запрос пользователя
+            section_code (str): Код раздела
+            mode (str | None, optional): Режим генерации (single/map_reduce), по умолчанию - режим раздела. Defaults to None.
+
+        Raises:
+            GenerationJobsFullError: Очередь задач заполнена
+        """
+        if self._queue.qsize() >= self.max_pending:
+            raise GenerationJobsFullError(f"Too many pending generation jobs: {self._queue.qsize()}")
+        job = GenerationJob(request=request, section_code=section_code, mode=llmService.resolve_mode(section_code, mode))
+        self._jobs[job.id] = job
+        self._queue.put_nowait(job)
+        return job
+
+    def get(self, job_id: str) -> GenerationJob | None:
+        self._cleanup()
+        return self._jobs.get(job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(job)
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job: GenerationJob) -> None:
+        job.status = "running"
+        job.started_at = time.time()
+        job.timings.queued = round(job.started_at - job.created_at, 3)
+        try:
+            if job.mode == "map_reduce":
+                # Данные промтов этапов собираются внутри генерации, поэтому этап один
+                job.stage = "llm"
+                stage_started_at = time.perf_counter()
+                async with async_session() as session:
+                    job.result = await llmService.generate_text_map_reduce(
+                        session, job.request, job.section_code, priority=Priority.BULK, reject_when_full=False, request_id=job.id
+                    )
+                job.timings.llm = round(time.perf_counter() - stage_started_at, 3)
+            else:
+                job.stage = "promt"
+                stage_started_at = time.perf_counter()
+                async with async_session() as session:
+                    data = await promtService.get_report_generate_data(session=session, request=job.request, section_code=job.section_code)
+                job.timings.promt = round(time.perf_counter() - stage_started_at, 3)
+
+                job.stage = "llm"
+                stage_started_at = time.perf_counter()
+                # Задача уже в очереди, поэтому ждём место у LLM, а не отказываемся
+                job.result = await llmService.generate_text_by_data(data, job.section_code, priority=Priority.BULK, reject_when_full=False, request_id=job.id)
+                job.timings.llm = round(time.perf_counter() - stage_started_at, 3)
+            # Ошибка LLM не прерывает генерацию раздела (текст содержит сообщение об ошибке), но задача не выполнена
+            job.status = "failed" if job.result.error else "done"
+            job.error = job.result.error
+        except Exception as e:
+            job.status = "failed"
+            job.error = str(e)
+        job.stage = ""
+        job.finished_at = time.time()
+        job.timings.total = round(job.finished_at - job.created_at, 3)
+
+    def _cleanup(self) -> None:
+        """Удаляет завершённые задачи старше TTL
+        """
+        expire_before = time.time() - self.ttl
+        for job_id in [job_id for job_id, job in self._jobs.items() if job.finished_at and job.finished_at < expire_before]:
+            del self._jobs[job_id]
+
+    async def _cleanup_loop(self) -> None:
+        while True:
+            await asyncio.sleep(min(self.ttl, 60))
+            self._cleanup()
+
+
+generation_job_manager = GenerationJobManager(
+    workers=GENERATION_JOB_WORKERS,
+    max_pending=GENERATION_JOB_MAX_PENDING,
+    ttl=GENERATION_JOB_TTL,
+)
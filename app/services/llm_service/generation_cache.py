@@ -0,0 +1,165 @@
+from os import getenv, makedirs, path
+import asyncio
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from app.schemas.text_reports import LLMCacheStats
+
+
+LLAMA_CACHE_ENABLED = getenv("LLAMA_CACHE_ENABLED", "1") == "1"
+LLAMA_CACHE_PATH = getenv("LLAMA_CACHE_PATH", "cache/llm_generation.sqlite3")
+LLAMA_CACHE_MAX_ENTRIES = int(getenv("LLAMA_CACHE_MAX_ENTRIES", "2000"))
+LLAMA_CACHE_MAX_BYTES = int(getenv("LLAMA_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Поля запроса, которые влияют только на способ выполнения, а не на результат.
+# max_tokens не меняет жадно сгенерированный текст, если ответ не обрезан (обрезанные ответы не кэшируются)
+NON_SEMANTIC_FIELDS = {"stream", "cache_prompt", "id_slot", "max_tokens"}
+
+
+class GenerationCache:
+    """
+    Дисковый кэш результатов детерминированной генерации (SQLite).
+    Ключ - хэш тела запроса к llama.cpp: промт, модель и параметры сэмплирования.
+    Вытеснение - LRU по количеству записей и суммарному размеру
+    """
+    def __init__(self, db_path: str, max_entries: int, max_bytes: int, enabled: bool = True) -> None:
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._connection: sqlite3.Connection | None = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def make_key(payload: dict) -> str:
+        """Отпечаток запроса: всё тело, кроме полей, не влияющих на текст ответа
+
+        Args:
+            payload (dict): Тело запроса к llama.cpp
+
+        Returns:
+            str: sha256 от канонического JSON
+        """
+        fingerprint = {k: v for k, v in payload.items() if k not in NON_SEMANTIC_FIELDS}
+        raw = json.dumps(fingerprint, sort_keys=True, ensure_ascii=False)
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def is_cacheable(self, payload: dict) -> bool:
+        """Кэшируем только детерминированную генерацию (жадный выбор токена)
+        """
+        if not self.enabled:
+            return False
+        return payload.get("temperature", 1) == 0 or payload.get("top_k", 0) == 1
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._connection is None:
+            directory = path.dirname(self.db_path)
+            if directory:
+                makedirs(directory, exist_ok=True)
+            self._connection = sqlite3.connect(self.db_path, check_same_thread=False)
+            self._connection.execute("PRAGMA journal_mode=WAL")
+            self._connection.execute(
+                """CREATE TABLE IF NOT EXISTS generations (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )"""
+            )
+            self._connection.execute("CREATE INDEX IF NOT EXISTS generations_last_access ON generations (last_access)")
+            self._connection.commit()
+        return self._connection
+
+    def _get_sync(self, key: str) -> str | None:
+        with self._lock:
+            connection = self._connect()
+            row = connection.execute("SELECT text FROM generations WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            connection.execute("UPDATE generations SET last_access = ? WHERE key = ?", (time.time(), key))
+            connection.commit()
+            return row[0]
+
+    def _set_sync(self, key: str, text: str) -> None:
+        now = time.time()
+        with self._lock:
+            connection = self._connect()
+            connection.execute(
+                "INSERT OR REPLACE INTO generations (key, text, size, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                (key, text, len(text.encode("utf-8")), now, now)
+            )
+            self._evict(connection)
+            connection.commit()
+
+    def _evict(self, connection: sqlite3.Connection) -> None:
+        """Удаляет самые давно использованные записи, пока кэш не уложится в лимиты
+        """
+        while True:
+            count, size = connection.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations").fetchone()
+            if count <= self.max_entries and size <= self.max_bytes:
+                return
+            excess = max(count - self.max_entries, 1)
+            connection.execute(
+                "DELETE FROM generations WHERE key IN (SELECT key FROM generations ORDER BY last_access LIMIT ?)",
+                (excess,)
+            )
+
+    def _stats_sync(self) -> tuple[int, int]:
+        with self._lock:
+            return self._connect().execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM generations").fetchone()
+
+    def _clear_sync(self) -> None:
+        with self._lock:
+            connection = self._connect()
+            connection.execute("DELETE FROM generations")
+            connection.commit()
+
+    async def get(self, key: str) -> str | None:
+        """Возвращает сохранённый ответ или None
+        """
+        text = await asyncio.to_thread(self._get_sync, key)
+        if text is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return text
+
+    async def set(self, key: str, text: str) -> None:
+        """Сохраняет ответ модели. Пустые ответы не кэшируются
+        """
+        if not text:
+            return
+        await asyncio.to_thread(self._set_sync, key, text)
+
+    async def clear(self) -> None:
+        await asyncio.to_thread(self._clear_sync)
+
+    async def stats(self) -> LLMCacheStats:
+        """Статистика попаданий и заполненности кэша
+        """
+        entries, size = (0, 0)
+        if self.enabled:
+            entries, size = await asyncio.to_thread(self._stats_sync)
+        requests_count = self.hits + self.misses
+        return LLMCacheStats(
+            enabled=self.enabled,
+            hits=self.hits,
+            misses=self.misses,
+            hit_rate=round(self.hits / requests_count, 3) if requests_count else 0.0,
+            entries=entries,
+            size_bytes=size,
+        )
+
+
+generation_cache = GenerationCache(
+    db_path=LLAMA_CACHE_PATH,
+    max_entries=LLAMA_CACHE_MAX_ENTRIES,
+    max_bytes=LLAMA_CACHE_MAX_BYTES,
+    enabled=LLAMA_CACHE_ENABLED,
+)
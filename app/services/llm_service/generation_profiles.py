@@ -0,0 +1,89 @@
+from os import getenv
+from collections import deque
+import math
+
+from app.services.llm_service.promt_budget import LLAMA_GENERATION_MAX_TOKENS
+
+
+LLAMA_ANSWER_GRAMMAR = getenv("LLAMA_ANSWER_GRAMMAR", "0") == "1"
+LLAMA_ADAPTIVE_MAX_TOKENS = getenv("LLAMA_ADAPTIVE_MAX_TOKENS", "1") == "1"
+# Сколько последних ответов раздела учитывать и сколько нужно, чтобы начать подбирать max_tokens
+LLAMA_MAX_TOKENS_HISTORY = int(getenv("LLAMA_MAX_TOKENS_HISTORY", "50"))
+LLAMA_MAX_TOKENS_MIN_SAMPLES = int(getenv("LLAMA_MAX_TOKENS_MIN_SAMPLES", "5"))
+LLAMA_MAX_TOKENS_MARGIN = float(getenv("LLAMA_MAX_TOKENS_MARGIN", "1.25"))
+
+# Ответ модели - текст внутри <answer>...</answer>; "<" внутри текста допустим, если за ним не идёт "/"
+ANSWER_GRAMMAR = r'''root ::= "<answer>" content "</answer>"
+content ::= ([^<] | "<" [^/])*
+'''
+
+
+class GenerationProfile:
+    """
+    Параметры генерации раздела: стоп-последовательности, грамматика ответа
+    и max_tokens, подобранный по длине прошлых ответов
+    """
+    def __init__(self, stop: list[str] = [], grammar: str | None = None, adaptive: bool = True) -> None:
+        self.stop = list(stop)
+        self.grammar = grammar
+        self.adaptive = adaptive and LLAMA_ADAPTIVE_MAX_TOKENS
+        self._lengths: deque[int] = deque(maxlen=LLAMA_MAX_TOKENS_HISTORY)
+
+    @property
+    def max_tokens(self) -> int:
+        """Запас над 95-м перцентилем длины прошлых ответов, но не больше LLAMA_GENERATION_MAX_TOKENS
+        """
+        if not self.adaptive or len(self._lengths) < LLAMA_MAX_TOKENS_MIN_SAMPLES:
+            return LLAMA_GENERATION_MAX_TOKENS
+        lengths = sorted(self._lengths)
+        p95 = lengths[min(len(lengths) - 1, math.ceil(0.95 * len(lengths)) - 1)]
+        return min(LLAMA_GENERATION_MAX_TOKENS, math.ceil(p95 * LLAMA_MAX_TOKENS_MARGIN))
+
+    def record(self, completion_tokens: int | None, finish_reason: str | None, max_tokens: int) -> None:
+        """Запоминает длину ответа. Обрезанный по лимиту ответ учитывается как вдвое более длинный,
+        чтобы лимит раздела рос, а не закреплялся
+
+        Args:
+            completion_tokens (int | None): Токенов в ответе
+            finish_reason (str | None): Причина остановки генерации
+            max_tokens (int): Лимит, с которым шла генерация
+        """
+        if not completion_tokens:
+            return
+        if finish_reason == "length":
+            completion_tokens = max(completion_tokens, max_tokens) * 2
+        self._lengths.append(completion_tokens)
+
+    def payload_options(self) -> dict:
+        """Поля запроса к llama.cpp для профиля
+        """
+        options = {"max_tokens": self.max_tokens}
+        if self.stop:
+            options["stop"] = self.stop
+        if self.grammar:
+            options["grammar"] = self.grammar
+        return options
+
+
+def make_section_profile() -> GenerationProfile:
+    """Профиль раздела отчёта: генерация заканчивается на закрывающем теге ответа
+    """
+    return GenerationProfile(stop=["</answer>"], grammar=ANSWER_GRAMMAR if LLAMA_ANSWER_GRAMMAR else None)
+
+
+GENERATION_PROFILES: dict[str, GenerationProfile] = {
+    "1.7.": make_section_profile(),
+    "2.5.": make_section_profile(),
+    # Краткие выводы по группе таблиц в режиме map-reduce (ключи вида "map:2.5.:0")
+    "map": make_section_profile(),
+}
+# Произвольные запросы без системного промта: ответ без обёртки, длина ответа заранее неизвестна
+DEFAULT_PROFILE = GenerationProfile(adaptive=False)
+
+
+def get_generation_profile(slot_key: str | None) -> GenerationProfile:
+    """Профиль по ключу запроса: код раздела или составной ключ "вид:раздел:часть"
+    """
+    if slot_key is None:
+        return DEFAULT_PROFILE
+    return GENERATION_PROFILES.get(slot_key.split(":")[0], DEFAULT_PROFILE)
@@ -0,0 +1,136 @@
+from os import getenv
+from typing import AsyncIterator
+import json
+import httpx
+
+from app.services.llm_service.llama_router import LlamaRouter, LLAMA_BASE_URLS, LLAMA_PARALLEL
+
+
+LLAMA_MAX_CONCURRENCY = int(getenv("LLAMA_MAX_CONCURRENCY", str(LLAMA_PARALLEL * len(LLAMA_BASE_URLS))))
+LLAMA_REQUEST_TIMEOUT = float(getenv("LLAMA_REQUEST_TIMEOUT", "600"))
+LLAMA_CONNECT_TIMEOUT = float(getenv("LLAMA_CONNECT_TIMEOUT", "5"))
+LLAMA_WRITE_TIMEOUT = float(getenv("LLAMA_WRITE_TIMEOUT", "30"))
+LLAMA_POOL_TIMEOUT = float(getenv("LLAMA_POOL_TIMEOUT", "30"))
+LLAMA_KEEPALIVE_EXPIRY = float(getenv("LLAMA_KEEPALIVE_EXPIRY", "60"))
+LLAMA_TOKENIZE_TIMEOUT = float(getenv("LLAMA_TOKENIZE_TIMEOUT", "10"))
+
+
+class LlamaClient:
+    """
+    Асинхронный клиент llama.cpp, живущий всё время работы приложения
+    """
+    def __init__(self) -> None:
+        """Клиент создаётся при старте приложения (см. start).
+        Параллельность генераций ограничивает планировщик (llm_scheduler)
+        """
+        self._client: httpx.AsyncClient | None = None
+        self.router = LlamaRouter(LLAMA_BASE_URLS)
+
+    async def start(self) -> None:
+        """Создаёт пул соединений с keep-alive и таймаутами на каждую фазу запроса
+        """
+        if self._client is not None:
+            return
+        # Запас соединений под фоновый опрос /health и /slots
+        max_connections = LLAMA_MAX_CONCURRENCY + 2 * len(self.router.backends)
+        self._client = httpx.AsyncClient(
+            timeout=httpx.Timeout(
+                connect=LLAMA_CONNECT_TIMEOUT,
+                read=LLAMA_REQUEST_TIMEOUT,
+                write=LLAMA_WRITE_TIMEOUT,
+                pool=LLAMA_POOL_TIMEOUT,
+            ),
+            limits=httpx.Limits(
+                max_connections=max_connections,
+                max_keepalive_connections=max_connections,
+                keepalive_expiry=LLAMA_KEEPALIVE_EXPIRY,
+            ),
+        )
+        await self.router.start(self._client)
+
+    async def close(self) -> None:
+        """Закрывает пул соединений при остановке приложения
+        """
+        if self._client is None:
+            return
+        await self.router.close()
+        await self._client.aclose()
+        self._client = None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            raise RuntimeError("LlamaClient is not started")
+        return self._client
+
+    async def chat_completion(self, payload: dict, affinity_key: str | None = None) -> dict:
+        """Отправляет запрос в /v1/chat/completions наименее загруженного сервера, не блокируя цикл событий.
+        Если сервер недоступен на этапе соединения, запрос уходит на следующий
+
+        Args:
+            payload (dict): Тело запроса в формате OpenAI
+            affinity_key (str | None, optional): Ключ привязки к серверу (код раздела). Defaults to None.
+
+        Returns:
+            dict: Ответ llama.cpp
+        """
+        tried = set()
+        while True:
+            try:
+                async with self.router.backend(affinity_key, exclude=tried) as backend:
+                    tried.add(backend.url)
+                    response = await self.client.post(f"{backend.url}/v1/chat/completions", json=payload)
+                    response.raise_for_status()
+                    return response.json()
+            except httpx.ConnectError:
+                if len(tried) >= len(self.router.backends):
+                    raise
+
+    async def stream_chat_completion(self, payload: dict, affinity_key: str | None = None) -> AsyncIterator[dict]:
+        """Отправляет потоковый запрос в /v1/chat/completions и отдаёт куски ответа по мере их генерации.
+        Если сервер недоступен на этапе соединения (до первого куска), запрос уходит на следующий
+
+        Args:
+            payload (dict): Тело запроса в формате OpenAI
+            affinity_key (str | None, optional): Ключ привязки к серверу (код раздела). Defaults to None.
+
+        Yields:
+            dict: Очередной кусок ответа (chat.completion.chunk)
+        """
+        tried = set()
+        started = False
+        while True:
+            try:
+                async with self.router.backend(affinity_key, exclude=tried) as backend:
+                    tried.add(backend.url)
+                    async with self.client.stream("POST", f"{backend.url}/v1/chat/completions", json={**payload, "stream": True}) as response:
+                        response.raise_for_status()
+                        async for line in response.aiter_lines():
+                            if not line.startswith("data:"):
+                                continue
+                            data = line[len("data:"):].strip()
+                            if data == "[DONE]":
+                                break
+                            started = True
+                            yield json.loads(data)
+                return
+            except httpx.ConnectError:
+                if started or len(tried) >= len(self.router.backends):
+                    raise
+
+    async def tokenize(self, text: str) -> list[int]:
+        """Токенизирует текст словарём модели через /tokenize
+
+        Args:
+            text (str): Текст
+
+        Returns:
+            list[int]: Токены
+        """
+        async with self.router.backend() as backend:
+            response = await self.client.post(f"{backend.url}/tokenize", json={"content": text}, timeout=LLAMA_TOKENIZE_TIMEOUT)
+            response.raise_for_status()
+            return response.json().get("tokens", [])
+
+
+llama_client = LlamaClient()
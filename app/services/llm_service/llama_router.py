@@ -0,0 +1,177 @@
+from os import getenv
+from contextlib import asynccontextmanager
+from typing import AsyncIterator
+import asyncio
+import logging
+import time
+import httpx
+
+from app.schemas.text_reports import LLMBackendStats
+
+
+LLAMA_BASE_URL = getenv("LLAMA_BASE_URL", "http://llama-cpp:8011").rstrip("/")
+LLAMA_BASE_URLS = [url.strip().rstrip("/") for url in (getenv("LLAMA_BASE_URLS") or LLAMA_BASE_URL).split(",") if url.strip()]
+LLAMA_PARALLEL = int(getenv("LLAMA_PARALLEL", "1"))
+LLAMA_HEALTH_INTERVAL = float(getenv("LLAMA_HEALTH_INTERVAL", "5"))
+LLAMA_HEALTH_TIMEOUT = float(getenv("LLAMA_HEALTH_TIMEOUT", "2"))
+LLAMA_EJECT_AFTER_FAILURES = int(getenv("LLAMA_EJECT_AFTER_FAILURES", "2"))
+LLAMA_EJECT_COOLDOWN = float(getenv("LLAMA_EJECT_COOLDOWN", "30"))
+
+logger = logging.getLogger(__name__)
+
+
+class LlamaBackendUnavailableError(Exception):
+    """Нет ни одного доступного сервера llama.cpp"""
+
+
+class LlamaBackend:
+    """
+    Состояние одного сервера llama.cpp
+    """
+    def __init__(self, url: str) -> None:
+        self.url = url
+        self.healthy = True
+        self.total_slots = LLAMA_PARALLEL
+        self.busy_slots = 0
+        self.in_flight = 0
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def is_available(self, now: float) -> bool:
+        return self.healthy and self.ejected_until <= now
+
+    @property
+    def load(self) -> float:
+        """Доля занятых слотов. Данные /slots отстают от реальности на интервал опроса,
+        поэтому учитываем и собственные запросы в работе
+        """
+        return max(self.busy_slots, self.in_flight) / max(self.total_slots, 1)
+
+    def stats(self, now: float) -> LLMBackendStats:
+        return LLMBackendStats(
+            url=self.url,
+            healthy=self.healthy,
+            ejected=self.ejected_until > now,
+            busy_slots=self.busy_slots,
+            total_slots=self.total_slots,
+            in_flight=self.in_flight,
+            failures=self.failures,
+        )
+
+
+class LlamaRouter:
+    """
+    Распределяет запросы между серверами llama.cpp по наименьшей загрузке слотов.
+    Состояние серверов обновляется фоновым опросом /health и /slots.
+    Сервер исключается после серии ошибок на LLAMA_EJECT_COOLDOWN секунд
+    и возвращается после этого срока, если отвечает на /health
+    """
+    def __init__(self, urls: list[str]) -> None:
+        self.backends = [LlamaBackend(url) for url in urls]
+        self._affinity: dict[str, LlamaBackend] = {}
+        self._client: httpx.AsyncClient | None = None
+        self._poll_task: asyncio.Task | None = None
+
+    @property
+    def total_slots(self) -> int:
+        return sum(backend.total_slots for backend in self.backends)
+
+    async def start(self, client: httpx.AsyncClient) -> None:
+        """Запускает фоновый опрос состояния серверов
+        """
+        self._client = client
+        await self._poll_all()
+        self._poll_task = asyncio.create_task(self._poll_loop())
+
+    async def close(self) -> None:
+        if self._poll_task is not None:
+            self._poll_task.cancel()
+            try:
+                await self._poll_task
+            except asyncio.CancelledError:
+                pass
+            self._poll_task = None
+
+    async def _poll_loop(self) -> None:
+        while True:
+            await asyncio.sleep(LLAMA_HEALTH_INTERVAL)
+            await self._poll_all()
+
+    async def _poll_all(self) -> None:
+        await asyncio.gather(*(self._poll(backend) for backend in self.backends))
+
+    async def _poll(self, backend: LlamaBackend) -> None:
+        """Проверяет /health и читает занятость слотов из /slots
+        """
+        try:
+            response = await self._client.get(f"{backend.url}/health", timeout=LLAMA_HEALTH_TIMEOUT)
+            backend.healthy = response.status_code == 200
+        except httpx.HTTPError:
+            backend.healthy = False
+        if not backend.healthy:
+            return
+        # /health может отвечать, когда запросы к серверу падают, поэтому исключённый сервер
+        # возвращается в работу только по истечении срока исключения
+        if backend.ejected_until and backend.ejected_until <= time.monotonic():
+            backend.failures = 0
+            backend.ejected_until = 0.0
+        try:
+            response = await self._client.get(f"{backend.url}/slots", timeout=LLAMA_HEALTH_TIMEOUT)
+            if response.status_code != 200:
+                return  # /slots выключен на сервере (--no-slots), остаёмся на локальном счётчике
+            slots = response.json()
+            backend.total_slots = len(slots) or backend.total_slots
+            backend.busy_slots = sum(1 for slot in slots if slot.get("is_processing", slot.get("state", 0) != 0))
+        except (httpx.HTTPError, ValueError):
+            pass
+
+    def _pick(self, affinity_key: str | None, exclude: set[str]) -> LlamaBackend:
+        now = time.monotonic()
+        candidates = [b for b in self.backends if b.is_available(now) and b.url not in exclude]
+        if not candidates:
+            raise LlamaBackendUnavailableError("No available llama.cpp backends")
+        least_load = min(backend.load for backend in candidates)
+        # При равной загрузке отдаём предпочтение серверу, где префикс раздела уже в кэше
+        preferred = self._affinity.get(affinity_key) if affinity_key is not None else None
+        if preferred in candidates and preferred.load <= least_load:
+            return preferred
+        return min(candidates, key=lambda backend: (backend.load, backend.in_flight))
+
+    def _mark_failed(self, backend: LlamaBackend) -> None:
+        backend.failures += 1
+        if backend.failures >= LLAMA_EJECT_AFTER_FAILURES:
+            backend.ejected_until = time.monotonic() + LLAMA_EJECT_COOLDOWN
+            logger.warning("llama.cpp backend %s ejected for %ss", backend.url, LLAMA_EJECT_COOLDOWN)
+
+    @asynccontextmanager
+    async def backend(self, affinity_key: str | None = None, exclude: set[str] | None = None) -> AsyncIterator[LlamaBackend]:
+        """Выдаёт наименее загруженный сервер на время запроса
+
+        Args:
+            affinity_key (str | None, optional): Ключ привязки (код раздела). Defaults to None.
+            exclude (set[str] | None, optional): Адреса серверов, которые уже не ответили. Defaults to None.
+
+        Yields:
+            LlamaBackend: Выбранный сервер
+        """
+        backend = self._pick(affinity_key, exclude or set())
+        backend.in_flight += 1
+        try:
+            yield backend
+        except httpx.TransportError:
+            self._mark_failed(backend)
+            raise
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code >= 500:
+                self._mark_failed(backend)
+            raise
+        else:
+            backend.failures = 0
+            if affinity_key is not None:
+                self._affinity[affinity_key] = backend
+        finally:
+            backend.in_flight -= 1
+
+    def stats(self) -> list[LLMBackendStats]:
+        now = time.monotonic()
+        return [backend.stats(now) for backend in self.backends]
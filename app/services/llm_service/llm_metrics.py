@@ -0,0 +1,179 @@
+from app.schemas.text_reports import LLMTimings
+from app.services.llm_service.single_flight import single_flight
+from app.services.llm_service.promt_cache import promt_cache
+from app.services.qdrant_service.section_examples import section_examples
+
+
+# Границы размера промта (в токенах) для метки prompt_size
+PROMPT_SIZE_BOUNDS = (512, 1024, 2048, 4096)
+
+
+def get_prompt_size_label(prompt_tokens: int) -> str:
+    """Диапазон размера промта для разбивки метрик
+    """
+    lower = 0
+    for bound in PROMPT_SIZE_BOUNDS:
+        if prompt_tokens <= bound:
+            return f"{lower}-{bound}"
+        lower = bound
+    return f"{lower}+"
+
+
+def parse_timings(response_data: dict) -> LLMTimings:
+    """Достаёт из ответа llama.cpp разбивку времени на префилл и декодирование
+
+    Args:
+        response_data (dict): Ответ llama.cpp (или последний кусок потокового ответа)
+
+    Returns:
+        LLMTimings: Токены и время по фазам
+    """
+    timings = response_data.get("timings") or {}
+    usage = response_data.get("usage") or {}
+    result = LLMTimings(
+        prompt_n=timings.get("prompt_n", 0) or 0,
+        prompt_ms=round(timings.get("prompt_ms", 0.0) or 0.0, 1),
+        prompt_cached=timings.get("cache_n", 0) or 0,
+        predicted_n=timings.get("predicted_n", 0) or usage.get("completion_tokens", 0) or 0,
+        predicted_ms=round(timings.get("predicted_ms", 0.0) or 0.0, 1),
+        prompt_per_second=round(timings.get("prompt_per_second", 0.0) or 0.0, 2),
+        predicted_per_second=round(timings.get("predicted_per_second", 0.0) or 0.0, 2),
+    )
+    result.prompt_tokens = usage.get("prompt_tokens") or result.prompt_n + result.prompt_cached
+    return result
+
+
+class Histogram:
+    """
+    Гистограмма в формате Prometheus (по умолчанию с метками section и prompt_size)
+    """
+    def __init__(self, name: str, description: str, buckets: tuple[float, ...], label_names: tuple[str, ...] = ("section", "prompt_size")) -> None:
+        self.name = name
+        self.label_names = label_names
+        self.description = description
+        self.buckets = buckets
+        self._counts: dict[tuple[str, ...], list[int]] = {}
+        self._sums: dict[tuple[str, ...], float] = {}
+
+    def observe(self, labels: tuple[str, ...], value: float) -> None:
+        if labels not in self._counts:
+            self._counts[labels] = [0] * (len(self.buckets) + 1)
+            self._sums[labels] = 0.0
+        counts = self._counts[labels]
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-1] += 1
+        self._sums[labels] += value
+
+    def render(self) -> list[str]:
+        lines = [f"# HELP {self.name} {self.description}", f"# TYPE {self.name} histogram"]
+        for labels, counts in sorted(self._counts.items()):
+            label_text = ",".join(f'{name}="{value}"' for name, value in zip(self.label_names, labels))
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{label_text},le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{label_text},le="+Inf"}} {counts[-1]}')
+            lines.append(f"{self.name}_sum{{{label_text}}} {round(self._sums[labels], 3)}")
+            lines.append(f"{self.name}_count{{{label_text}}} {counts[-1]}")
+        return lines
+
+
+class LLMMetrics:
+    """
+    Гистограммы времени и скорости генерации по разделам и размеру промта.
+    По ним видно, где узкое место раздела: очередь, префилл или декодирование
+    """
+    def __init__(self) -> None:
+        seconds = (0.1, 0.5, 1, 2, 5, 10, 20, 40, 80, 160, 320)
+        self.queue_seconds = Histogram("llm_queue_seconds", "Time waiting for an LLM slot", seconds)
+        self.prompt_seconds = Histogram("llm_prompt_seconds", "Prompt evaluation (prefill) time", seconds)
+        self.decode_seconds = Histogram("llm_decode_seconds", "Token generation (decode) time", seconds)
+        self.total_seconds = Histogram("llm_total_seconds", "Whole generation time", seconds)
+        self.prompt_tokens = Histogram("llm_prompt_tokens", "Prompt tokens evaluated (not taken from cache)", (64, 128, 256, 512, 1024, 2048, 4096, 8192))
+        self.predicted_tokens = Histogram("llm_predicted_tokens", "Generated tokens", (16, 32, 64, 128, 256, 512, 1024, 2048))
+        self.prompt_tokens_per_second = Histogram("llm_prompt_tokens_per_second", "Prefill speed", (5, 10, 20, 50, 100, 200, 500, 1000))
+        self.decode_tokens_per_second = Histogram("llm_decode_tokens_per_second", "Decode speed", (0.5, 1, 2, 4, 8, 16, 32, 64))
+        # Раздел целиком: однократная генерация против map-reduce
+        self.section_seconds = Histogram("llm_section_seconds", "Section generation time by mode", seconds, ("section", "mode"))
+        self.section_prompt_tokens = Histogram("llm_section_prompt_tokens", "Prompt tokens of all LLM calls of a section by mode", (512, 1024, 2048, 4096, 8192, 16384), ("section", "mode"))
+        self.section_max_prompt_tokens = Histogram("llm_section_max_prompt_tokens", "Longest single prompt of a section by mode", (256, 512, 1024, 2048, 4096, 8192), ("section", "mode"))
+        self.histograms = [
+            self.queue_seconds, self.prompt_seconds, self.decode_seconds, self.total_seconds,
+            self.prompt_tokens, self.predicted_tokens, self.prompt_tokens_per_second, self.decode_tokens_per_second,
+            self.section_seconds, self.section_prompt_tokens, self.section_max_prompt_tokens,
+        ]
+        self.cache_hits: dict[str, int] = {}
+        self.cancelled: dict[str, int] = {}
+
+    def record(self, section_code: str | None, timings: LLMTimings) -> None:
+        """Учитывает одну генерацию
+
+        Args:
+            section_code (str | None): Код раздела, None - произвольный запрос
+            timings (LLMTimings): Разбивка времени генерации
+        """
+        section = section_code or "free"
+        if timings.cache_hit:
+            self.cache_hits[section] = self.cache_hits.get(section, 0) + 1
+            return
+        labels = (section, get_prompt_size_label(timings.prompt_tokens))
+        self.queue_seconds.observe(labels, timings.queue)
+        self.total_seconds.observe(labels, timings.total)
+        self.prompt_seconds.observe(labels, timings.prompt_ms / 1000)
+        self.decode_seconds.observe(labels, timings.predicted_ms / 1000)
+        self.prompt_tokens.observe(labels, timings.prompt_n)
+        self.predicted_tokens.observe(labels, timings.predicted_n)
+        if timings.prompt_per_second:
+            self.prompt_tokens_per_second.observe(labels, timings.prompt_per_second)
+        if timings.predicted_per_second:
+            self.decode_tokens_per_second.observe(labels, timings.predicted_per_second)
+
+    def record_section(self, section_code: str, mode: str, seconds: float, prompt_tokens: list[int]) -> None:
+        """Учитывает генерацию раздела целиком
+
+        Args:
+            section_code (str): Код раздела
+            mode (str): Режим: single, map_reduce
+            seconds (float): Время генерации раздела
+            prompt_tokens (list[int]): Размеры промтов всех запросов к LLM раздела
+        """
+        labels = (section_code, mode)
+        self.section_seconds.observe(labels, seconds)
+        if any(prompt_tokens):
+            self.section_prompt_tokens.observe(labels, sum(prompt_tokens))
+            self.section_max_prompt_tokens.observe(labels, max(prompt_tokens))
+
+    def record_cancelled(self, section_code: str | None) -> None:
+        """Учитывает генерацию, прерванную на полпути (клиент отключился)
+        """
+        section = section_code or "free"
+        self.cancelled[section] = self.cancelled.get(section, 0) + 1
+
+    def render(self) -> str:
+        """Метрики в текстовом формате Prometheus
+        """
+        lines = []
+        for histogram in self.histograms:
+            lines += histogram.render()
+        lines += ["# HELP llm_generation_cache_hits_total Answers served from the generation cache", "# TYPE llm_generation_cache_hits_total counter"]
+        for section, count in sorted(self.cache_hits.items()):
+            lines.append(f'llm_generation_cache_hits_total{{section="{section}"}} {count}')
+        lines += ["# HELP llm_cancelled_total Generations aborted before completion", "# TYPE llm_cancelled_total counter"]
+        for section, count in sorted(self.cancelled.items()):
+            lines.append(f'llm_cancelled_total{{section="{section}"}} {count}')
+        lines += [
+            "# HELP llm_single_flight_leaders_total Generations started by the single-flight layer", "# TYPE llm_single_flight_leaders_total counter",
+            f"llm_single_flight_leaders_total {single_flight.leaders}",
+            "# HELP llm_single_flight_coalesced_total Requests attached to an identical in-flight generation", "# TYPE llm_single_flight_coalesced_total counter",
+            f"llm_single_flight_coalesced_total {single_flight.coalesced}",
+            "# HELP promt_cache_requests_total Built-prompt cache lookups", "# TYPE promt_cache_requests_total counter",
+            f'promt_cache_requests_total{{result="hit"}} {promt_cache.hits}',
+            f'promt_cache_requests_total{{result="miss"}} {promt_cache.misses}',
+            "# HELP section_examples_requests_total Section example lookups in the in-memory index", "# TYPE section_examples_requests_total counter",
+            f'section_examples_requests_total{{result="hit"}} {section_examples.hits}',
+            f'section_examples_requests_total{{result="miss"}} {section_examples.misses}',
+        ]
+        return "\n".join(lines) + "\n"
+
+
+llm_metrics = LLMMetrics()
@@ -0,0 +1,137 @@
+from os import getenv
+from contextlib import asynccontextmanager
+from enum import IntEnum
+from typing import AsyncIterator
+import asyncio
+import heapq
+import itertools
+import math
+import time
+
+from app.schemas.text_reports import LLMQueueStats
+from app.services.llm_service.llama_client import LLAMA_MAX_CONCURRENCY
+from app.services.llm_service.llama_router import LLAMA_PARALLEL
+
+
+LLAMA_QUEUE_SIZE = int(getenv("LLAMA_QUEUE_SIZE", str(4 * LLAMA_PARALLEL)))
+LLAMA_SERVICE_TIME_ESTIMATE = float(getenv("LLAMA_SERVICE_TIME_ESTIMATE", "60"))
+
+
+class Priority(IntEnum):
+    """Приоритет запроса к LLM: меньше - раньше"""
+    INTERACTIVE = 0
+    BULK = 1
+
+
+class LLMQueueFullError(Exception):
+    """Очередь к LLM заполнена, запрос отклонён сразу"""
+    def __init__(self, retry_after: int) -> None:
+        super().__init__(f"LLM queue is full, retry after {retry_after} s")
+        self.retry_after = retry_after
+
+
+class LLMScheduler:
+    """
+    Допуск запросов к LLM: не больше capacity генераций одновременно,
+    остальные ждут в ограниченной очереди с приоритетами.
+    Когда очередь заполнена, запрос отклоняется сразу с оценкой времени ожидания
+    """
+    def __init__(self, capacity: int, queue_size: int) -> None:
+        self.capacity = capacity
+        self.queue_size = queue_size
+        self.running = 0
+        self.rejected = 0
+        self.service_time = LLAMA_SERVICE_TIME_ESTIMATE
+        self._waiters: list[tuple[int, int, asyncio.Future]] = []
+        self._counter = itertools.count()
+
+    def estimate_wait(self, priority: Priority = Priority.BULK) -> float:
+        """Оценка ожидания в очереди: сколько «волн» генераций пройдёт до запроса
+
+        Args:
+            priority (Priority, optional): Приоритет запроса. Defaults to Priority.BULK.
+
+        Returns:
+            float: Ожидание в секундах
+        """
+        if self.running < self.capacity and not self._waiters:
+            return 0.0
+        ahead = sum(1 for waiter_priority, _, _ in self._waiters if waiter_priority <= priority)
+        return (ahead // self.capacity + 1) * self.service_time
+
+    def check_admission(self, priority: Priority = Priority.BULK) -> None:
+        """Отклоняет запрос, если очередь заполнена
+
+        Raises:
+            LLMQueueFullError: Очередь заполнена
+        """
+        if self.running < self.capacity and not self._waiters:
+            return
+        if len(self._waiters) >= self.queue_size:
+            self.rejected += 1
+            raise LLMQueueFullError(retry_after=math.ceil(self.estimate_wait(priority)))
+
+    async def _acquire(self, priority: Priority, reject_when_full: bool) -> None:
+        if self.running < self.capacity and not self._waiters:
+            self.running += 1
+            return
+        if reject_when_full:
+            self.check_admission(priority)
+
+        future = asyncio.get_running_loop().create_future()
+        entry = (int(priority), next(self._counter), future)
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Слот уже выдан, но ожидающий ушёл - возвращаем слот следующему
+                self._release()
+            else:
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def _release(self) -> None:
+        self.running -= 1
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if future.done():
+                continue
+            self.running += 1
+            future.set_result(None)
+            break
+
+    @asynccontextmanager
+    async def slot(self, priority: Priority = Priority.BULK, reject_when_full: bool = True) -> AsyncIterator[None]:
+        """Занимает место для генерации на время запроса
+
+        Args:
+            priority (Priority, optional): Приоритет запроса. Defaults to Priority.BULK.
+            reject_when_full (bool, optional): Отклонять при заполненной очереди (иначе - ждать). Defaults to True.
+
+        Raises:
+            LLMQueueFullError: Очередь заполнена
+        """
+        await self._acquire(priority, reject_when_full)
+        started_at = time.perf_counter()
+        try:
+            yield
+        finally:
+            self._release()
+            # Скользящее среднее времени генерации для оценки ожидания
+            self.service_time = 0.8 * self.service_time + 0.2 * (time.perf_counter() - started_at)
+
+    def stats(self) -> LLMQueueStats:
+        return LLMQueueStats(
+            capacity=self.capacity,
+            running=self.running,
+            waiting=len(self._waiters),
+            queue_size=self.queue_size,
+            estimated_wait=round(self.estimate_wait(), 1),
+            service_time=round(self.service_time, 1),
+            rejected=self.rejected,
+        )
+
+
+llm_scheduler = LLMScheduler(capacity=LLAMA_MAX_CONCURRENCY, queue_size=LLAMA_QUEUE_SIZE)
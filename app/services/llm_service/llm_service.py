@@ -1,95 +1,483 @@
 from os import getenv
+from contextlib import aclosing
+from typing import AsyncIterator
+import asyncio
+import json
 import time
-import requests
+import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from app.schemas.text_reports import LLMResponse, LLMRequest
+from app.schemas.text_reports import LLMResponse, LLMRequest, GenerateData, LLMTimings
 from app.services.llm_service import promt as promtService
+from app.services.llm_service.llama_client import llama_client
+from app.services.llm_service.generation_cache import generation_cache
+from app.services.llm_service.promt_cache import CachedPromt
+from app.services.llm_service.prompt_cache_stats import prompt_cache_stats
+from app.services.llm_service.llm_scheduler import llm_scheduler, Priority, LLMQueueFullError
+from app.services.llm_service.generation_profiles import get_generation_profile
+from app.services.llm_service.llm_metrics import llm_metrics, parse_timings
+from app.services.llm_service.single_flight import single_flight
+from app.services.artifact_recorder.artifact_recorder import artifact_recorder
 
 
-LLAMA_BASE_URL = getenv("LLAMA_BASE_URL", "http://llama-cpp:8011").rstrip("/")
 LLAMA_MODEL_ALIAS = getenv("LLAMA_MODEL_ALIAS", "local-gguf")
 LLAMA_GENERATION_TEMPERATURE = float(getenv("LLAMA_GENERATION_TEMPERATURE", "0"))
-LLAMA_GENERATION_MAX_TOKENS = int(getenv("LLAMA_GENERATION_MAX_TOKENS", "1024"))
-LLAMA_REQUEST_TIMEOUT = float(getenv("LLAMA_REQUEST_TIMEOUT", "600"))
 LLAMA_GENERATION_SEED = int(getenv("LLAMA_GENERATION_SEED", "42"))
 LLAMA_GENERATION_TOP_K = int(getenv("LLAMA_GENERATION_TOP_K", "1"))
 LLAMA_GENERATION_TOP_P = float(getenv("LLAMA_GENERATION_TOP_P", "1.0"))
 LLAMA_GENERATION_MIN_P = float(getenv("LLAMA_GENERATION_MIN_P", "0.0"))
+# Разделы, которые по умолчанию генерируются в режиме map-reduce
+LLAMA_MAP_REDUCE_SECTIONS = [code.strip() for code in getenv("LLAMA_MAP_REDUCE_SECTIONS", "").split(",") if code.strip()]
 
+GENERATION_MODES = ("single", "map_reduce")
 
-def generate_with_llama(prompt: str) -> tuple[str, float]:
+
+ANSWER_TAGS = ("<answer>", "</answer>")
+
+
+def build_chat_payload(prompt: str, slot_key: str | None = None) -> dict:
+    """Формирует тело запроса к llama.cpp
+
+    Args:
+        prompt (str): Промт
+        slot_key (str | None, optional): Код раздела: по нему выбирается профиль генерации и сервер с его префиксом. Defaults to None.
+
+    Returns:
+        dict: Тело запроса в формате OpenAI
+    """
+    return {
+        "model": LLAMA_MODEL_ALIAS,
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt,
+            }
+        ],
+        "temperature": LLAMA_GENERATION_TEMPERATURE,
+        "seed": LLAMA_GENERATION_SEED,
+        "top_k": LLAMA_GENERATION_TOP_K,
+        "top_p": LLAMA_GENERATION_TOP_P,
+        "min_p": LLAMA_GENERATION_MIN_P,
+        "cache_prompt": True,
+        # Слот выбирает llama.cpp: свободный, с самым длинным общим префиксом в кэше.
+        # Закреплённый слот заставил бы ждать, пока он занят, даже при свободных соседних
+        "id_slot": -1,
+        "stream": False,
+        **get_generation_profile(slot_key).payload_options(),
+    }
+
+
+def clean_llm_text(text: str, prompt: str) -> str:
+    """Убирает из ответа модели повтор промта и обёртку <answer>
+    """
+    text = text.replace(prompt, "").strip()
+    if "<answer>" in text:
+        text = text.split("<answer>")[1]
+        text = text.replace("</answer>", "")
+    return text
+
+
+def format_sse(event: str, data: dict) -> str:
+    """Формирует одно событие Server-Sent Events
+    """
+    return f"event: {event}\ndata: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+class AnswerTagsFilter:
+    """
+    Вырезает теги <answer>/</answer> из потока токенов.
+    Хвост, который может оказаться началом тега, придерживается до следующего куска
+    """
+    def __init__(self) -> None:
+        self._buffer = ""
+
+    def feed(self, delta: str) -> str:
+        self._buffer += delta
+        for tag in ANSWER_TAGS:
+            self._buffer = self._buffer.replace(tag, "")
+        hold = 0
+        for tag in ANSWER_TAGS:
+            for size in range(len(tag) - 1, 0, -1):
+                if self._buffer.endswith(tag[:size]):
+                    hold = max(hold, size)
+                    break
+        ready = self._buffer[:len(self._buffer) - hold]
+        self._buffer = self._buffer[len(self._buffer) - hold:]
+        return ready
+
+    def flush(self) -> str:
+        ready, self._buffer = self._buffer, ""
+        return ready
+
+
+async def complete_with_llama(prompt: str, payload: dict, cache_key: str | None, slot_key: str | None, priority: Priority) -> tuple[str, LLMTimings]:
+    """Один запрос к llama.cpp: место в очереди, генерация, учёт статистики и запись в кэш
+
+    Returns:
+        tuple[str, LLMTimings]: Текст ответа, разбивка времени
+    """
     started_at = time.perf_counter()
-    response = requests.post(
-        f"{LLAMA_BASE_URL}/v1/chat/completions",
-        json={
-            "model": LLAMA_MODEL_ALIAS,
-            "messages": [
-                {
-                    "role": "user",
-                    "content": prompt,
-                }
-            ],
-            "temperature": LLAMA_GENERATION_TEMPERATURE,
-            "max_tokens": LLAMA_GENERATION_MAX_TOKENS,
-            "seed": LLAMA_GENERATION_SEED,
-            "top_k": LLAMA_GENERATION_TOP_K,
-            "top_p": LLAMA_GENERATION_TOP_P,
-            "min_p": LLAMA_GENERATION_MIN_P,
-            "stream": False,
-        },
-        timeout=LLAMA_REQUEST_TIMEOUT,
-    )
-    response.raise_for_status()
+    try:
+        async with llm_scheduler.slot(priority, reject_when_full=False):
+            slot_acquired_at = time.perf_counter()
+            response_data = await llama_client.chat_completion(payload, affinity_key=slot_key)
+    except asyncio.CancelledError:
+        # Закрытие соединения останавливает генерацию в llama.cpp, слот освобождается
+        llm_metrics.record_cancelled(slot_key)
+        raise
+    prompt_cache_stats.record(response_data.get("timings"))
+    timings = parse_timings(response_data)
+    timings.queue = round(slot_acquired_at - started_at, 3)
 
-    response_data = response.json()
     choices = response_data.get("choices", [])
     text = ""
+    finish_reason = None
     if choices:
         text = choices[0].get("message", {}).get("content", "") or ""
-    
-    text = text.replace(prompt, "").strip()
-    if "<answer>" in text:
-        text = text.split("<answer>")[1]
-        text = text.replace("</answer>", "")
+        finish_reason = choices[0].get("finish_reason")
+    get_generation_profile(slot_key).record(timings.predicted_n, finish_reason, payload["max_tokens"])
+    text = clean_llm_text(text, prompt)
 
-    return text, round(time.perf_counter() - started_at, 3)
+    # Обрезанный по max_tokens ответ не кэшируем: с другим лимитом текст был бы другим
+    if cache_key is not None and finish_reason != "length":
+        await generation_cache.set(cache_key, text)
+    timings.total = round(time.perf_counter() - started_at, 3)
+    llm_metrics.record(slot_key, timings)
+    return text, timings
 
 
-async def get_generated_text_on_subject_by_section(
-    session: AsyncSession, request: LLMRequest, section_code: str
-) -> LLMResponse:
-    data = await promtService.get_report_generate_data(
-        session=session, request=request, section_code=section_code
+async def generate_with_llama(
+        prompt: str,
+        slot_key: str | None = None,
+        priority: Priority = Priority.BULK,
+        reject_when_full: bool = True,
+    ) -> tuple[str, LLMTimings]:
+    """Генерация ответа целиком. Одинаковые одновременные запросы получают результат одной генерации
+
+    Args:
+        prompt (str): Промт
+        slot_key (str | None, optional): Ключ привязки к слоту (код раздела). Defaults to None.
+        priority (Priority, optional): Приоритет в очереди к LLM. Defaults to Priority.BULK.
+        reject_when_full (bool, optional): Отклонять при заполненной очереди (иначе - ждать). Defaults to True.
+
+    Returns:
+        tuple[str, LLMTimings]: Текст ответа, разбивка времени: очередь, префилл, декодирование
+    """
+    started_at = time.perf_counter()
+    payload = build_chat_payload(prompt, slot_key)
+    cache_key = generation_cache.make_key(payload) if generation_cache.is_cacheable(payload) else None
+    if cache_key is not None:
+        cached_text = await generation_cache.get(cache_key)
+        if cached_text is not None:
+            timings = LLMTimings(total=round(time.perf_counter() - started_at, 3), cache_hit=True)
+            llm_metrics.record(slot_key, timings)
+            return cached_text, timings
+
+    flight_key = generation_cache.make_key(payload)
+    # Присоединение к идущей генерации не добавляет нагрузки, поэтому допуск проверяем только для новой
+    if reject_when_full and not single_flight.is_running(flight_key):
+        llm_scheduler.check_admission(priority)
+    (text, timings), coalesced = await single_flight.run(
+        flight_key, lambda: complete_with_llama(prompt, payload, cache_key, slot_key, priority)
     )
+    if coalesced:
+        timings = timings.model_copy(update={"coalesced": True})
+    timings.total = round(time.perf_counter() - started_at, 3)
+    return text, timings
 
-    with open("promt.txt", "w") as f:
-        f.write(data.promt)
 
-    result = LLMResponse()
+async def stream_from_llama(prompt: str, payload: dict, cache_key: str | None, slot_key: str | None, priority: Priority) -> AsyncIterator[str]:
+    """Один потоковый запрос к llama.cpp
+
+    Yields:
+        str: Очередной кусок текста без тегов <answer>
+    """
+    started_at = time.perf_counter()
+    answer_filter = AnswerTagsFilter()
+    full_text = ""
+    finish_reason = None
+    timings = LLMTimings()
     try:
-        llm_text, result.time = generate_with_llama(data.promt)
+        # Допуск проверен эндпоинтом до начала ответа: здесь поток уже идёт со статусом 200, поэтому ждём место
+        async with llm_scheduler.slot(priority, reject_when_full=False):
+            slot_acquired_at = time.perf_counter()
+            # aclosing: при закрытии потока соединение с llama.cpp закрывается сразу, а не при сборке мусора
+            async with aclosing(llama_client.stream_chat_completion(payload, affinity_key=slot_key)) as chunks:
+                async for chunk in chunks:
+                    if chunk.get("timings"):
+                        # Итоговые timings приходят в последнем куске ответа
+                        prompt_cache_stats.record(chunk.get("timings"))
+                        timings = parse_timings(chunk)
+                    choices = chunk.get("choices", [])
+                    if not choices:
+                        continue
+                    finish_reason = choices[0].get("finish_reason") or finish_reason
+                    delta = choices[0].get("delta", {}).get("content", "") or ""
+                    full_text += delta
+                    text = answer_filter.feed(delta)
+                    if text:
+                        yield text
+    except (asyncio.CancelledError, GeneratorExit):
+        # Клиент закрыл поток: генерация в llama.cpp останавливается вместе с соединением
+        llm_metrics.record_cancelled(slot_key)
+        raise
+    text = answer_filter.flush()
+    if text:
+        yield text
+    get_generation_profile(slot_key).record(timings.predicted_n, finish_reason, payload["max_tokens"])
+    timings.queue = round(slot_acquired_at - started_at, 3)
+    timings.total = round(time.perf_counter() - started_at, 3)
+    llm_metrics.record(slot_key, timings)
+
+    if cache_key is not None and finish_reason != "length":
+        await generation_cache.set(cache_key, clean_llm_text(full_text, prompt))
+
+
+async def stream_with_llama(prompt: str, slot_key: str | None = None, priority: Priority = Priority.BULK) -> AsyncIterator[str]:
+    """Потоковая генерация: отдаёт текст по мере декодирования.
+    Одинаковые одновременные запросы подключаются к одному потоку и получают его с начала
+
+    Args:
+        prompt (str): Промт
+        slot_key (str | None, optional): Ключ привязки к слоту. Defaults to None.
+        priority (Priority, optional): Приоритет в очереди к LLM. Defaults to Priority.BULK.
+
+    Yields:
+        str: Очередной кусок текста без тегов <answer>
+    """
+    started_at = time.perf_counter()
+    payload = build_chat_payload(prompt, slot_key)
+    cache_key = generation_cache.make_key(payload) if generation_cache.is_cacheable(payload) else None
+    if cache_key is not None:
+        cached_text = await generation_cache.get(cache_key)
+        if cached_text is not None:
+            llm_metrics.record(slot_key, LLMTimings(total=round(time.perf_counter() - started_at, 3), cache_hit=True))
+            yield cached_text
+            return
+
+    flight_key = generation_cache.make_key(payload)
+    async with aclosing(single_flight.stream(flight_key, lambda: stream_from_llama(prompt, payload, cache_key, slot_key, priority))) as chunks:
+        async for text in chunks:
+            yield text
+
+
+def assemble_section_text(text: str, template: list[str], obligatury_text: list[str], llm_text: str) -> str:
+    """Собирает текст раздела по шаблону из обязательного текста и ответа LLM
+
+    Args:
+        text (str): Начало текста (сообщение об ошибке или пустая строка)
+        template (list[str]): Шаблон раздела
+        obligatury_text (list[str]): Обязательный текст
+        llm_text (str): Ответ LLM
+
+    Returns:
+        str: Текст раздела
+    """
+    for part in template:
+        if text != "":
+            text += "\n"
+        if "obligatury_text-" in part:
+            text += obligatury_text[int(part.replace("obligatury_text-", ""))]
+        elif part == "llm_text":
+            text += llm_text
+    return text
+
+
+async def generate_text_by_data(
+        data: GenerateData,
+        section_code: str,
+        priority: Priority = Priority.BULK,
+        reject_when_full: bool = True,
+        request_id: str | None = None,
+    ) -> LLMResponse:
+    """Генерирует текст раздела по готовым данным и собирает его по шаблону
+
+    Args:
+        data (GenerateData): Промт, шаблон и обязательный текст раздела
+        section_code (str): Код раздела
+        priority (Priority, optional): Приоритет в очереди к LLM. Defaults to Priority.BULK.
+        reject_when_full (bool, optional): Отклонять при заполненной очереди (иначе - ждать). Defaults to True.
+        request_id (str | None, optional): ID запроса для отладочной записи промта и ответа. Defaults to None.
+
+    Returns:
+        LLMResponse: Текст раздела
+    """
+    if artifact_recorder.active:
+        request_id = request_id or uuid.uuid4().hex
+        artifact_recorder.record(request_id, "promt", data.promt, section_code=section_code)
+
+    result = LLMResponse(dropped=data.budget.dropped)
+    try:
+        llm_text, result.timings = await generate_with_llama(data.promt, slot_key=section_code, priority=priority, reject_when_full=reject_when_full)
+        result.time = result.timings.total
+        llm_metrics.record_section(section_code, "single", result.time, [result.timings.prompt_tokens])
+    except LLMQueueFullError:
+        raise
     except Exception as e:
+        result.error = str(e)
         result.text = f"Ошибка генерации: {str(e)}"
         llm_text = ""
 
-    for part in data.template:
-        if result.text != "":
-            result.text += "\n"
-        if "obligatury_text-" in part:
-            result.text += data.obligatury_text[int(part.replace("obligatury_text-", ""))]
-        elif part == "llm_text":
-            result.text += llm_text
+    result.text = assemble_section_text(result.text, data.template, data.obligatury_text, llm_text)
+
+    if artifact_recorder.active:
+        artifact_recorder.record(request_id, "result", result.text, section_code=section_code, llm_time=result.time)
+    return result
+
+
+async def generate_text_map_reduce(
+        session: AsyncSession,
+        request: LLMRequest,
+        section_code: str,
+        priority: Priority = Priority.BULK,
+        reject_when_full: bool = True,
+        request_id: str | None = None,
+        section: CachedPromt | None = None,
+    ) -> LLMResponse:
+    """Генерация раздела в режиме map-reduce: по каждой группе таблиц параллельно пишутся краткие выводы
+    (короткие промты расходятся по свободным слотам и серверам), затем короткий итоговый промт собирает из них раздел
+
+    Args:
+        session (AsyncSession): Сессия
+        request (LLMRequest): Запрос пользователя
+        section_code (str): Код раздела
+        priority (Priority, optional): Приоритет в очереди к LLM. Defaults to Priority.BULK.
+        reject_when_full (bool, optional): Отклонять при заполненной очереди (иначе - ждать). Defaults to True.
+        request_id (str | None, optional): ID запроса для отладочной записи промтов и ответов этапов. Defaults to None.
+        section (CachedPromt | None, optional): Данные раздела, уже собранные вызывающим (конвейер отчёта). Defaults to None.
+
+    Returns:
+        LLMResponse: Текст раздела
+    """
+    if artifact_recorder.active:
+        request_id = request_id or uuid.uuid4().hex
+    started_at = time.perf_counter()
+    # Таблицы, пример, шаблон и обязательный текст - из того же кэша промтов, что и в обычном режиме
+    if section is None:
+        section = await promtService.get_section_data(session=session, request=request, section_code=section_code)
+    tables, section_data = section.tables, section.section_data
+    template, obligatury_text = list(section.template), list(section.obligatury_text)
+    # Раздел допускается целиком, запросы этапов дальше ждут место в очереди
+    if reject_when_full:
+        llm_scheduler.check_admission(priority)
+
+    section_name = section_data.name if section_data is not None else section_code
+    groups = promtService.get_map_groups(section_code, len(tables))
+    map_promts = [
+        promtService.build_map_promt(section_name, request.year, [(i+1, tables[i]) for i in group])
+        for group in groups
+    ]
+    if artifact_recorder.active:
+        for number, map_promt in enumerate(map_promts):
+            artifact_recorder.record(request_id, "map_promt", map_promt, section_code=section_code, map_number=number)
+    result = LLMResponse(mode="map_reduce")
+    try:
+        # Ключ этапа выбирает только профиль генерации и сервер: слот (id_slot=-1) выбирает llama.cpp,
+        # поэтому этапы занимают все свободные слоты, а не ждут друг друга в одном
+        summaries = await asyncio.gather(*(
+            generate_with_llama(
+                map_promt,
+                slot_key=f"map:{section_code}:{number}",
+                priority=priority,
+                reject_when_full=False,
+            )
+            for number, map_promt in enumerate(map_promts)
+        ))
+        if artifact_recorder.active:
+            for number, (text, timings) in enumerate(summaries):
+                artifact_recorder.record(request_id, "map_result", text, section_code=section_code, map_number=number, llm_time=timings.total)
+        reduce_promt = promtService.build_reduce_promt(
+            section_code=section_code,
+            exam_year=request.year,
+            summaries=[("; ".join(tables[i].table_name for i in group), text) for group, (text, _) in zip(groups, summaries)],
+            section_data=section_data,
+            user_input=request.user_input,
+            obligatury_text=obligatury_text,
+        )
+        if artifact_recorder.active:
+            artifact_recorder.record(request_id, "promt", reduce_promt, section_code=section_code)
+        llm_text, result.timings = await generate_with_llama(reduce_promt, slot_key=section_code, priority=priority, reject_when_full=False)
+        result.time = round(time.perf_counter() - started_at, 3)
+        llm_metrics.record_section(
+            section_code, "map_reduce", result.time,
+            [timings.prompt_tokens for _, timings in summaries] + [result.timings.prompt_tokens]
+        )
+    except Exception as e:
+        result.error = str(e)
+        result.text = f"Ошибка генерации: {str(e)}"
+        llm_text = ""
 
-    with open("result.txt", "w") as f:
-        f.write(result.text)
+    result.text = assemble_section_text(result.text, template, obligatury_text, llm_text)
+
+    if artifact_recorder.active:
+        artifact_recorder.record(request_id, "result", result.text, section_code=section_code, llm_time=result.time)
     return result
 
 
+def resolve_mode(section_code: str, mode: str | None = None) -> str:
+    """Режим генерации раздела: заданный явно или по умолчанию для раздела (LLAMA_MAP_REDUCE_SECTIONS)
+    """
+    return mode or ("map_reduce" if section_code in LLAMA_MAP_REDUCE_SECTIONS else "single")
+
+
+async def get_generated_text_on_subject_by_section(
+    session: AsyncSession, request: LLMRequest, section_code: str, mode: str | None = None
+) -> LLMResponse:
+    mode = resolve_mode(section_code, mode)
+    if mode == "map_reduce":
+        return await generate_text_map_reduce(session, request, section_code, priority=Priority.BULK)
+    data = await promtService.get_report_generate_data(
+        session=session, request=request, section_code=section_code
+    )
+    return await generate_text_by_data(data, section_code, priority=Priority.BULK)
+
+
 async def get_text_by_request(request: str) -> LLMResponse:
     result = LLMResponse()
     try:
-        result.text, result.time = generate_with_llama(request)
+        result.text, result.timings = await generate_with_llama(request, priority=Priority.INTERACTIVE)
+        result.time = result.timings.total
+    except LLMQueueFullError:
+        raise
     except Exception as e:
+        result.error = str(e)
         result.text = f"Ошибка генерации: {str(e)}"
     return result
+
+
+async def stream_text_by_data(data: GenerateData, slot_key: str | None = None, priority: Priority = Priority.BULK) -> AsyncIterator[str]:
+    """Потоковая генерация раздела в формате SSE.
+    Обязательные части шаблона отправляются сразу, затем токены LLM
+
+    Args:
+        data (GenerateData): Данные для генерации раздела
+        slot_key (str | None, optional): Ключ привязки к слоту llama.cpp (код раздела). Defaults to None.
+        priority (Priority, optional): Приоритет в очереди к LLM. Defaults to Priority.BULK.
+
+    Yields:
+        str: События text/token/done/error
+    """
+    started_at = time.perf_counter()
+    is_first_part = True
+    try:
+        for part in data.template:
+            if not is_first_part:
+                yield format_sse("text", {"text": "\n"})
+            is_first_part = False
+            if "obligatury_text-" in part:
+                yield format_sse("text", {"text": data.obligatury_text[int(part.replace("obligatury_text-", ""))]})
+            elif part == "llm_text":
+                async with aclosing(stream_with_llama(data.promt, slot_key=slot_key, priority=priority)) as tokens:
+                    async for token in tokens:
+                        yield format_sse("token", {"text": token})
+    except Exception as e:
+        yield format_sse("error", {"text": f"Ошибка генерации: {str(e)}"})
+    yield format_sse("done", {"time": round(time.perf_counter() - started_at, 3)})
+
+
+async def stream_text_by_request(request: str) -> AsyncIterator[str]:
+    """Потоковая генерация по произвольному запросу в формате SSE
+    """
+    async with aclosing(stream_text_by_data(GenerateData(promt=request, template=["llm_text"]), priority=Priority.INTERACTIVE)) as events:
+        async for event in events:
+            yield event
@@ -0,0 +1,47 @@
+from app.schemas.text_reports import LLMPromptCacheStats
+
+
+class PromptCacheStats:
+    """
+    Учёт переиспользования префикса промта в llama.cpp по полю timings ответа.
+    cache_n - токены, взятые из KV-кэша слота, prompt_n - токены, вычисленные заново
+    """
+    def __init__(self) -> None:
+        self.requests = 0
+        self.prompt_tokens = 0
+        self.cached_tokens = 0
+        self.prompt_ms = 0.0
+        self.saved_ms = 0.0
+
+    def record(self, timings: dict | None) -> None:
+        """Учитывает timings одного ответа llama.cpp
+
+        Args:
+            timings (dict | None): Поле timings ответа
+        """
+        if not timings:
+            return
+        prompt_n = timings.get("prompt_n", 0) or 0
+        prompt_ms = timings.get("prompt_ms", 0.0) or 0.0
+        cache_n = timings.get("cache_n", 0) or 0
+        self.requests += 1
+        self.prompt_tokens += prompt_n
+        self.cached_tokens += cache_n
+        self.prompt_ms += prompt_ms
+        if prompt_n > 0:
+            # Время, которое ушло бы на префилл закэшированных токенов при той же скорости
+            self.saved_ms += cache_n * prompt_ms / prompt_n
+
+    def stats(self) -> LLMPromptCacheStats:
+        total_tokens = self.prompt_tokens + self.cached_tokens
+        return LLMPromptCacheStats(
+            requests=self.requests,
+            prompt_tokens=self.prompt_tokens,
+            cached_tokens=self.cached_tokens,
+            cached_ratio=round(self.cached_tokens / total_tokens, 3) if total_tokens else 0.0,
+            prompt_ms=round(self.prompt_ms, 1),
+            saved_ms=round(self.saved_ms, 1),
+        )
+
+
+prompt_cache_stats = PromptCacheStats()
@@ -0,0 +1,72 @@
+from os import getenv
+from collections import OrderedDict
+import hashlib
+import math
+import httpx
+
+from app.services.llm_service.llama_client import llama_client
+from app.services.llm_service.llama_router import LLAMA_PARALLEL, LlamaBackendUnavailableError
+
+
+LLAMA_CTX_SIZE = int(getenv("LLAMA_CTX_SIZE", "4096"))
+LLAMA_GENERATION_MAX_TOKENS = int(getenv("LLAMA_GENERATION_MAX_TOKENS", "1024"))
+PROMT_BUDGET_ENABLED = getenv("PROMT_BUDGET_ENABLED", "1") == "1"
+PROMT_TOKEN_RESERVE = int(getenv("PROMT_TOKEN_RESERVE", "64"))
+TOKEN_COUNT_CACHE_SIZE = int(getenv("TOKEN_COUNT_CACHE_SIZE", "4096"))
+# Грубая оценка, если llama.cpp недоступен: кириллица в BPE-словарях - около 2.5 символов на токен
+CHARS_PER_TOKEN_ESTIMATE = 2.5
+
+
+def get_promt_budget(max_tokens: int = LLAMA_GENERATION_MAX_TOKENS) -> int:
+    """Сколько токенов можно отдать под промт: контекст одного слота llama.cpp
+    (--ctx-size делится между --parallel слотами) минус место под ответ и разметку чата
+
+    Args:
+        max_tokens (int, optional): Максимальная длина ответа. Defaults to LLAMA_GENERATION_MAX_TOKENS.
+
+    Returns:
+        int: Бюджет промта в токенах
+    """
+    return LLAMA_CTX_SIZE // LLAMA_PARALLEL - max_tokens - PROMT_TOKEN_RESERVE
+
+
+class TokenCounter:
+    """
+    Подсчёт токенов через /tokenize llama.cpp с LRU-кэшем по тексту.
+    Промт считается по блокам, поэтому неизменные блоки (инструкции, таблицы) токенизируются один раз
+    """
+    def __init__(self, max_entries: int) -> None:
+        self.max_entries = max_entries
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[str, int] = OrderedDict()
+
+    async def count(self, text: str) -> int:
+        """Количество токенов в тексте
+
+        Args:
+            text (str): Текст
+
+        Returns:
+            int: Количество токенов
+        """
+        if not text:
+            return 0
+        key = hashlib.sha1(text.encode("utf-8")).hexdigest()
+        if key in self._cache:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return self._cache[key]
+        self.misses += 1
+        try:
+            tokens_count = len(await llama_client.tokenize(text))
+        except (httpx.HTTPError, LlamaBackendUnavailableError) as e:
+            print(f"❌ tokenize: {e}")
+            return math.ceil(len(text) / CHARS_PER_TOKEN_ESTIMATE)
+        self._cache[key] = tokens_count
+        if len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+        return tokens_count
+
+
+token_counter = TokenCounter(TOKEN_COUNT_CACHE_SIZE)
@@ -0,0 +1,127 @@
+from os import getenv
+from collections import OrderedDict
+import time
+from sqlalchemy import text
+
+from app.db.connect_db import async_session
+from app.models.models import ExamResults, TestSchemes, Students, Schools, SchoolKinds, Areas, Answers, WorkPlans, Difficuelties
+from app.schemas.text_reports import TableStandart
+from app.schemas.qdrant import QdrantReportSection
+from app.services.qdrant_service.section_examples import section_examples
+
+
+PROMT_CACHE_ENABLED = getenv("PROMT_CACHE_ENABLED", "1") == "1"
+PROMT_CACHE_SIZE = int(getenv("PROMT_CACHE_SIZE", "64"))
+# Как долго считать версию данных БД актуальной, не спрашивая её заново (сек)
+PROMT_DATA_VERSION_TTL = float(getenv("PROMT_DATA_VERSION_TTL", "10"))
+
+# Таблицы, из которых собираются данные промтов: изменение любой из них меняет версию данных
+PROMT_DATA_TABLES = [
+    model.__tablename__
+    for model in (ExamResults, TestSchemes, Students, Schools, SchoolKinds, Areas, Answers, WorkPlans, Difficuelties)
+]
+
+# Счётчики вставок/изменений/удалений из статистики PostgreSQL: растут при любой записи в таблицы
+DATA_VERSION_QUERY = text("""
+SELECT coalesce(sum(n_tup_ins + n_tup_upd + n_tup_del), 0), count(*)
+FROM pg_stat_user_tables
+WHERE relname = ANY(:tables)
+""")
+
+PromtCacheKey = tuple[str, int, str, int, int, tuple]
+
+
+class CachedPromt:
+    """
+    Собранные данные промта раздела: таблицы, пример, шаблон, обязательный текст
+    и промт без блока информации от пользователя (prefix), если при сборке ничего не сокращалось
+    """
+    def __init__(
+            self,
+            tables: list[TableStandart],
+            section_data: QdrantReportSection | None,
+            template: list[str],
+            obligatury_text: list[str],
+            prefix: str | None = None,
+            prefix_tokens: int = 0,
+        ) -> None:
+        self.tables = tables
+        self.section_data = section_data
+        self.template = template
+        self.obligatury_text = obligatury_text
+        self.prefix = prefix
+        self.prefix_tokens = prefix_tokens
+
+
+class PromtCache:
+    """
+    LRU-кэш собранных промтов по (раздел, год, предмет, дисциплина, тип экзамена, версия данных).
+    Версия данных - версия индекса примеров из Qdrant и счётчики изменений таблиц PostgreSQL,
+    поэтому после изменения данных старые записи просто перестают находиться и вытесняются
+    """
+    def __init__(self, max_entries: int, enabled: bool = True) -> None:
+        self.max_entries = max_entries
+        self.enabled = enabled
+        self.hits = 0
+        self.misses = 0
+        self._cache: OrderedDict[PromtCacheKey, CachedPromt] = OrderedDict()
+        self._db_version: tuple = ()
+        self._db_version_at: float | None = None
+
+    async def get_db_version(self) -> tuple:
+        """Версия данных PostgreSQL по статистике изменений таблиц (запрашивается не чаще PROMT_DATA_VERSION_TTL)
+
+        Returns:
+            tuple: Версия данных; пустой кортеж, если её не удалось получить
+        """
+        now = time.monotonic()
+        if self._db_version_at is not None and now - self._db_version_at < PROMT_DATA_VERSION_TTL:
+            return self._db_version
+        try:
+            async with async_session() as session:
+                query = await session.execute(DATA_VERSION_QUERY, {"tables": PROMT_DATA_TABLES})
+                self._db_version = tuple(query.one())
+        except Exception as e:
+            print(f"❌ get_db_version: {e}")
+            self._db_version = ()
+        self._db_version_at = now
+        return self._db_version
+
+    async def make_key(self, section_code: str, year: int, subject_name: str, subject_id: int, exam_type_id: int) -> PromtCacheKey | None:
+        """Ключ кэша с версией данных
+
+        Returns:
+            PromtCacheKey | None: Ключ; None, если кэш выключен или версию данных получить не удалось
+        """
+        if not self.enabled:
+            return None
+        db_version = await self.get_db_version()
+        if not db_version:
+            return None
+        return (section_code, year, subject_name, subject_id, exam_type_id, (section_examples.version, *db_version))
+
+    def get(self, key: PromtCacheKey | None) -> CachedPromt | None:
+        if key is None:
+            return None
+        cached = self._cache.get(key)
+        if cached is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self._cache.move_to_end(key)
+        return cached
+
+    def put(self, key: PromtCacheKey | None, cached: CachedPromt) -> None:
+        if key is None:
+            return
+        self._cache[key] = cached
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.max_entries:
+            self._cache.popitem(last=False)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._db_version_at = None
+
+
+promt_cache = PromtCache(PROMT_CACHE_SIZE, enabled=PROMT_CACHE_ENABLED)
@@ -0,0 +1,151 @@
+from os import getenv
+from typing import AsyncIterator, Awaitable, Callable, TypeVar
+import asyncio
+
+
+LLAMA_SINGLE_FLIGHT = getenv("LLAMA_SINGLE_FLIGHT", "1") == "1"
+
+T = TypeVar("T")
+
+
+class Flight:
+    """
+    Одна выполняющаяся генерация и число ждущих её запросов
+    """
+    def __init__(self) -> None:
+        self.task: asyncio.Task | None = None
+        self.waiters = 0
+        # Потоковый режим: уже полученные куски текста для подключившихся позже
+        self.chunks: list[str] = []
+        self.done = False
+        self.error: BaseException | None = None
+        self._changed = asyncio.Event()
+
+    def push(self, chunk: str) -> None:
+        self.chunks.append(chunk)
+        self._notify()
+
+    def finish(self, error: BaseException | None = None) -> None:
+        self.done = True
+        self.error = error
+        self._notify()
+
+    def _notify(self) -> None:
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def subscribe(self) -> AsyncIterator[str]:
+        """Отдаёт все куски с начала, затем новые по мере поступления
+        """
+        index = 0
+        while True:
+            changed = self._changed
+            while index < len(self.chunks):
+                yield self.chunks[index]
+                index += 1
+            if self.done:
+                if self.error is not None:
+                    raise self.error
+                return
+            await changed.wait()
+
+
+class SingleFlight:
+    """
+    Объединение одинаковых одновременных запросов к LLM: первый запускает генерацию,
+    остальные с тем же ключом (отпечатком запроса) подключаются к ней и получают тот же результат или поток.
+    Генерация выполняется отдельной задачей и отменяется, только когда от неё отказались все ждущие
+    """
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        self.leaders = 0
+        self.coalesced = 0
+        self._flights: dict[str, Flight] = {}
+
+    def is_running(self, key: str) -> bool:
+        return key in self._flights
+
+    def _join(self, key: str, start: Callable[[Flight], Awaitable[None]]) -> tuple[Flight, bool]:
+        flight = self._flights.get(key)
+        if flight is not None:
+            self.coalesced += 1
+            flight.waiters += 1
+            return flight, False
+        flight = Flight()
+        flight.waiters = 1
+        self._flights[key] = flight
+        flight.task = asyncio.create_task(start(flight))
+        flight.task.add_done_callback(lambda _: self._forget(key, flight))
+        self.leaders += 1
+        return flight, True
+
+    def _forget(self, key: str, flight: Flight) -> None:
+        if self._flights.get(key) is flight:
+            del self._flights[key]
+
+    def _leave(self, key: str, flight: Flight) -> None:
+        flight.waiters -= 1
+        if flight.waiters == 0 and not flight.task.done():
+            # Результат больше никому не нужен - останавливаем генерацию
+            self._forget(key, flight)
+            flight.task.cancel()
+
+    async def run(self, key: str, factory: Callable[[], Awaitable[T]]) -> tuple[T, bool]:
+        """Выполняет генерацию или присоединяется к уже идущей с тем же ключом
+
+        Args:
+            key (str): Отпечаток запроса
+            factory (Callable[[], Awaitable[T]]): Генерация
+
+        Returns:
+            tuple[T, bool]: Результат, True - запрос присоединился к чужой генерации
+        """
+        if not self.enabled:
+            return await factory(), False
+
+        async def start(flight: Flight) -> T:
+            return await factory()
+
+        flight, is_leader = self._join(key, start)
+        try:
+            return await asyncio.shield(flight.task), not is_leader
+        finally:
+            self._leave(key, flight)
+
+    async def stream(self, key: str, factory: Callable[[], AsyncIterator[str]]) -> AsyncIterator[str]:
+        """Потоковая генерация: присоединившиеся получают уже сгенерированное начало и дальше - общий поток
+
+        Args:
+            key (str): Отпечаток запроса
+            factory (Callable[[], AsyncIterator[str]]): Потоковая генерация
+
+        Yields:
+            str: Очередной кусок текста
+        """
+        if not self.enabled:
+            async for chunk in factory():
+                yield chunk
+            return
+
+        async def start(flight: Flight) -> None:
+            try:
+                async for chunk in factory():
+                    flight.push(chunk)
+            except asyncio.CancelledError as e:
+                flight.finish(e)
+                raise
+            except Exception as e:
+                # Ошибку получат все подписчики через flight.error
+                flight.finish(e)
+                return
+            flight.finish()
+
+        flight, _ = self._join(f"stream:{key}", start)
+        try:
+            async for chunk in flight.subscribe():
+                yield chunk
+        finally:
+            self._leave(f"stream:{key}", flight)
+
+
+single_flight = SingleFlight(enabled=LLAMA_SINGLE_FLIGHT)
@@ -0,0 +1,116 @@
+from os import getenv
+from typing import Callable
+
+from app.schemas.text_reports import TableStandart
+
+
+PROMT_TABLE_FORMAT = getenv("PROMT_TABLE_FORMAT", "markdown")
+PROMT_TABLE_PRECISION = int(getenv("PROMT_TABLE_PRECISION", "1"))
+# Заголовки длиннее этого порога заменяются в TSV сокращениями с расшифровкой
+PROMT_TABLE_ABBREV_LEN = int(getenv("PROMT_TABLE_ABBREV_LEN", "12"))
+
+# Разделитель уровней в многоуровневых заголовках таблиц: "Группа | Подзаголовок"
+HEADER_LEVEL_SEPARATOR = " | "
+
+
+def format_cell(cell: int | float | str, precision: int = PROMT_TABLE_PRECISION) -> str:
+    """Округляет дробные значения и убирает незначащие нули
+    """
+    if isinstance(cell, float):
+        text = f"{cell:.{precision}f}"
+        if "." in text:
+            text = text.rstrip("0").rstrip(".")
+        return text
+    return str(cell)
+
+
+def split_header(column_name: str) -> tuple[str, str]:
+    """Делит заголовок столбца на группу и подзаголовок
+
+    Returns:
+        tuple[str, str]: Группа (пустая, если заголовок одноуровневый), подзаголовок
+    """
+    if HEADER_LEVEL_SEPARATOR not in column_name:
+        return "", column_name
+    group, name = column_name.split(HEADER_LEVEL_SEPARATOR, 1)
+    return group, name
+
+
+def table_to_markdown(table: TableStandart) -> str:
+    """Переводит таблицу в markdown для вставки в промт
+    """
+    col_count = len(table.column_names)
+    text = "|" + "".join([table.column_names[i].replace(" | ", ", ")+"|" for i in range(col_count)]) + "\n"
+    text += "|" + "-|"*col_count + "\n"
+    for row in table.data:
+        text += "|" + "".join([f"{cell}|" for cell in row]) + "\n"
+    return text
+
+
+def table_to_compact_markdown(table: TableStandart) -> str:
+    """markdown без лишних символов, дробные значения округлены
+    """
+    text = "|" + "|".join(name.replace(HEADER_LEVEL_SEPARATOR, ", ") for name in table.column_names) + "|\n"
+    text += "|" + "-|"*len(table.column_names) + "\n"
+    for row in table.data:
+        text += "|" + "|".join(format_cell(cell) for cell in row) + "|\n"
+    return text
+
+
+def table_to_grouped_markdown(table: TableStandart) -> str:
+    """markdown с двухуровневым заголовком: общая часть заголовков соседних столбцов пишется один раз
+    """
+    groups = [split_header(name)[0] for name in table.column_names]
+    names = [split_header(name)[1] for name in table.column_names]
+    text = ""
+    if any(groups):
+        group_row = [group if i == 0 or group != groups[i-1] else "" for i, group in enumerate(groups)]
+        text += "|" + "|".join(group_row) + "|\n"
+    text += "|" + "|".join(names) + "|\n"
+    text += "|" + "-|"*len(names) + "\n"
+    for row in table.data:
+        text += "|" + "|".join(format_cell(cell) for cell in row) + "|\n"
+    return text
+
+
+def table_to_tsv(table: TableStandart) -> str:
+    """TSV с сокращёнными заголовками и расшифровкой сокращений после таблицы
+    """
+    headers = []
+    legend = []
+    for name in table.column_names:
+        name = name.replace(HEADER_LEVEL_SEPARATOR, ", ")
+        if len(name) > PROMT_TABLE_ABBREV_LEN:
+            abbreviation = f"К{len(legend)+1}"
+            legend.append(f"{abbreviation} - {name}")
+            name = abbreviation
+        headers.append(name)
+    text = "\t".join(headers) + "\n"
+    for row in table.data:
+        text += "\t".join(format_cell(cell) for cell in row) + "\n"
+    if legend:
+        text += "Обозначения: " + "; ".join(legend) + "\n"
+    return text
+
+
+TABLE_FORMATS: dict[str, Callable[[TableStandart], str]] = {
+    "markdown": table_to_markdown,
+    "markdown_compact": table_to_compact_markdown,
+    "grouped": table_to_grouped_markdown,
+    "tsv": table_to_tsv,
+}
+
+
+def serialize_table(table: TableStandart, table_format: str = PROMT_TABLE_FORMAT) -> str:
+    """Переводит таблицу в текст для промта в выбранном формате
+
+    Args:
+        table (TableStandart): Таблица
+        table_format (str, optional): Формат из TABLE_FORMATS. Defaults to PROMT_TABLE_FORMAT.
+
+    Returns:
+        str: Таблица в виде текста
+    """
+    if table_format not in TABLE_FORMATS:
+        raise ValueError(f"Unknown table format: {table_format}")
+    return TABLE_FORMATS[table_format](table)
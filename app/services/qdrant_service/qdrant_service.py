@@ -10,6 +10,7 @@ from app.schemas.qdrant import (
     QdrantReportDataResponse,
 )
 from app.storage.qdrant.qdrant_manager import QdrantReportsStorage
+from app.services.qdrant_service.section_examples import section_examples
 
 
 class QdrantReportsService:
@@ -28,6 +29,8 @@ class QdrantReportsService:
             f'http://vectoriser:{self.vectoriser_port}/vect_qdrant/add',
             json=data.dict()
         )
+        # Отчёт мог записаться даже при ошибке ответа - индекс примеров сбрасываем в любом случае
+        section_examples.invalidate()
         if response.ok:
             return QdrantAddReportResponse(**response.json)
         return QdrantAddReportResponse(
@@ -45,7 +48,9 @@ class QdrantReportsService:
 
     async def delete_report(self, report_id: str) -> QdrantDeleteReportResponse:
         """Удаление отчёта по ID"""
-        return self.storage.delete_report(report_id)
+        result = self.storage.delete_report(report_id)
+        section_examples.invalidate()
+        return result
 
     async def get_distance(self, report1_id: str, report2_id: str, section_code: str) -> QdrantReportSectionsComparisonResponse:
         """Получение векторного расстояния между разделами отчётов"""
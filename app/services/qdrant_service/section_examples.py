@@ -0,0 +1,115 @@
+from os import getenv
+import threading
+import time
+
+from app.schemas.qdrant import QdrantReportSection
+from app.storage.qdrant.qdrant_manager import QdrantReportsStorage
+
+
+SECTION_EXAMPLES_INDEX_ENABLED = getenv("SECTION_EXAMPLES_INDEX_ENABLED", "1") == "1"
+# Пауза перед повторной загрузкой, если Qdrant был недоступен
+SECTION_EXAMPLES_RETRY_INTERVAL = float(getenv("SECTION_EXAMPLES_RETRY_INTERVAL", "30"))
+
+SectionKey = tuple[int, int, int, str]
+
+
+class SectionExamplesIndex:
+    """
+    Разделы отчётов из Qdrant в памяти процесса: (дисциплина, тип экзамена, год, код раздела) -> раздел.
+    Загружается целиком при старте и после каждого добавления/удаления отчёта.
+    Промах идёт в Qdrant, найденный раздел запоминается.
+    Методы синхронные (как и клиент Qdrant): из асинхронного кода их вызывают через asyncio.to_thread
+    """
+    def __init__(self, enabled: bool = True) -> None:
+        self.enabled = enabled
+        # Растёт при каждой перезагрузке и сбросе: по нему кэши промтов понимают, что примеры изменились
+        self.version = 0
+        self.hits = 0
+        self.misses = 0
+        self._sections: dict[SectionKey, QdrantReportSection] = {}
+        self._loaded = False
+        self._failed_at: float | None = None
+        self._lock = threading.Lock()
+
+    def load(self) -> bool:
+        """Загружает все разделы из Qdrant, заменяя содержимое индекса
+
+        Returns:
+            bool: Удалось ли загрузить
+        """
+        if not self.enabled:
+            return False
+        version = self.version
+        try:
+            sections = QdrantReportsStorage().get_all_sections()
+        except Exception as e:
+            print(f"⚠️ Section examples are not loaded: {e}")
+            sections = None
+        with self._lock:
+            if sections is None:
+                self._failed_at = time.monotonic()
+                return False
+            if version != self.version:
+                # Пока шла загрузка, индекс сбросили - данные могли устареть
+                return False
+            self._sections = {
+                (subject, exam_type, year, section.code): section
+                for subject, exam_type, year, section in sections
+            }
+            self._loaded = True
+            self._failed_at = None
+            self.version += 1
+        print(f"Section examples loaded: {len(self._sections)}")
+        return True
+
+    def invalidate(self) -> None:
+        """Сбрасывает индекс; следующее обращение загрузит его заново
+        """
+        with self._lock:
+            self._sections = {}
+            self._loaded = False
+            self._failed_at = None
+            self.version += 1
+
+    def _should_load(self) -> bool:
+        if self._loaded:
+            return False
+        return self._failed_at is None or time.monotonic() - self._failed_at >= SECTION_EXAMPLES_RETRY_INTERVAL
+
+    def get(self, subject: int, exam_type: int, year: int, section_code: str) -> QdrantReportSection | None:
+        """Раздел отчёта по параметрам: из памяти, при промахе - из Qdrant
+
+        Args:
+            subject (int): Код учебной дисциплины
+            exam_type (int): Код типа экзамена
+            year (int): Год проведения экзамена
+            section_code (str): Код раздела
+
+        Returns:
+            QdrantReportSection | None: Данные по разделу (код, текст, название)
+        """
+        key = (subject, exam_type, year, section_code)
+        if self.enabled:
+            if self._should_load():
+                self.load()
+            section = self._sections.get(key)
+            if section is not None:
+                self.hits += 1
+                return section
+            self.misses += 1
+
+        version = self.version
+        section = QdrantReportsStorage().get_section_data_by_params(
+            subject=subject,
+            exam_type=exam_type,
+            year=year,
+            section_code=section_code
+        )
+        if self.enabled and section is not None:
+            with self._lock:
+                if version == self.version:
+                    self._sections[key] = section
+        return section
+
+
+section_examples = SectionExamplesIndex(enabled=SECTION_EXAMPLES_INDEX_ENABLED)
@@ -0,0 +1,144 @@
+from typing import Awaitable, Callable, Any
+import asyncio
+import time
+
+from app.db.connect_db import async_session
+from app.schemas.text_reports import LLMRequest, GenerateData, TableStandart, ReportSectionResult, ReportGenerateResponse
+from app.schemas.qdrant import QdrantReportSection
+from app.services.llm_service import llm_service as llmService
+from app.services.llm_service import promt as promtService
+from app.services.llm_service.llm_scheduler import llm_scheduler, Priority
+from app.services.llm_service.promt_cache import PromtCacheKey, CachedPromt
+from app.storage.postgresql.request_for_section_abc import RequestsForSections
+
+
+class ReportPipeline:
+    """
+    Генерация нескольких разделов отчёта как граф задач:
+    набор последних попыток (last_results) записывается один раз для менеджеров всех разделов,
+    таблицы одного менеджера запросов (tables:*) и примеры из Qdrant (example:*) запрашиваются один раз и параллельно,
+    промт раздела (promt:*) собирается, как только готовы его данные, и сразу уходит в LLM (llm:*).
+    Разделы в режиме map-reduce (resolve_mode) берут те же данные (data:*) и генерируются по группам таблиц
+    """
+    def __init__(self, request: LLMRequest, section_codes: list[str], mode: str | None = None) -> None:
+        self.request = request
+        self.section_codes = list(dict.fromkeys(section_codes))
+        self.mode = mode
+        self._nodes: dict[str, asyncio.Task] = {}
+        self._started_at = 0.0
+
+    def _node(self, key: str, factory: Callable[[], Awaitable[Any]]) -> asyncio.Task:
+        """Узел графа: задача создаётся один раз, остальные потребители ждут её же
+        """
+        if key not in self._nodes:
+            self._nodes[key] = asyncio.create_task(factory())
+        return self._nodes[key]
+
+    async def _manager(self, section_code: str) -> tuple[str, RequestsForSections]:
+        """Один менеджер запросов на класс: разделы с общим менеджером делят его таблицы
+        """
+        manager_key = promtService.SECTION_MANAGERS[section_code].__name__
+        manager = await self._node(
+            f"manager:{manager_key}",
+            lambda: promtService.get_section_manager(section_code=section_code, exam_year=self.request.year)
+        )
+        return manager_key, manager
+
+    async def _tables(self, manager: RequestsForSections) -> list[TableStandart]:
+        # Набор последних попыток общий для менеджеров всех разделов: его записывает первый из них
+        manager.useLastResults(await self._node("last_results", manager.prepareLastResults))
+        if promtService.PROMT_DATA_CONCURRENT:
+            return await promtService.get_section_tables(manager)
+        async with async_session() as session:
+            return await manager.getListOfTables(session=session)
+
+    async def _example(self, manager: RequestsForSections, section_code: str) -> QdrantReportSection | None:
+        return await asyncio.to_thread(promtService.get_section_example, manager, section_code, self.request.year)
+
+    async def _section_data(self, section_code: str) -> tuple[PromtCacheKey | None, CachedPromt, bool]:
+        """Данные раздела из кэша промтов, а если их там нет - из общих узлов таблиц и примеров
+
+        Returns:
+            tuple[PromtCacheKey | None, CachedPromt, bool]: Ключ кэша промтов, данные раздела, взяты ли они из кэша
+        """
+        manager_key, manager = await self._manager(section_code)
+        cache_key = await promtService.get_promt_cache_key(manager, self.request, section_code)
+        cached = promtService.promt_cache.get(cache_key)
+        if cached is not None:
+            return cache_key, cached, True
+        # Тот же срок сбора данных, что и для одного раздела. Узлы общие для разделов, поэтому по истечении срока
+        # отменяется только ожидание этого раздела, а незавершённые узлы отменяются вместе с отчётом
+        try:
+            async with asyncio.timeout(promtService.PROMT_DATA_TIMEOUT):
+                tables, section_data = await asyncio.gather(
+                    asyncio.shield(self._node(f"tables:{manager_key}", lambda: self._tables(manager))),
+                    asyncio.shield(self._node(f"example:{section_code}", lambda: self._example(manager, section_code))),
+                )
+        except TimeoutError:
+            raise promtService.PromtDataTimeoutError(
+                f"Prompt data for section {section_code} was not gathered in {promtService.PROMT_DATA_TIMEOUT} s"
+            )
+        # Таблицы для обязательного текста уже в кэше менеджера, сессия к БД не понадобится
+        async with async_session() as session:
+            template, obligatury_text = await promtService.get_section_template(
+                session=session, manager=manager, section_code=section_code, request=self.request
+            )
+        return cache_key, CachedPromt(tables, section_data, list(template), list(obligatury_text)), False
+
+    async def _promt(self, section_code: str) -> GenerateData:
+        cache_key, section, from_cache = await self._section_data(section_code)
+        if from_cache:
+            return await promtService.get_cached_generate_data(section, self.request, section_code)
+        return await promtService.build_generate_data(
+            cache_key, self.request, section_code, section.tables, section.section_data, section.template, section.obligatury_text
+        )
+
+    async def _map_reduce_data(self, section_code: str) -> CachedPromt:
+        cache_key, section, from_cache = await self._section_data(section_code)
+        if not from_cache:
+            promtService.promt_cache.put(cache_key, section)
+        return section
+
+    async def _section(self, section_code: str) -> ReportSectionResult:
+        result = ReportSectionResult(section_code=section_code)
+        try:
+            if llmService.resolve_mode(section_code, self.mode) == "map_reduce":
+                section = await self._node(f"data:{section_code}", lambda: self._map_reduce_data(section_code))
+                result.promt_ready = round(time.perf_counter() - self._started_at, 3)
+                result.response = await llmService.generate_text_map_reduce(
+                    None, self.request, section_code, priority=Priority.BULK, reject_when_full=False, section=section
+                )
+            else:
+                data = await self._node(f"promt:{section_code}", lambda: self._promt(section_code))
+                result.promt_ready = round(time.perf_counter() - self._started_at, 3)
+                result.response = await llmService.generate_text_by_data(data, section_code, priority=Priority.BULK, reject_when_full=False)
+            result.error = result.response.error
+        except Exception as e:
+            result.error = str(e)
+        result.finished = round(time.perf_counter() - self._started_at, 3)
+        return result
+
+    async def run(self) -> ReportGenerateResponse:
+        """Запускает граф и возвращает результаты по каждому разделу
+        """
+        # Отчёт допускается целиком: если очередь к LLM уже заполнена, отказываем сразу
+        llm_scheduler.check_admission(Priority.BULK)
+        self._started_at = time.perf_counter()
+        for section_code in self.section_codes:
+            if section_code not in promtService.SECTION_MANAGERS:
+                raise ValueError(f"Unknown section code: {section_code}")
+        try:
+            sections = await asyncio.gather(*(self._section(section_code) for section_code in self.section_codes))
+        finally:
+            # Отчёт отменён (клиент отключился) - не оставляем висеть общие узлы графа
+            for task in self._nodes.values():
+                if not task.done():
+                    task.cancel()
+        return ReportGenerateResponse(
+            sections=list(sections),
+            time=round(time.perf_counter() - self._started_at, 3)
+        )
+
+
+async def generate_report(request: LLMRequest, section_codes: list[str], mode: str | None = None) -> ReportGenerateResponse:
+    return await ReportPipeline(request=request, section_codes=section_codes, mode=mode).run()
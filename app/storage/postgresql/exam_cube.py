@@ -0,0 +1,225 @@
+from sqlalchemy import MetaData, Table, Column, Integer, SmallInteger, BigInteger, Boolean, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from os import getenv
+
+
+# Менеджеры запросов разделов 1.7. и 2.5. берут данные из предагрегированного куба (для годов, по которым он собран)
+PG_EXAM_CUBE = getenv("PG_EXAM_CUBE", "0") == "1"
+
+# Куб итоговых результатов: последние попытки (status_id = 6), сгруппированные по всем измерениям таблиц разделов.
+# Строки с subject_id IS NULL - итог по всем предметам года (участник, сдававший несколько предметов, считается один раз).
+# Количество участников суммируется между строками одного предмета и года: у участника одна схема экзамена по предмету за год
+EXAM_CUBE = "exam_cube"
+# Распределение тестовых баллов по всем попыткам, как в таблице распределения баллов раздела 2.5.
+# Участник с одним баллом по предмету в нескольких годах окна считается один раз: в каждой строке хранится prev_year -
+# последний из двух предыдущих годов с тем же баллом участника (NULL - таких нет). За окно из трёх лет суммируются
+# строки, у которых prev_year вне окна, т.е. участник учитывается в первом году окна с этим баллом
+EXAM_POINTS_CUBE = "exam_points_cube"
+# Годы, за которые куб собран: по этой таблице все процессы приложения решают, считать ли таблицы по кубу
+EXAM_CUBE_YEARS = "exam_cube_years"
+
+CREATE_TABLE_QUERIES = [
+    text(f"""
+    CREATE TABLE IF NOT EXISTS {EXAM_CUBE} (
+        exam_year smallint NOT NULL,
+        exam_type_id smallint NOT NULL,
+        subject_id integer,
+        sex boolean,
+        category_id integer,
+        is_ovz boolean,
+        school_code integer,
+        school_kind_code integer,
+        area_id integer,
+        students_count integer NOT NULL,
+        results_count integer NOT NULL,
+        points_count integer NOT NULL,
+        bucket_0 integer NOT NULL,
+        bucket_1 integer NOT NULL,
+        bucket_2 integer NOT NULL,
+        bucket_3 integer NOT NULL,
+        points_sum bigint NOT NULL
+    )
+    """),
+    text(f"CREATE INDEX IF NOT EXISTS {EXAM_CUBE}_exam_idx ON {EXAM_CUBE} (exam_type_id, subject_id, exam_year)"),
+    text(f"""
+    CREATE TABLE IF NOT EXISTS {EXAM_POINTS_CUBE} (
+        exam_year smallint NOT NULL,
+        exam_type_id smallint NOT NULL,
+        subject_id integer NOT NULL,
+        final_points smallint,
+        prev_year smallint,
+        students_count integer NOT NULL
+    )
+    """),
+    text(f"CREATE INDEX IF NOT EXISTS {EXAM_POINTS_CUBE}_exam_idx ON {EXAM_POINTS_CUBE} (exam_type_id, subject_id, exam_year)"),
+    text(f"""
+    CREATE TABLE IF NOT EXISTS {EXAM_CUBE_YEARS} (
+        exam_year smallint PRIMARY KEY,
+        built_at timestamptz NOT NULL DEFAULT now()
+    )
+    """),
+]
+
+# Диапазоны баллов те же, что в запросах раздела 2.5.
+BUILD_YEAR_QUERIES = [
+    text(f"DELETE FROM {EXAM_CUBE} WHERE exam_year = :year"),
+    text(f"""
+    INSERT INTO {EXAM_CUBE}
+    SELECT
+        ts.exam_year,
+        ts.exam_type_id,
+        ts.subject_id,
+        st.sex,
+        st.category_id,
+        st.is_ovz,
+        st.school_id,
+        sc.kind_code,
+        sc.area_id,
+        count(DISTINCT er.student_id),
+        count(*),
+        count(er.final_points),
+        sum(CASE WHEN er.score = 2 THEN 1 ELSE 0 END),
+        sum(CASE WHEN er.score <> 2 AND er.final_points < 61 THEN 1 ELSE 0 END),
+        sum(CASE WHEN er.final_points BETWEEN 61 AND 80 THEN 1 ELSE 0 END),
+        sum(CASE WHEN er.final_points BETWEEN 81 AND 100 THEN 1 ELSE 0 END),
+        coalesce(sum(er.final_points), 0)
+    FROM (
+        SELECT
+            exam_results.*,
+            row_number() OVER (PARTITION BY exam_results.student_id, exam_results.schema_id ORDER BY exam_results.exam_date DESC) AS rn
+        FROM exam_results
+        JOIN test_schemes ON test_schemes.id = exam_results.schema_id
+        WHERE exam_results.status_id = 6 AND test_schemes.exam_year = :year
+    ) er
+    JOIN test_schemes ts ON ts.id = er.schema_id
+    JOIN students st ON st.id = er.student_id
+    LEFT JOIN schools sc ON sc.code = st.school_id
+    WHERE er.rn = 1
+    GROUP BY GROUPING SETS (
+        (ts.exam_year, ts.exam_type_id, ts.subject_id, st.sex, st.category_id, st.is_ovz, st.school_id, sc.kind_code, sc.area_id),
+        (ts.exam_year, ts.exam_type_id)
+    )
+    """),
+    text(f"DELETE FROM {EXAM_POINTS_CUBE} WHERE exam_year = :year"),
+    text(f"""
+    INSERT INTO {EXAM_POINTS_CUBE}
+    SELECT cur.exam_year, cur.exam_type_id, cur.subject_id, cur.final_points, prev.prev_year, count(*)
+    FROM (
+        SELECT DISTINCT ts.exam_year, ts.exam_type_id, ts.subject_id, er.final_points, er.student_id
+        FROM exam_results er
+        JOIN test_schemes ts ON ts.id = er.schema_id
+        WHERE ts.exam_year = :year
+    ) cur
+    LEFT JOIN (
+        SELECT ts.exam_type_id, ts.subject_id, er.final_points, er.student_id, max(ts.exam_year) AS prev_year
+        FROM exam_results er
+        JOIN test_schemes ts ON ts.id = er.schema_id
+        WHERE ts.exam_year BETWEEN :year - 2 AND :year - 1
+        GROUP BY ts.exam_type_id, ts.subject_id, er.final_points, er.student_id
+    ) prev ON prev.exam_type_id = cur.exam_type_id
+        AND prev.subject_id = cur.subject_id
+        AND prev.student_id = cur.student_id
+        AND prev.final_points IS NOT DISTINCT FROM cur.final_points
+    GROUP BY cur.exam_year, cur.exam_type_id, cur.subject_id, cur.final_points, prev.prev_year
+    """),
+    text(f"""
+    INSERT INTO {EXAM_CUBE_YEARS} (exam_year) VALUES (:year)
+    ON CONFLICT (exam_year) DO UPDATE SET built_at = now()
+    """),
+]
+
+metadata = MetaData()
+
+exam_cube = Table(
+    EXAM_CUBE,
+    metadata,
+    Column("exam_year", SmallInteger),
+    Column("exam_type_id", SmallInteger),
+    Column("subject_id", Integer),
+    Column("sex", Boolean),
+    Column("category_id", Integer),
+    Column("is_ovz", Boolean),
+    Column("school_code", Integer),
+    Column("school_kind_code", Integer),
+    Column("area_id", Integer),
+    Column("students_count", Integer),
+    Column("results_count", Integer),
+    Column("points_count", Integer),
+    Column("bucket_0", Integer),
+    Column("bucket_1", Integer),
+    Column("bucket_2", Integer),
+    Column("bucket_3", Integer),
+    Column("points_sum", BigInteger),
+)
+
+exam_points_cube = Table(
+    EXAM_POINTS_CUBE,
+    metadata,
+    Column("exam_year", SmallInteger),
+    Column("exam_type_id", SmallInteger),
+    Column("subject_id", Integer),
+    Column("final_points", SmallInteger),
+    Column("prev_year", SmallInteger),
+    Column("students_count", Integer),
+)
+
+
+class ExamCube:
+    """
+    Управление кубом итоговых результатов: создание таблиц и пересборка по годам
+    """
+    async def hasYears(self, session: AsyncSession, first_year: int, last_year: int) -> bool:
+        """Проверяет, собран ли куб за все годы диапазона
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            first_year (int): Первый год
+            last_year (int): Последний год (включительно)
+
+        Returns:
+            bool: Все годы собраны
+        """
+        query = await session.execute(
+            text(f"SELECT count(*) FROM {EXAM_CUBE_YEARS} WHERE exam_year BETWEEN :first_year AND :last_year"),
+            {"first_year": first_year, "last_year": last_year}
+        )
+        return query.scalar() == last_year - first_year + 1
+
+    async def create(self, session: AsyncSession) -> None:
+        """Создаёт таблицы куба и их индексы, если их ещё нет
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        """
+        for query in CREATE_TABLE_QUERIES:
+            await session.execute(query)
+        await session.commit()
+
+    async def loadYears(self, session: AsyncSession) -> list[int]:
+        """Загружает список собранных годов
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+
+        Returns:
+            list[int]: Собранные годы по возрастанию
+        """
+        query = await session.execute(text(f"SELECT exam_year FROM {EXAM_CUBE_YEARS} ORDER BY exam_year"))
+        return [row[0] for row in query.all()]
+
+    async def buildYear(self, session: AsyncSession, year: int) -> int:
+        """Пересобирает куб за год в одной транзакции: запросы таблиц до фиксации читают прежние строки,
+        а год отмечается собранным вместе с его строками
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            year (int): Год проведения экзаменов
+
+        Returns:
+            int: Количество строк куба за год
+        """
+        for query in BUILD_YEAR_QUERIES:
+            await session.execute(query, {"year": year})
+        await session.commit()
+        query = await session.execute(text(f"SELECT count(*) FROM {EXAM_CUBE} WHERE exam_year = :year"), {"year": year})
+        return query.scalar()
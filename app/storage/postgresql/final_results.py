@@ -0,0 +1,105 @@
+from sqlalchemy import MetaData, Table, Column, SmallInteger, text
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.ext.asyncio import AsyncSession
+from os import getenv
+
+
+# Менеджеры запросов разделов берут последние попытки участников из представления final_results
+PG_FINAL_RESULTS_VIEW = getenv("PG_FINAL_RESULTS_VIEW", "0") == "1"
+
+# Итоговые результаты участников: последняя попытка (status_id = 6) по каждой схеме экзамена с её годом и типом экзамена.
+# Представление заменяет только отбор последних попыток (row_number() по всем результатам):
+# измерения участника, школы и экзамена запросы таблиц берут соединениями по exam_id, как и без него
+FINAL_RESULTS_VIEW = "final_results"
+
+CREATE_VIEW_QUERY = text(f"""
+CREATE MATERIALIZED VIEW IF NOT EXISTS {FINAL_RESULTS_VIEW} AS
+SELECT
+    er.id AS exam_id,
+    er.schema_id,
+    ts.exam_year,
+    ts.exam_type_id
+FROM (
+    SELECT
+        exam_results.id,
+        exam_results.schema_id,
+        row_number() OVER (PARTITION BY student_id, schema_id ORDER BY exam_date DESC) AS rn
+    FROM exam_results
+    WHERE status_id = 6
+) er
+JOIN test_schemes ts ON ts.id = er.schema_id
+WHERE er.rn = 1
+WITH DATA
+""")
+
+# Уникальный индекс обязателен для REFRESH MATERIALIZED VIEW CONCURRENTLY
+CREATE_INDEX_QUERIES = [
+    text(f"CREATE UNIQUE INDEX IF NOT EXISTS {FINAL_RESULTS_VIEW}_exam_id_idx ON {FINAL_RESULTS_VIEW} (exam_id)"),
+    text(f"CREATE INDEX IF NOT EXISTS {FINAL_RESULTS_VIEW}_year_idx ON {FINAL_RESULTS_VIEW} (exam_type_id, exam_year)"),
+]
+
+final_results = Table(
+    FINAL_RESULTS_VIEW,
+    MetaData(),
+    Column("exam_id", UUID(as_uuid=True), primary_key=True),
+    Column("schema_id", SmallInteger),
+    Column("exam_year", SmallInteger),
+    Column("exam_type_id", SmallInteger),
+)
+
+
+class FinalResultsView:
+    """
+    Управление материализованным представлением итоговых результатов
+    """
+    # Представление создано и заполнено: до этого менеджеры запросов считают последние попытки сами
+    ready = False
+    
+    async def exists(self, session: AsyncSession) -> bool:
+        """Проверяет, создано ли представление
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+
+        Returns:
+            bool: Представление существует
+        """
+        query = await session.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": FINAL_RESULTS_VIEW})
+        exists = bool(query.scalar())
+        type(self).ready = exists
+        return exists
+
+    async def create(self, session: AsyncSession) -> None:
+        """Создаёт и заполняет представление и его индексы, если их ещё нет
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        """
+        await session.execute(CREATE_VIEW_QUERY)
+        for query in CREATE_INDEX_QUERIES:
+            await session.execute(query)
+        await session.commit()
+        type(self).ready = True
+
+    async def refresh(self, session: AsyncSession, concurrently: bool = True) -> None:
+        """Пересчитывает представление. CONCURRENTLY не блокирует чтение, но требует уже заполненного представления
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            concurrently (bool, optional): Обновлять без блокировки чтения. Defaults to True.
+        """
+        await session.execute(text(
+            f"REFRESH MATERIALIZED VIEW {'CONCURRENTLY ' if concurrently else ''}{FINAL_RESULTS_VIEW}"
+        ))
+
+    async def countRows(self, session: AsyncSession) -> int:
+        """Количество итоговых результатов в представлении
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+
+        Returns:
+            int: Количество строк
+        """
+        query = await session.execute(text(f"SELECT count(*) FROM {FINAL_RESULTS_VIEW}"))
+        return query.scalar()
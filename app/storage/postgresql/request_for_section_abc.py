@@ -1,13 +1,44 @@
-from sqlalchemy import func, select, and_, Numeric, Column, CTE
+from sqlalchemy import func, select, and_, delete, insert, literal, Numeric, Column, CTE, Select, Subquery
+from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import aliased, InstrumentedAttribute
 from sqlalchemy.sql.expression import ColumnElement
 from types import SimpleNamespace
+from typing import Awaitable, Callable
 from abc import ABC, abstractmethod
-from datetime import datetime
+from datetime import datetime, timedelta
+from os import getenv
+import asyncio
+import time
+import uuid
 
+from app.db.connect_db import async_session, engine
 from app.models.models import *
 from app.schemas.text_reports import TableStandart
+from app.storage.postgresql.final_results import final_results, FinalResultsView, PG_FINAL_RESULTS_VIEW
+from app.storage.postgresql.exam_cube import exam_cube
+
+
+# Последние попытки участников считаются один раз на окно лет и тип экзамена и записываются в UNLOGGED-таблицу last_exam_results
+PG_MATERIALIZE_LAST_RESULTS = getenv("PG_MATERIALIZE_LAST_RESULTS", "1") == "1"
+# Через сколько секунд наборы последних попыток удаляются из last_exam_results; используются повторно они до половины этого срока
+PG_LAST_RESULTS_TTL = int(getenv("PG_LAST_RESULTS_TTL", "3600"))
+# Окно лет общего набора: запросы таблиц с меньшим окном и фильтрами по предмету выбирают из него свои строки
+LAST_RESULTS_YEARS = 3
+# Таблицы раздела запрашиваются одновременно, каждая в своей сессии
+PG_TABLES_CONCURRENT = getenv("PG_TABLES_CONCURRENT", "1") == "1"
+# Не больше одновременных запросов таблиц, чем постоянных соединений в пуле движка
+PG_TABLES_MAX_CONCURRENCY = int(getenv("PG_TABLES_MAX_CONCURRENCY", str(engine.pool.size())))
+
+# Категории участников и типы ОО, попадающие в таблицы разделов
+STUDENT_CATEGORIES = [1, 3, 4]
+SCHOOL_KINDS_CODES = [101, 102, 103, 104, 1001, 2201]
+
+_lastResultsTableReady = False
+# Наборы последних попыток, общие для всех менеджеров процесса: ключ запроса -> (run_id, время записи по time.monotonic())
+_lastResultsRuns: dict[str, tuple[uuid.UUID, float]] = {}
+_lastResultsLock = asyncio.Lock()
+_tablesSemaphore = asyncio.Semaphore(PG_TABLES_MAX_CONCURRENCY)
 
 
 class RequestsForSections(ABC):
@@ -25,6 +56,8 @@ class RequestsForSections(ABC):
         self.exam_type_id = exam_type_id
         self.subject_id = subject_id
         self._tables = SimpleNamespace()
+        # Наборы последних попыток, которые уже читают запросы этого менеджера: все его таблицы считаются по одному набору
+        self._lastResults: dict[str, uuid.UUID] = {}
         self._addClassTables()
     
     def _calculteProcent(self, part: ColumnElement | InstrumentedAttribute | Column, all: ColumnElement | InstrumentedAttribute | Column, rounding: int = 1) -> ColumnElement:
@@ -40,14 +73,17 @@ class RequestsForSections(ABC):
         """
         return func.round(func.cast(100.0, Numeric) * func.coalesce(part, 0) / all, rounding)
     
-    def _getASC(
-            self,
-            dop_filters: list = [],
-            group_by: list[Column] = [TestSchemes.exam_year],
-            year_count: int = 3,
-            dop_joins: list[tuple[Column, any]] = []
-        ) -> tuple[CTE, CTE]:
-        only_last_res = (
+    def _getLastResQuery(self, dop_filters: list = [], year_count: int = 3) -> Select:
+        """Запрос последних попыток участников: номер попытки rn по убыванию даты для каждого участника и схемы экзамена
+        
+        Args:
+            dop_filters (list, optional): Дополнительные фильтры. Defaults to [].
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 3.
+        
+        Returns:
+            Select: Запрос со столбцами exam_id и rn
+        """
+        return (
             select(
                 ExamResults.id.label("exam_id"),
                 func.row_number().over(
@@ -63,7 +99,170 @@ class RequestsForSections(ABC):
                 # ExamResults.exam_date.between(self.start_date, self.end_date),
                 *dop_filters
             )
-        ).cte("only_last_res")
+        )
+    
+    def _getFinalResultsQuery(self, dop_filters: list = [], year_count: int = 3) -> Select:
+        """Последние попытки участников из представления final_results (уже без повторных попыток)
+        
+        Args:
+            dop_filters (list, optional): Дополнительные фильтры по TestSchemes. Defaults to [].
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 3.
+        
+        Returns:
+            Select: Запрос со столбцами exam_id и rn (всегда 1)
+        """
+        return (
+            select(final_results.c.exam_id.label("exam_id"), literal(1).label("rn"))
+            .join(TestSchemes, final_results.c.schema_id == TestSchemes.id)
+            .filter(
+                final_results.c.exam_year.between(self.year+1-year_count, self.year),
+                final_results.c.exam_type_id == self.exam_type_id,
+                *dop_filters
+            )
+        )
+    
+    def _getCubeFilters(self, year_count: int = 3, all_subjects: bool = False) -> list:
+        """Фильтры строк куба exam_cube по окну лет, типу экзамена и предмету
+        
+        Args:
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 3.
+            all_subjects (bool, optional): Брать итог по всем предметам вместо текущего предмета. Defaults to False.
+        
+        Returns:
+            list: Условия для filter
+        """
+        return [
+            exam_cube.c.exam_year.between(self.year+1-year_count, self.year),
+            exam_cube.c.exam_type_id == self.exam_type_id,
+            exam_cube.c.subject_id.is_(None) if all_subjects else exam_cube.c.subject_id == self.subject_id,
+        ]
+    
+    async def _materializeLastRes(self, query: Select) -> uuid.UUID:
+        """Записывает последние попытки в таблицу last_exam_results в отдельной транзакции,
+        чтобы их видели запросы таблиц из любых сессий. Заодно удаляет устаревшие наборы,
+        кроме тех, что этот процесс ещё выдаёт менеджерам
+        
+        Args:
+            query (Select): Запрос последних попыток (см. _getLastResQuery)
+        
+        Returns:
+            uuid.UUID: Идентификатор набора (run_id)
+        """
+        global _lastResultsTableReady
+        run_id = uuid.uuid4()
+        last_res = query.subquery()
+        async with async_session() as session:
+            async with session.begin():
+                if not _lastResultsTableReady:
+                    connection = await session.connection()
+                    await connection.run_sync(LastExamResults.__table__.create, checkfirst=True)
+                await session.execute(
+                    delete(LastExamResults)
+                    .filter(
+                        LastExamResults.created_at < func.now() - timedelta(seconds=PG_LAST_RESULTS_TTL),
+                        LastExamResults.run_id.notin_([run[0] for run in _lastResultsRuns.values()]),
+                    )
+                )
+                await session.execute(
+                    insert(LastExamResults).from_select(
+                        ["run_id", "exam_id"],
+                        select(literal(run_id, UUID(as_uuid=True)), last_res.c.exam_id).filter(last_res.c.rn == 1)
+                    )
+                )
+            # Таблица точно есть только после фиксации транзакции: при откате её создание тоже откатывается
+            _lastResultsTableReady = True
+        return run_id
+    
+    async def _getLastResRunId(self) -> uuid.UUID | None:
+        """Набор последних попыток за LAST_RESULTS_YEARS лет по типу экзамена в last_exam_results.
+        Набор общий для менеджеров всех разделов: записывается один раз и используется повторно до PG_LAST_RESULTS_TTL/2
+
+        Returns:
+            uuid.UUID | None: Идентификатор набора (run_id); None, если записать набор не удалось
+        """
+        query = self._getLastResQuery(year_count=LAST_RESULTS_YEARS)
+        key = str(query.compile(compile_kwargs={"literal_binds": True}))
+        if key in self._lastResults:
+            return self._lastResults[key]
+
+        async with _lastResultsLock:
+            run = _lastResultsRuns.get(key)
+            if run is None or time.monotonic() - run[1] >= PG_LAST_RESULTS_TTL / 2:
+                try:
+                    run = (await self._materializeLastRes(query), time.monotonic())
+                except Exception as e:
+                    # Нет прав на создание таблицы или запись в неё - считаем по-старому в каждом запросе
+                    print(f"⚠️ last_exam_results: {e}")
+                    return None
+                _lastResultsRuns[key] = run
+
+        self._lastResults[key] = run[0]
+        return run[0]
+    
+    async def prepareLastResults(self) -> dict[str, uuid.UUID]:
+        """Заранее записывает (или берёт уже записанный) общий набор последних попыток,
+        чтобы менеджеры других разделов отчёта читали его же, не дожидаясь своих таблиц
+
+        Returns:
+            dict[str, uuid.UUID]: Наборы, по которым считаются таблицы этого менеджера (см. useLastResults)
+        """
+        if (PG_FINAL_RESULTS_VIEW and FinalResultsView.ready) or not PG_MATERIALIZE_LAST_RESULTS:
+            return {}
+        await self._getLastResRunId()
+        return dict(self._lastResults)
+    
+    def useLastResults(self, last_results: dict[str, uuid.UUID]) -> None:
+        """Считать таблицы по наборам последних попыток, подготовленным другим менеджером
+
+        Args:
+            last_results (dict[str, uuid.UUID]): Наборы из prepareLastResults
+        """
+        self._lastResults.update(last_results)
+    
+    async def _getLastRes(self, dop_filters: list = [], year_count: int = 3) -> CTE | Subquery:
+        """Последние попытки участников для окна лет и типа экзамена.
+        С PG_FINAL_RESULTS_VIEW они берутся из представления final_results (пока оно не создано - как без него).
+        С PG_MATERIALIZE_LAST_RESULTS запросы таблиц выбирают их из общего набора в last_exam_results по первичному ключу.
+        Номер попытки считается в пределах схемы экзамена, а схема задаёт год и предмет,
+        поэтому фильтры по ним дают те же попытки, что и в отдельном пересчёте
+        
+        Args:
+            dop_filters (list, optional): Дополнительные фильтры. Defaults to [].
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 3.
+        
+        Returns:
+            CTE | Subquery: Подзапрос со столбцами exam_id и rn
+        """
+        if PG_FINAL_RESULTS_VIEW and FinalResultsView.ready:
+            return self._getFinalResultsQuery(dop_filters=dop_filters, year_count=year_count).subquery("only_last_res")
+        
+        query = self._getLastResQuery(dop_filters=dop_filters, year_count=year_count)
+        if not PG_MATERIALIZE_LAST_RESULTS or year_count > LAST_RESULTS_YEARS:
+            return query.cte("only_last_res")
+        
+        run_id = await self._getLastResRunId()
+        if run_id is None:
+            return query.cte("only_last_res")
+        
+        return (
+            select(LastExamResults.exam_id.label("exam_id"), literal(1).label("rn"))
+            .join(ExamResults, ExamResults.id == LastExamResults.exam_id)
+            .join(TestSchemes, ExamResults.schema_id == TestSchemes.id)
+            .filter(
+                LastExamResults.run_id == run_id,
+                TestSchemes.exam_year.between(self.year+1-year_count, self.year),
+                *dop_filters
+            )
+        ).subquery("only_last_res")
+    
+    async def _getASC(
+            self,
+            dop_filters: list = [],
+            group_by: list[Column] = [TestSchemes.exam_year],
+            year_count: int = 3,
+            dop_joins: list[tuple[Column, any]] = []
+        ) -> tuple[CTE, CTE | Subquery]:
+        only_last_res = await self._getLastRes(dop_filters=dop_filters, year_count=year_count)
         
         all_students_count = (
             select(
@@ -84,5 +283,50 @@ class RequestsForSections(ABC):
         pass
     
     @abstractmethod
-    async def getListOfTables(self, session: AsyncSession) -> list[TableStandart]:
+    def getTableRequests(self) -> list[Callable[[AsyncSession], Awaitable[TableStandart]]]:
+        """Запросы таблиц, требуемых для генерации промта, в порядке их следования в промте
+        """
         pass
+    
+    async def _fetchTable(self, request: Callable[[AsyncSession], Awaitable[TableStandart]]) -> TableStandart:
+        """Выполняет запрос таблицы в собственной сессии из пула соединений,
+        не занимая больше PG_TABLES_MAX_CONCURRENCY соединений на все менеджеры
+        
+        Args:
+            request (Callable[[AsyncSession], Awaitable[TableStandart]]): Запрос таблицы
+        
+        Returns:
+            TableStandart: Таблица
+        """
+        async with _tablesSemaphore:
+            async with async_session() as session:
+                return await request(session)
+    
+    async def getListOfTablesConcurrently(self) -> list[TableStandart]:
+        """Возвращает список таблиц, требуемых для генерации промта, запрашивая их одновременно,
+        каждую в своей сессии. Порядок таблиц сохраняется
+        
+        Returns:
+            list[TableStandart]: Список таблиц
+        """
+        return list(await asyncio.gather(*(self._fetchTable(request) for request in self.getTableRequests())))
+    
+    async def getListOfTables(self, session: AsyncSession) -> list[TableStandart]:
+        """Возвращает список таблиц, требуемых для генерации промта.
+        С PG_TABLES_CONCURRENT таблицы запрашиваются одновременно в отдельных сессиях (переданная сессия не используется)
+        
+        Args:
+            session (AsyncSession): Сессия
+        
+        Returns:
+            list[TableStandart]: Список таблиц
+        """
+        if PG_TABLES_CONCURRENT:
+            return await self.getListOfTablesConcurrently()
+        
+        result = []
+        for request in self.getTableRequests():
+            table = await request(session)
+            result.append(table)
+        
+        return result
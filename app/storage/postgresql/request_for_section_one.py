@@ -1,9 +1,10 @@
 from sqlalchemy import func, select, and_, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable
 
 from app.models.models import *
 from app.schemas.text_reports import TableStandart
-from app.storage.postgresql.request_for_section_abc import RequestsForSections
+from app.storage.postgresql.request_for_section_abc import RequestsForSections, STUDENT_CATEGORIES, SCHOOL_KINDS_CODES
 
 class RequestsForFirstSection(RequestsForSections):
     def _addClassTables(self) -> None:
@@ -15,44 +16,33 @@ class RequestsForFirstSection(RequestsForSections):
         self._tables.schoolKinds = None
         self._tables.areas = None
     
-    async def getListOfTables(self, session: AsyncSession) -> list[TableStandart]:
-        """Возвращает списко таблиц, требуемыз для генерации промта
-        
-        Args:
-            session (AsyncSession): Сессия
+    def getTableRequests(self) -> list[Callable[[AsyncSession], Awaitable[TableStandart]]]:
+        """Возвращает запросы таблиц, требуемых для генерации промта
         
         Returns:
-            list[TableStandart]: Список таблиц
+            list[Callable[[AsyncSession], Awaitable[TableStandart]]]: Запросы таблиц
         """
-        result = []
         tables = [
-            self.getTable_count(session),
-            self.getTable_sex(session),
-            self.getTable_schoolKinds(session),
+            self.getTable_count,
+            self.getTable_sex,
+            self.getTable_schoolKinds,
         ]
         
         if self.subject_id in (2, 22):
-            tables.append(self.getTable_profBaseMat(session))
+            tables.append(self.getTable_profBaseMat)
         
-        for corutine_table in tables:
-            table = await corutine_table
-            result.append(table)
-        
-        return result
+        return tables
     
-    async def getTable_count(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу количества участников за текущий год и 2 предыдущих
+    async def _getData_count(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по предмету и их доля от всех участников по годам: (год, чел., %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Итоговая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.count is not None:
-            return self._tables.count
-        
-        all_students_count, only_last_res = self._getASC()
+        all_students_count, only_last_res = await self._getASC()
         
         subjects_students_count = (
             select(
@@ -75,7 +65,21 @@ class RequestsForFirstSection(RequestsForSections):
             .join(all_students_count, all_students_count.c.exam_year == subjects_students_count.c.year)
         )
         
-        data = query.all()
+        return query.all()
+    
+    async def getTable_count(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу количества участников за текущий год и 2 предыдущих
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Итоговая таблица
+        """
+        if self._tables.count is not None:
+            return self._tables.count
+        
+        data = await self._getData_count(session)
         
         result = TableStandart(
             column_names=[
@@ -98,20 +102,16 @@ class RequestsForFirstSection(RequestsForSections):
         
         return result
     
-    async def getTable_sex(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу гендерного распределения участников по 3 годам
+    async def _getData_sex(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по полу и годам: (пол, год, чел., %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Итоговая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.sex is not None:
-            return self._tables.sex
-        
-        categories = ["Женский","Мужской"]
-        all_students_count, only_last_res = self._getASC()
+        all_students_count, only_last_res = await self._getASC()
         
         subjects_students_count = (
             select(
@@ -139,7 +139,22 @@ class RequestsForFirstSection(RequestsForSections):
             .order_by("sex", subjects_students_count.c.year)
         )
         
-        data = query.all()
+        return query.all()
+    
+    async def getTable_sex(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу гендерного распределения участников по 3 годам
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Итоговая таблица
+        """
+        if self._tables.sex is not None:
+            return self._tables.sex
+        
+        categories = ["Женский","Мужской"]
+        data = await self._getData_sex(session)
         
         result = TableStandart(
             column_names=[
@@ -168,21 +183,16 @@ class RequestsForFirstSection(RequestsForSections):
         
         return result
     
-    async def getTable_categories(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу по категориям участников
+    async def _getData_categories(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по категориям и годам: (код категории, год, чел., %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Таблица данных
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.categories is not None:
-            return self._tables.categories
-        
-        categories = [1, 3, 4]
-        category_names = ["ВТГ, обучающихся по программам СОО", "ВТГ, обучающихся по программам СПО", "ВПЛ"]
-        all_students_count, only_last_res = self._getASC()
+        all_students_count, only_last_res = await self._getASC()
         
         subjects_students_count = (
             select(
@@ -196,7 +206,7 @@ class RequestsForFirstSection(RequestsForSections):
                 TestSchemes.exam_year.between(self.year-2, self.year),
                 TestSchemes.exam_type_id == self.exam_type_id,
                 TestSchemes.subject_id == self.subject_id,
-                Students.category_id.in_(categories)
+                Students.category_id.in_(STUDENT_CATEGORIES)
             )
             .group_by(Students.category_id)
             .group_by(TestSchemes.exam_year)
@@ -213,7 +223,23 @@ class RequestsForFirstSection(RequestsForSections):
             .order_by(subjects_students_count.c.category_id, subjects_students_count.c.year)
         )
         
-        data = query.all()
+        return query.all()
+    
+    async def getTable_categories(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу по категориям участников
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Таблица данных
+        """
+        if self._tables.categories is not None:
+            return self._tables.categories
+        
+        categories = STUDENT_CATEGORIES
+        category_names = ["ВТГ, обучающихся по программам СОО", "ВТГ, обучающихся по программам СПО", "ВПЛ"]
+        data = await self._getData_categories(session)
         
         result = TableStandart(
             column_names=[
@@ -241,19 +267,16 @@ class RequestsForFirstSection(RequestsForSections):
         
         return result
     
-    async def getTable_schoolKinds(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу по видом ОО
+    async def _getData_schoolKinds(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по типам ОО и годам: (тип ОО, год, чел., %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Таблица данных
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.schoolKinds is not None:
-            return self._tables.schoolKinds
-        
-        all_students_count, only_last_res = self._getASC()
+        all_students_count, only_last_res = await self._getASC()
         
         subjects_students_count = (
             select(
@@ -270,7 +293,7 @@ class RequestsForFirstSection(RequestsForSections):
                 TestSchemes.exam_year.between(self.year-2, self.year),
                 TestSchemes.exam_type_id == self.exam_type_id,
                 TestSchemes.subject_id == self.subject_id,
-                SchoolKinds.code.in_([101, 102, 103, 104, 1001, 2201])
+                SchoolKinds.code.in_(SCHOOL_KINDS_CODES)
             )
             .group_by(SchoolKinds.code)
             .group_by(TestSchemes.exam_year)
@@ -288,7 +311,21 @@ class RequestsForFirstSection(RequestsForSections):
         )
         
         query = await session.execute(query)
-        data = query.all()
+        return query.all()
+    
+    async def getTable_schoolKinds(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу по видом ОО
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Таблица данных
+        """
+        if self._tables.schoolKinds is not None:
+            return self._tables.schoolKinds
+        
+        data = await self._getData_schoolKinds(session)
         result = TableStandart(
             column_names=[
                 "№ п/п",
@@ -325,18 +362,15 @@ class RequestsForFirstSection(RequestsForSections):
         
         return result
     
-    async def getTable_areas(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу по АТЕ региона
+    async def _getData_areas(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по АТЕ за текущий год: (АТЕ, чел., %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Итоговая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.areas is not None:
-            return self._tables.areas
-        
         all_students_count_query = await session.execute(
             select(
                 func.count(ExamResults.student_id.distinct()).label("stud_count")
@@ -368,6 +402,22 @@ class RequestsForFirstSection(RequestsForSections):
             .group_by(Areas.code)
         )
         
+        return query.all()
+    
+    async def getTable_areas(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу по АТЕ региона
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Итоговая таблица
+        """
+        if self._tables.areas is not None:
+            return self._tables.areas
+        
+        data = await self._getData_areas(session)
+        
         result = TableStandart(
             column_names=[
                 "№ п/п",
@@ -376,7 +426,7 @@ class RequestsForFirstSection(RequestsForSections):
                 "% от общего числа участников в регионе",
             ]
         )
-        for i, a in enumerate(query.all()):
+        for i, a in enumerate(data):
             result.data.append([f"{i+1}.", a[0], a[1], float(a[2])])
         result.table_name = "Количество участников ЕГЭ по учебному предмету по АТЕ региона"
         
@@ -0,0 +1,109 @@
+from sqlalchemy import func, select, case
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.models import *
+from app.storage.postgresql.request_for_section_abc import STUDENT_CATEGORIES, SCHOOL_KINDS_CODES
+from app.storage.postgresql.request_for_section_one import RequestsForFirstSection
+from app.storage.postgresql.exam_cube import exam_cube
+
+
+class RequestsForFirstSectionCube(RequestsForFirstSection):
+    """
+    Запросы раздела 1.7. по кубу exam_cube: вместо результатов экзаменов суммируются его строки.
+    Таблица профильной и базовой математики считается по результатам, как в RequestsForFirstSection:
+    участник, сдававший оба предмета, в кубе учитывается в каждом из них
+    """
+    async def _getCubeCounts(
+            self,
+            session: AsyncSession,
+            main_columns: list,
+            group_by: list,
+            order_by: list,
+            year_count: int = 3,
+            dop_joins: list[tuple] = [],
+            dop_filters: list = [],
+        ) -> list[tuple]:
+        """Количество участников по предмету в разрезе и их доля от всех участников года: (*main_columns, чел., %)
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            main_columns (list): Столбцы разреза
+            group_by (list): Параметры группировки
+            order_by (list): Порядок строк
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 3.
+            dop_joins (list[tuple], optional): Справочники для названий. Defaults to [].
+            dop_filters (list, optional): Дополнительные фильтры. Defaults to [].
+
+        Returns:
+            list[tuple]: Строки результата запроса
+        """
+        all_students_count = (
+            select(exam_cube.c.exam_year, exam_cube.c.students_count.label("stud_count"))
+            .filter(*self._getCubeFilters(year_count=year_count, all_subjects=True))
+        ).subquery("all_students_count")
+
+        stud_count = func.sum(exam_cube.c.students_count)
+        query = (
+            select(
+                *main_columns,
+                stud_count,
+                self._calculteProcent(stud_count, func.min(all_students_count.c.stud_count))
+            ).select_from(exam_cube)
+            .join(all_students_count, all_students_count.c.exam_year == exam_cube.c.exam_year)
+        )
+        for j in dop_joins:
+            query = query.join(j[0], j[1])
+        query = (
+            query
+            .filter(*self._getCubeFilters(year_count=year_count), *dop_filters)
+            .group_by(*group_by)
+            .order_by(*order_by)
+        )
+
+        query = await session.execute(query)
+        return query.all()
+
+    async def _getData_count(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeCounts(
+            session=session,
+            main_columns=[exam_cube.c.exam_year],
+            group_by=[exam_cube.c.exam_year],
+            order_by=[exam_cube.c.exam_year],
+        )
+
+    async def _getData_sex(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeCounts(
+            session=session,
+            main_columns=[case((exam_cube.c.sex, "Женский"), else_ = "Мужской").label("sex"), exam_cube.c.exam_year],
+            group_by=[exam_cube.c.sex, exam_cube.c.exam_year],
+            order_by=["sex", exam_cube.c.exam_year],
+        )
+
+    async def _getData_categories(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeCounts(
+            session=session,
+            main_columns=[exam_cube.c.category_id, exam_cube.c.exam_year],
+            group_by=[exam_cube.c.category_id, exam_cube.c.exam_year],
+            order_by=[exam_cube.c.category_id, exam_cube.c.exam_year],
+            dop_filters=[exam_cube.c.category_id.in_(STUDENT_CATEGORIES)],
+        )
+
+    async def _getData_schoolKinds(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeCounts(
+            session=session,
+            main_columns=[SchoolKinds.name, exam_cube.c.exam_year],
+            group_by=[SchoolKinds.code, exam_cube.c.exam_year],
+            order_by=[SchoolKinds.code, exam_cube.c.exam_year],
+            dop_joins=[(SchoolKinds, SchoolKinds.code == exam_cube.c.school_kind_code)],
+            dop_filters=[SchoolKinds.code.in_(SCHOOL_KINDS_CODES)],
+        )
+
+    async def _getData_areas(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeCounts(
+            session=session,
+            main_columns=[func.concat(Areas.code, " - ", Areas.name)],
+            group_by=[Areas.code],
+            order_by=[Areas.code],
+            year_count=1,
+            dop_joins=[(Areas, Areas.code == exam_cube.c.area_id)],
+        )
@@ -1,5 +1,6 @@
 from sqlalchemy import func, select, and_, case
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable
 
 from app.models.models import *
 from app.schemas.text_reports import TableStandart
@@ -12,14 +13,11 @@ class RequestsForThirdSection(RequestsForSections):
         """Создаёт коллекцию таблиц
         """ # TODO: Дописать таблицы, которые можно переиспользовать
     
-    async def getListOfTables(self, session: AsyncSession) -> list[TableStandart]:
-        """Возвращает списко таблиц, требуемыз для генерации промта
-        
-        Args:
-            session (AsyncSession): Сессия
+    def getTableRequests(self) -> list[Callable[[AsyncSession], Awaitable[TableStandart]]]:
+        """Возвращает запросы таблиц, требуемых для генерации промта
         
         Returns:
-            list[TableStandart]: Список таблиц
+            list[Callable[[AsyncSession], Awaitable[TableStandart]]]: Запросы таблиц
         """
         result = [] # TODO: Дописать
         
@@ -35,7 +33,7 @@ class RequestsForThirdSection(RequestsForSections):
         Returns:
             TableStandart: Итоговая таблица
         """
-        all_students_count, only_last_res = self._getASC(year_count=1)
+        all_students_count, only_last_res = await self._getASC(year_count=1)
         
         query = (
             select(
@@ -98,7 +96,7 @@ class RequestsForThirdSection(RequestsForSections):
         Returns:
             TableStandart: Итоговая таблица
         """
-        all_students_count, only_last_res = self._getASC(year_count=1)
+        all_students_count, only_last_res = await self._getASC(year_count=1)
         
         getted_balls = (
             select(
@@ -1,14 +1,23 @@
-from sqlalchemy import func, select, and_, case, desc, Column
+from sqlalchemy import func, select, and_, case, desc, tuple_, literal_column, Column
 from sqlalchemy.ext.asyncio import AsyncSession
+from typing import Awaitable, Callable
 from sqlalchemy.sql.expression import ColumnElement
-from decimal import Decimal
+from decimal import Decimal, ROUND_HALF_UP
+from os import getenv
+import asyncio
 
 from app.models.models import *
 from app.schemas.text_reports import TableStandart
-from app.storage.postgresql.request_for_section_abc import RequestsForSections
+from app.storage.postgresql.request_for_section_abc import RequestsForSections, SCHOOL_KINDS_CODES
 
 
+# Разрезы по категории участника, типу ОО, полу и АТЕ считаются одним запросом с GROUPING SETS
+PG_GROUPING_SETS = getenv("PG_GROUPING_SETS", "1") == "1"
+
 class RequestsForSecondSection(RequestsForSections):
+    # Таблицы по категориям, типам ОО, полу и АТЕ берутся из общего результата _getBreakdowns
+    useBreakdowns = PG_GROUPING_SETS
+    
     def _addClassTables(self):
         """Создаёт коллекцию таблиц
         """
@@ -20,46 +29,35 @@ class RequestsForSecondSection(RequestsForSections):
         self._tables.resultByAreas = None
         self._tables.hightResults = None
         self._tables.lowResults = None
+        self._tables.breakdowns = None
+        self._breakdownsLock = asyncio.Lock()
     
-    async def getListOfTables(self, session: AsyncSession) -> list[TableStandart]:
-        """Возвращает списко таблиц, требуемыз для генерации промта
-        
-        Args:
-            session (AsyncSession): Сессия
+    def getTableRequests(self) -> list[Callable[[AsyncSession], Awaitable[TableStandart]]]:
+        """Возвращает запросы таблиц, требуемых для генерации промта
         
         Returns:
-            list[TableStandart]: Список таблиц
+            list[Callable[[AsyncSession], Awaitable[TableStandart]]]: Запросы таблиц
         """
-        result = []
-        tables = [
-            self.getTable_scoreDictribution(session),
-            self.getTable_resultDynamic(session),
-            self.getTable_resultByStudCat(session),
-            self.getTable_resultBySchoolKinds(session),
-            self.getTable_resultBySex(session),
-            self.getTable_resultByAreas(session),
-            self.getTable_hightResults(session),
-            self.getTable_lowResults(session),
+        return [
+            self.getTable_scoreDictribution,
+            self.getTable_resultDynamic,
+            self.getTable_resultByStudCat,
+            self.getTable_resultBySchoolKinds,
+            self.getTable_resultBySex,
+            self.getTable_resultByAreas,
+            self.getTable_hightResults,
+            self.getTable_lowResults,
         ]
-        
-        for corutine_table in tables:
-            table = await corutine_table
-            result.append(table)
-        
-        return result
     
-    async def getTable_scoreDictribution(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу распределения тестовых баллов
+    async def _getData_scoreDictribution(self, session: AsyncSession) -> list[tuple]:
+        """Количество участников по тестовым баллам за 3 года: (балл, чел.)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableDicTableStandarttribution: Готовая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.scoreDictribution is not None:
-            return self._tables.scoreDictribution
-        
         query = await session.execute(
             select(
                 ExamResults.final_points,
@@ -75,8 +73,22 @@ class RequestsForSecondSection(RequestsForSections):
             .order_by(ExamResults.final_points)
         )
         
+        return query.all()
+    
+    async def getTable_scoreDictribution(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу распределения тестовых баллов
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableDicTableStandarttribution: Готовая таблица
+        """
+        if self._tables.scoreDictribution is not None:
+            return self._tables.scoreDictribution
+        
         result = TableStandart(column_names=["Балл", "Количество"])
-        for data in query.all():
+        for data in await self._getData_scoreDictribution(session):
             result.data.append([data[0], data[1]])
         result.table_name = "Диаграмма распределения тестовых баллов участников ЕГЭ по предмету в 2025 г."
         
@@ -109,7 +121,7 @@ class RequestsForSecondSection(RequestsForSections):
         Returns:
             list[tuple[int | float]]: Результат запроса
         """
-        all_students_count, only_last_res = self._getASC(
+        all_students_count, only_last_res = await self._getASC(
             dop_filters=[TestSchemes.subject_id == self.subject_id],
             year_count=year_count,
             group_by=group_by,
@@ -150,6 +162,109 @@ class RequestsForSecondSection(RequestsForSections):
         
         return query.all()
     
+    def _calculteProcentValue(self, part: int | None, all: int) -> Decimal:
+        """Процент от числа, округлённый так же, как в _calculteProcent (numeric round в PostgreSQL)
+        """
+        return (Decimal(100) * (part or 0) / all).quantize(Decimal("0.1"), rounding=ROUND_HALF_UP)
+    
+    async def _getBreakdowns(self, session: AsyncSession) -> dict[str, list[tuple]]:
+        """Распределение участников по диапазонам баллов сразу в четырёх разрезах
+        (категория участника, тип ОО, пол, АТЕ) за один проход по результатам с GROUPING SETS.
+        Строки каждого разреза имеют тот же вид, что и результат _getTable_scoreRanges для соответствующей таблицы
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            dict[str, list[tuple]]: Строки разрезов studCat, schoolKinds, sex, areas
+        """
+        async with self._breakdownsLock:
+            if self._tables.breakdowns is not None:
+                return self._tables.breakdowns
+            
+            _, only_last_res = await self._getASC(
+                dop_filters=[TestSchemes.subject_id == self.subject_id],
+                year_count=1,
+            )
+            
+            query = await session.execute(
+                select(
+                    func.grouping(Students.is_ovz, Students.category_id).label("g_stud_cat"),
+                    func.grouping(Students.sex).label("g_sex"),
+                    func.grouping(Areas.code).label("g_area"),
+                    func.grouping(SchoolKinds.code).label("g_kind"),
+                    Students.is_ovz,
+                    Students.category_id,
+                    Students.sex,
+                    Areas.code.label("area_code"),
+                    Areas.name.label("area_name"),
+                    SchoolKinds.code.label("kind_code"),
+                    SchoolKinds.name.label("kind_name"),
+                    func.count(Students.id).label("rows_count"),
+                    func.count(ExamResults.student_id.distinct()).label("stud_count"),
+                    func.sum(case((ExamResults.score == 2, 1), else_=0)).label("bucket_0"),
+                    func.sum(case((and_(ExamResults.score != 2, ExamResults.final_points < 61), 1), else_=0)).label("bucket_1"),
+                    func.sum(case((ExamResults.final_points.between(61, 80), 1), else_=0)).label("bucket_2"),
+                    func.sum(case((ExamResults.final_points.between(81, 100), 1), else_=0)).label("bucket_3"),
+                ).select_from(ExamResults)
+                .join(TestSchemes, TestSchemes.id == ExamResults.schema_id)
+                .join(only_last_res, and_(only_last_res.c.exam_id == ExamResults.id, only_last_res.c.rn == 1))
+                .join(Students, Students.id == ExamResults.student_id)
+                .join(Schools, Schools.code == Students.school_id)
+                .join(Areas, Areas.code == Schools.area_id)
+                .join(SchoolKinds, SchoolKinds.code == Schools.kind_code)
+                .group_by(func.grouping_sets(
+                    tuple_(Students.is_ovz, Students.category_id),
+                    tuple_(Students.sex),
+                    tuple_(Areas.code, Areas.name),
+                    tuple_(SchoolKinds.code, SchoolKinds.name),
+                    literal_column("()"),
+                ))
+            )
+            
+            rows = query.all()
+            # Строка общего итога (пустой набор группировки): во всех grouping() - 1
+            total = next((row for row in rows if row.g_stud_cat and row.g_sex and row.g_area and row.g_kind), None)
+            
+            def scoreRanges(row, all: int) -> tuple:
+                return tuple(self._calculteProcentValue(part, all) for part in (row.bucket_0, row.bucket_1, row.bucket_2, row.bucket_3)) + (row.rows_count,)
+            
+            def nullsLast(*values) -> tuple:
+                return tuple((value is None, value) for value in values)
+            
+            breakdowns = {"studCat": [], "schoolKinds": [], "sex": [], "areas": []}
+            for row in sorted(rows, key=lambda row: nullsLast(row.is_ovz, row.category_id, row.sex, row.area_code, row.kind_code)):
+                if not row.g_stud_cat:
+                    breakdowns["studCat"].append((row.is_ovz, row.category_id) + scoreRanges(row, row.stud_count))
+                elif not row.g_sex:
+                    breakdowns["sex"].append((row.sex,) + scoreRanges(row, row.stud_count))
+                elif not row.g_area:
+                    breakdowns["areas"].append((f"{row.area_code} - {row.area_name}",) + scoreRanges(row, row.stud_count))
+                elif not row.g_kind and row.kind_code in SCHOOL_KINDS_CODES:
+                    # Доли по типам ОО считаются от всех участников, как в запросе без GROUPING SETS
+                    breakdowns["schoolKinds"].append((row.kind_name,) + scoreRanges(row, total.stud_count))
+            
+            self._tables.breakdowns = breakdowns
+            
+            return breakdowns
+    
+    async def _getData_resultDynamic(self, session: AsyncSession) -> list[tuple]:
+        """Доли участников по диапазонам баллов и средний балл по годам: (год, %, %, %, %, ср. балл)
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            list[tuple]: Строки результата запроса
+        """
+        return await self._getTable_scoreRanges(
+            session=session,
+            main_columns=[TestSchemes.exam_year],
+            group_by=[TestSchemes.exam_year],
+            dop_col=func.round(func.avg(ExamResults.final_points), 1),
+            year_count=3
+        )
+    
     async def getTable_resultDynamic(self, session: AsyncSession) -> TableStandart:
         """Формирует таблицу динамики результатов ЕГЭ в разрезе трёх лет
         
@@ -170,13 +285,7 @@ class RequestsForSecondSection(RequestsForSections):
             "Средний тестовый балл",
         ]
         
-        data = await self._getTable_scoreRanges(
-            session=session,
-            main_columns=[TestSchemes.exam_year],
-            group_by=[TestSchemes.exam_year],
-            dop_col=func.round(func.avg(ExamResults.final_points), 1),
-            year_count=3
-        )
+        data = await self._getData_resultDynamic(session)
         
         result = TableStandart(
             column_names=[
@@ -215,15 +324,18 @@ class RequestsForSecondSection(RequestsForSections):
         categories = [1, 3, 4]
         category_names = ["ВТГ, обучающихся по программам СОО", "ВТГ, обучающихся по программам СПО", "ВПЛ", "Участники экзамена с ОВЗ"]
         
-        data = await self._getTable_scoreRanges(
-            session=session,
-            main_columns=[Students.is_ovz, Students.category_id],
-            group_by=[Students.is_ovz, Students.category_id],
-            dop_col=func.count(Students.id),
-            year_count=1,
-            dop_joins=[(Students, Students.id == ExamResults.student_id)],
-            dop_joins_for_cte=[(Students, Students.id == ExamResults.student_id)],
-        )
+        if self.useBreakdowns:
+            data = (await self._getBreakdowns(session))["studCat"]
+        else:
+            data = await self._getTable_scoreRanges(
+                session=session,
+                main_columns=[Students.is_ovz, Students.category_id],
+                group_by=[Students.is_ovz, Students.category_id],
+                dop_col=func.count(Students.id),
+                year_count=1,
+                dop_joins=[(Students, Students.id == ExamResults.student_id)],
+                dop_joins_for_cte=[(Students, Students.id == ExamResults.student_id)],
+            )
         
         result = TableStandart(
             column_names=[
@@ -274,20 +386,23 @@ class RequestsForSecondSection(RequestsForSections):
         if self._tables.resultBySchoolTypes is not None:
             return self._tables.resultBySchoolTypes
         
-        data = await self._getTable_scoreRanges(
-            session=session,
-            main_columns=[SchoolKinds.name],
-            group_by=[SchoolKinds.code],
-            dop_col=func.count(Students.id),
-            year_count=1,
-            dop_joins=[
-                (Students, Students.id == ExamResults.student_id),
-                (Schools, Schools.code == Students.school_id),
-                (SchoolKinds, SchoolKinds.code == Schools.kind_code)
-            ],
-            dop_filters=[SchoolKinds.code.in_([101, 102, 103, 104, 1001, 2201])],
-            order_by=[SchoolKinds.code]
-        )
+        if self.useBreakdowns:
+            data = (await self._getBreakdowns(session))["schoolKinds"]
+        else:
+            data = await self._getTable_scoreRanges(
+                session=session,
+                main_columns=[SchoolKinds.name],
+                group_by=[SchoolKinds.code],
+                dop_col=func.count(Students.id),
+                year_count=1,
+                dop_joins=[
+                    (Students, Students.id == ExamResults.student_id),
+                    (Schools, Schools.code == Students.school_id),
+                    (SchoolKinds, SchoolKinds.code == Schools.kind_code)
+                ],
+                dop_filters=[SchoolKinds.code.in_(SCHOOL_KINDS_CODES)],
+                order_by=[SchoolKinds.code]
+            )
         
         result = TableStandart(
             column_names=[
@@ -327,19 +442,22 @@ class RequestsForSecondSection(RequestsForSections):
         if self._tables.resultBySex is not None:
             return self._tables.resultBySex
         
-        data = await self._getTable_scoreRanges(
-            session=session,
-            main_columns=[Students.sex],
-            group_by=[Students.sex],
-            dop_col=func.count(Students.id),
-            year_count=1,
-            dop_joins=[
-                (Students, Students.id == ExamResults.student_id)
-            ],
-            dop_joins_for_cte=[
-                (Students, Students.id == ExamResults.student_id)
-            ]
-        )
+        if self.useBreakdowns:
+            data = (await self._getBreakdowns(session))["sex"]
+        else:
+            data = await self._getTable_scoreRanges(
+                session=session,
+                main_columns=[Students.sex],
+                group_by=[Students.sex],
+                dop_col=func.count(Students.id),
+                year_count=1,
+                dop_joins=[
+                    (Students, Students.id == ExamResults.student_id)
+                ],
+                dop_joins_for_cte=[
+                    (Students, Students.id == ExamResults.student_id)
+                ]
+            )
         
         result = TableStandart(
             column_names=[
@@ -379,23 +497,26 @@ class RequestsForSecondSection(RequestsForSections):
         if self._tables.resultByAreas is not None:
             return self._tables.resultByAreas
         
-        data = await self._getTable_scoreRanges(
-            session=session,
-            main_columns=[func.concat(Areas.code, " - ", Areas.name)],
-            group_by=[Areas.code],
-            dop_col=func.count(Students.id),
-            year_count=1,
-            dop_joins=[
-                (Students, Students.id == ExamResults.student_id),
-                (Schools, Schools.code == Students.school_id),
-                (Areas, Areas.code == Schools.area_id),
-            ],
-            dop_joins_for_cte=[
-                (Students, Students.id == ExamResults.student_id),
-                (Schools, Schools.code == Students.school_id),
-                (Areas, Areas.code == Schools.area_id),
-            ]
-        )
+        if self.useBreakdowns:
+            data = (await self._getBreakdowns(session))["areas"]
+        else:
+            data = await self._getTable_scoreRanges(
+                session=session,
+                main_columns=[func.concat(Areas.code, " - ", Areas.name)],
+                group_by=[Areas.code],
+                dop_col=func.count(Students.id),
+                year_count=1,
+                dop_joins=[
+                    (Students, Students.id == ExamResults.student_id),
+                    (Schools, Schools.code == Students.school_id),
+                    (Areas, Areas.code == Schools.area_id),
+                ],
+                dop_joins_for_cte=[
+                    (Students, Students.id == ExamResults.student_id),
+                    (Schools, Schools.code == Students.school_id),
+                    (Areas, Areas.code == Schools.area_id),
+                ]
+            )
         
         result = TableStandart(
             column_names=[
@@ -423,19 +544,16 @@ class RequestsForSecondSection(RequestsForSections):
         
         return result
     
-    async def getTable_hightResults(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу динамики для топ 14 лучших школ
+    async def _getData_hightResults(self, session: AsyncSession) -> list[tuple]:
+        """Лучшие 14 школ по доле ВТГ с баллом от 81 до 100 и далее: (ОО, кол-во ВТГ, %, %, %, %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Готовая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.hightResults is not None:
-            return self._tables.hightResults
-        
-        all_students_count, only_last_res = self._getASC(
+        all_students_count, only_last_res = await self._getASC(
             dop_filters=[TestSchemes.subject_id == self.subject_id],
             year_count=1,
             group_by=[func.concat(Schools.code, " - ", Schools.short_name)],
@@ -466,7 +584,21 @@ class RequestsForSecondSection(RequestsForSections):
         )
         
         query = await session.execute(query)
-        data = query.all()
+        return query.all()
+    
+    async def getTable_hightResults(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу динамики для топ 14 лучших школ
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Готовая таблица
+        """
+        if self._tables.hightResults is not None:
+            return self._tables.hightResults
+        
+        data = await self._getData_hightResults(session)
         
         result = TableStandart(
             column_names=[
@@ -494,19 +626,16 @@ class RequestsForSecondSection(RequestsForSections):
         
         return result
     
-    async def getTable_lowResults(self, session: AsyncSession) -> TableStandart:
-        """Формирует таблицу динамики для топ 14 лучших школ
+    async def _getData_lowResults(self, session: AsyncSession) -> list[tuple]:
+        """Худшие 14 школ по доле ВТГ с баллом ниже минимального и далее: (ОО, кол-во ВТГ, %, %, %, %)
         
         Args:
             session (AsyncSession): Сессия для взаимодействия с БД
         
         Returns:
-            TableStandart: Готовая таблица
+            list[tuple]: Строки результата запроса
         """
-        if self._tables.lowResults is not None:
-            return self._tables.lowResults
-        
-        all_students_count, only_last_res = self._getASC(
+        all_students_count, only_last_res = await self._getASC(
             dop_filters=[TestSchemes.subject_id == self.subject_id],
             year_count=1,
             group_by=[func.concat(Schools.code, " - ", Schools.short_name)],
@@ -537,7 +666,21 @@ class RequestsForSecondSection(RequestsForSections):
         )
         
         query = await session.execute(query)
-        data = query.all()
+        return query.all()
+    
+    async def getTable_lowResults(self, session: AsyncSession) -> TableStandart:
+        """Формирует таблицу динамики для топ 14 лучших школ
+        
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+        
+        Returns:
+            TableStandart: Готовая таблица
+        """
+        if self._tables.lowResults is not None:
+            return self._tables.lowResults
+        
+        data = await self._getData_lowResults(session)
         
         result = TableStandart(
             column_names=[
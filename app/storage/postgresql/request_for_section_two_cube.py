@@ -0,0 +1,190 @@
+from sqlalchemy import func, select, case, desc, or_, Numeric, Column
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.sql.expression import ColumnElement
+
+from app.models.models import *
+from app.storage.postgresql.request_for_section_abc import SCHOOL_KINDS_CODES
+from app.storage.postgresql.request_for_section_two import RequestsForSecondSection
+from app.storage.postgresql.exam_cube import exam_cube, exam_points_cube
+
+
+class RequestsForSecondSectionCube(RequestsForSecondSection):
+    """
+    Запросы раздела 2.5. по кубам exam_cube и exam_points_cube: вместо результатов экзаменов суммируются их строки
+    """
+    useBreakdowns = True
+
+    async def _getCubeScoreRanges(
+            self,
+            session: AsyncSession,
+            main_columns: list,
+            group_by: list,
+            order_by: list,
+            dop_col: ColumnElement,
+            year_count: int = 1,
+            dop_joins: list[tuple] = [],
+            dop_filters: list = [],
+            all_count: ColumnElement | None = None,
+        ) -> list[tuple]:
+        """Доли участников по диапазонам баллов в разрезе: (*main_columns, %, %, %, %, dop_col)
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            main_columns (list): Столбцы разреза
+            group_by (list): Параметры группировки
+            order_by (list): Порядок строк
+            dop_col (ColumnElement): Дополнительная колонка
+            year_count (int, optional): Количество лет до текущего включительно. Defaults to 1.
+            dop_joins (list[tuple], optional): Справочники для названий. Defaults to [].
+            dop_filters (list, optional): Дополнительные фильтры. Defaults to [].
+            all_count (ColumnElement | None, optional): Знаменатель долей; по умолчанию - участники группы. Defaults to None.
+
+        Returns:
+            list[tuple]: Строки результата запроса
+        """
+        if all_count is None:
+            all_count = func.sum(exam_cube.c.students_count)
+
+        query = select(
+            *main_columns,
+            *[self._calculteProcent(func.sum(bucket), all_count) for bucket in (exam_cube.c.bucket_0, exam_cube.c.bucket_1, exam_cube.c.bucket_2, exam_cube.c.bucket_3)],
+            dop_col
+        ).select_from(exam_cube)
+        for j in dop_joins:
+            query = query.join(j[0], j[1])
+        query = (
+            query
+            .filter(*self._getCubeFilters(year_count=year_count), *dop_filters)
+            .group_by(*group_by)
+            .order_by(*order_by)
+        )
+
+        query = await session.execute(query)
+        return query.all()
+
+    async def _getData_scoreDictribution(self, session: AsyncSession) -> list[tuple]:
+        query = await session.execute(
+            select(
+                exam_points_cube.c.final_points,
+                func.sum(exam_points_cube.c.students_count)
+            )
+            .filter(
+                exam_points_cube.c.exam_year.between(self.year-2, self.year),
+                exam_points_cube.c.exam_type_id == self.exam_type_id,
+                exam_points_cube.c.subject_id == self.subject_id,
+                # Участник с тем же баллом в нескольких годах окна учитывается только в первом из них
+                or_(exam_points_cube.c.prev_year.is_(None), exam_points_cube.c.prev_year < self.year-2)
+            )
+            .group_by(exam_points_cube.c.final_points)
+            .order_by(exam_points_cube.c.final_points)
+        )
+
+        return query.all()
+
+    async def _getData_resultDynamic(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeScoreRanges(
+            session=session,
+            main_columns=[exam_cube.c.exam_year],
+            group_by=[exam_cube.c.exam_year],
+            order_by=[exam_cube.c.exam_year],
+            # Средний балл - по результатам с баллом, как avg(final_points)
+            dop_col=func.round(func.sum(exam_cube.c.points_sum) / func.cast(func.nullif(func.sum(exam_cube.c.points_count), 0), Numeric), 1),
+            year_count=3,
+        )
+
+    async def _getBreakdowns(self, session: AsyncSession) -> dict[str, list[tuple]]:
+        async with self._breakdownsLock:
+            if self._tables.breakdowns is not None:
+                return self._tables.breakdowns
+
+            results_count = func.sum(exam_cube.c.results_count)
+            all_students_count = (
+                select(func.sum(exam_cube.c.students_count))
+                .filter(*self._getCubeFilters(year_count=1))
+            ).scalar_subquery()
+
+            breakdowns = {
+                "studCat": await self._getCubeScoreRanges(
+                    session=session,
+                    main_columns=[exam_cube.c.is_ovz, exam_cube.c.category_id],
+                    group_by=[exam_cube.c.is_ovz, exam_cube.c.category_id],
+                    order_by=[exam_cube.c.is_ovz, exam_cube.c.category_id],
+                    dop_col=results_count,
+                ),
+                "schoolKinds": await self._getCubeScoreRanges(
+                    session=session,
+                    main_columns=[SchoolKinds.name],
+                    group_by=[SchoolKinds.code],
+                    order_by=[SchoolKinds.code],
+                    dop_col=results_count,
+                    dop_joins=[(SchoolKinds, SchoolKinds.code == exam_cube.c.school_kind_code)],
+                    dop_filters=[SchoolKinds.code.in_(SCHOOL_KINDS_CODES)],
+                    # Доли по типам ОО считаются от всех участников, как в RequestsForSecondSection
+                    all_count=all_students_count,
+                ),
+                "sex": await self._getCubeScoreRanges(
+                    session=session,
+                    main_columns=[exam_cube.c.sex],
+                    group_by=[exam_cube.c.sex],
+                    order_by=[exam_cube.c.sex],
+                    dop_col=results_count,
+                ),
+                "areas": await self._getCubeScoreRanges(
+                    session=session,
+                    main_columns=[func.concat(Areas.code, " - ", Areas.name)],
+                    group_by=[Areas.code],
+                    order_by=[Areas.code],
+                    dop_col=results_count,
+                    dop_joins=[(Areas, Areas.code == exam_cube.c.area_id)],
+                ),
+            }
+
+            self._tables.breakdowns = breakdowns
+
+            return breakdowns
+
+    async def _getCubeSchools(self, session: AsyncSession, buckets: list[Column]) -> list[tuple]:
+        """14 школ по долям ВТГ в диапазонах баллов (в порядке buckets, по убыванию): (ОО, кол-во ВТГ, %, %, %, %).
+        Доли считаются от всех участников школы
+
+        Args:
+            session (AsyncSession): Сессия для взаимодействия с БД
+            buckets (list[Column]): Столбцы диапазонов баллов в порядке сортировки
+
+        Returns:
+            list[tuple]: Строки результата запроса
+        """
+        def onlyVtg(column: Column) -> ColumnElement:
+            return func.sum(case((exam_cube.c.category_id == 1, column), else_=0))
+
+        all_students_count = func.sum(exam_cube.c.students_count)
+        query = await session.execute(
+            select(
+                func.concat(Schools.code, " - ", Schools.short_name).label("str_names"),
+                onlyVtg(exam_cube.c.results_count),
+                *[
+                    self._calculteProcent(onlyVtg(bucket), all_students_count).label(f"to_order_{i+1}")
+                    for i, bucket in enumerate(buckets)
+                ]
+            ).select_from(exam_cube)
+            .join(Schools, Schools.code == exam_cube.c.school_code)
+            .filter(*self._getCubeFilters(year_count=1))
+            .group_by(Schools.code)
+            .having(onlyVtg(exam_cube.c.results_count) > 0)
+            .order_by(desc("to_order_1"), desc("to_order_2"), desc("to_order_3"), desc("to_order_4"))
+            .limit(14)
+        )
+
+        return query.all()
+
+    async def _getData_hightResults(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeSchools(
+            session,
+            [exam_cube.c.bucket_3, exam_cube.c.bucket_2, exam_cube.c.bucket_1, exam_cube.c.bucket_0]
+        )
+
+    async def _getData_lowResults(self, session: AsyncSession) -> list[tuple]:
+        return await self._getCubeSchools(
+            session,
+            [exam_cube.c.bucket_0, exam_cube.c.bucket_1, exam_cube.c.bucket_2, exam_cube.c.bucket_3]
+        )
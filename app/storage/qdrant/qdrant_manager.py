@@ -369,3 +369,47 @@ class QdrantReportsStorage:
         except Exception as e:
             print(f"❌ get_section_data_by_params: {e}")
             return None
+
+    def get_all_sections(self) -> list[tuple[int, int, int, QdrantReportSection]] | None:
+        """Возвращает все разделы всех отчётов (без векторов) для загрузки в память
+
+        Returns:
+            list[tuple[int, int, int, QdrantReportSection]] | None: Код дисциплины, код типа экзамена, год и данные раздела; None при ошибке
+        """
+        try:
+            sections = []
+            next_page_offset = None
+            while True:
+                points, next_page_offset = self.client.scroll(
+                    collection_name=self.collection_name,
+                    limit=256,
+                    offset=next_page_offset,
+                    with_payload=["subject", "exam_type", "year", "section_code", "title", "text"],
+                    with_vectors=False,
+                    scroll_filter=models.Filter(
+                        must=[
+                            models.FieldCondition(key="type", match=models.MatchValue(value="section"))
+                        ]
+                    )
+                )
+
+                for point in points:
+                    sections.append((
+                        point.payload.get("subject"),
+                        point.payload.get("exam_type"),
+                        point.payload.get("year"),
+                        QdrantReportSection(
+                            code=point.payload.get("section_code"),
+                            text=point.payload.get("text"),
+                            name=point.payload.get("title")
+                        )
+                    ))
+
+                if not points or next_page_offset is None:
+                    break
+
+            return sections
+
+        except Exception as e:
+            print(f"❌ get_all_sections: {e}")
+            return None
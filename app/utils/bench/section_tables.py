@@ -0,0 +1,64 @@
+"""Время запросов таблиц разделов: последние попытки в CTE каждого запроса против общего набора в last_exam_results.
+Каждый прогон записывает набор заново, как первый запрос после истечения PG_LAST_RESULTS_TTL/2.
+
+Запуск внутри контейнера web (нужна БД):
+    python -m app.utils.bench.section_tables --year 2024 --repeats 3
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.db.connect_db import async_session
+from app.services.llm_service import promt as promtService
+from app.storage.postgresql import request_for_section_abc
+
+
+async def measure_section(section_code: str, exam_year: int, materialize: bool) -> tuple[list[str], list[float], float]:
+    """Время каждого запроса таблицы раздела на новом менеджере
+
+    Returns:
+        tuple[list[str], list[float], float]: Названия запросов, время каждого (сек), время раздела целиком (сек)
+    """
+    request_for_section_abc.PG_MATERIALIZE_LAST_RESULTS = materialize
+    request_for_section_abc._lastResultsRuns.clear()
+    manager = await promtService.get_section_manager(section_code=section_code, exam_year=exam_year)
+    names = []
+    seconds = []
+    started_at = time.perf_counter()
+    async with async_session() as session:
+        for request in manager.getTableRequests():
+            request_started_at = time.perf_counter()
+            await request(session)
+            names.append(request.__name__)
+            seconds.append(time.perf_counter() - request_started_at)
+    return names, seconds, time.perf_counter() - started_at
+
+
+async def run(exam_year: int, section_codes: list[str], repeats: int) -> None:
+    for section_code in section_codes:
+        results = {}
+        for materialize in (False, True):
+            runs = [await measure_section(section_code, exam_year, materialize) for _ in range(repeats)]
+            names = runs[0][0]
+            results[materialize] = (
+                names,
+                [statistics.median(run[1][i] for run in runs) for i in range(len(names))],
+                statistics.median(run[2] for run in runs),
+            )
+        names, before, before_total = results[False]
+        _, after, after_total = results[True]
+        print(f"\nРаздел {section_code}, медиана по {repeats} запускам (сек)")
+        print(f"{'таблица':<34}{'CTE':>10}{'материализация':>18}")
+        for name, before_seconds, after_seconds in zip(names, before, after):
+            print(f"{name:<34}{before_seconds:>10.3f}{after_seconds:>18.3f}")
+        print(f"{'всего':<34}{before_total:>10.3f}{after_total:>18.3f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-table query time with and without the materialized last-attempt set")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--sections", nargs="+", default=list(promtService.SECTION_MANAGERS))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.year, args.sections, args.repeats))
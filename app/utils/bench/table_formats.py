@@ -0,0 +1,64 @@
+"""Сравнение форматов таблиц в промте: количество токенов и время prefill на llama.cpp.
+
+Запуск внутри контейнера web (нужны БД и llama.cpp):
+    python -m app.utils.bench.table_formats --year 2024 --repeats 3
+"""
+import argparse
+import asyncio
+import statistics
+
+from app.db.connect_db import async_session
+from app.services.llm_service import promt as promtService
+from app.services.llm_service.llama_client import llama_client
+from app.services.llm_service.table_format import TABLE_FORMATS
+
+
+async def measure_prefill(text: str, repeats: int) -> tuple[int, float]:
+    """Время обработки промта без кэша префикса
+
+    Returns:
+        tuple[int, float]: Токенов в промте, медиана prompt_ms
+    """
+    payload = {
+        "messages": [{"role": "user", "content": text}],
+        "max_tokens": 1,
+        "temperature": 0,
+        "cache_prompt": False,
+    }
+    prompt_n = 0
+    prompt_ms = []
+    for _ in range(repeats):
+        response_data = await llama_client.chat_completion(payload)
+        timings = response_data.get("timings") or {}
+        prompt_n = timings.get("prompt_n", 0)
+        prompt_ms.append(timings.get("prompt_ms", 0.0))
+    return prompt_n, statistics.median(prompt_ms)
+
+
+async def run(exam_year: int, section_codes: list[str], repeats: int) -> None:
+    await llama_client.start()
+    try:
+        for section_code in section_codes:
+            async with async_session() as session:
+                tables, _ = await promtService.getTablesBySection(session=session, section_code=section_code, exam_year=exam_year)
+            print(f"\nРаздел {section_code}: {len(tables)} таблиц")
+            print(f"{'формат':<18}{'символов':>10}{'токенов':>10}{'prefill, мс':>14}")
+            for table_format in TABLE_FORMATS:
+                text = "".join(
+                    promtService.build_table_block(number+1, table, table_format)
+                    for number, table in enumerate(tables)
+                )
+                tokens_count = len(await llama_client.tokenize(text))
+                _, prompt_ms = await measure_prefill(text, repeats)
+                print(f"{table_format:<18}{len(text):>10}{tokens_count:>10}{prompt_ms:>14.1f}")
+    finally:
+        await llama_client.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Token count and prefill time of table formats")
+    parser.add_argument("--year", type=int, required=True)
+    parser.add_argument("--sections", nargs="+", default=list(promtService.SECTION_MANAGERS))
+    parser.add_argument("--repeats", type=int, default=3)
+    args = parser.parse_args()
+    asyncio.run(run(args.year, args.sections, args.repeats))
@@ -0,0 +1,41 @@
+from os import getenv
+from typing import Awaitable, TypeVar
+import asyncio
+from fastapi import HTTPException, Request
+
+
+LLM_DISCONNECT_POLL_INTERVAL = float(getenv("LLM_DISCONNECT_POLL_INTERVAL", "1"))
+
+T = TypeVar("T")
+
+
+async def cancel_on_disconnect(request: Request, coroutine: Awaitable[T]) -> T:
+    """Выполняет обработку запроса, пока клиент на связи.
+    Если клиент отключился, задача отменяется: запрос к llama.cpp обрывается, место в очереди и слот освобождаются
+
+    Args:
+        request (Request): HTTP-запрос клиента
+        coroutine (Awaitable[T]): Обработка запроса
+
+    Raises:
+        HTTPException: 499, клиент отключился
+
+    Returns:
+        T: Результат обработки
+    """
+    task = asyncio.ensure_future(coroutine)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=LLM_DISCONNECT_POLL_INTERVAL)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                task.cancel()
+                try:
+                    await task
+                except asyncio.CancelledError:
+                    pass
+                raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        if not task.done():
+            task.cancel()
@@ -0,0 +1,90 @@
+import argparse
+import asyncio
+import math
+import statistics
+import time
+import httpx
+
+
+def percentile(values: list[float], q: float) -> float:
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))]
+
+
+async def send(client: httpx.AsyncClient, args: argparse.Namespace, number: int) -> tuple[int, float, dict]:
+    """Один запрос на генерацию
+
+    Returns:
+        tuple[int, float, dict]: HTTP-статус, время ответа, тело ответа
+    """
+    user_input = f"{args.user_input} #{number}" if args.unique else args.user_input
+    started_at = time.perf_counter()
+    try:
+        if args.endpoint == "section":
+            section_code = args.sections[number % len(args.sections)]
+            response = await client.post(
+                "/textreports/report/generate/section",
+                params={"section_code": section_code},
+                json={"subject": args.subject, "exam_type": args.exam_type, "year": args.year, "user_input": user_input},
+            )
+        else:
+            response = await client.post("/textreports/generate", params={"request": f"Напиши короткий вывод по отчёту. {user_input}"})
+    except httpx.HTTPError as e:
+        print(f"❌ {type(e).__name__}: {e}")
+        return 0, time.perf_counter() - started_at, {}
+    body = response.json() if response.headers.get("content-type", "").startswith("application/json") else {}
+    return response.status_code, time.perf_counter() - started_at, body
+
+
+async def run(args: argparse.Namespace) -> None:
+    results = []
+    counter = iter(range(args.requests))
+
+    async def worker(client: httpx.AsyncClient) -> None:
+        for number in counter:
+            results.append(await send(client, args, number))
+
+    timeout = httpx.Timeout(args.timeout, connect=10)
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=args.url, timeout=timeout, limits=limits) as client:
+        started_at = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(args.concurrency)))
+        elapsed = time.perf_counter() - started_at
+
+    statuses: dict[int, int] = {}
+    for status, _, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    ok = [(latency, body) for status, latency, body in results if status == 200]
+    latencies = [latency for latency, _ in ok]
+    timings = [body.get("timings") or {} for _, body in ok]
+    queue = [timing.get("queue", 0.0) for timing in timings]
+    prefill = [timing.get("prompt_ms", 0.0) / 1000 for timing in timings if not timing.get("cache_hit")]
+    decode = [timing.get("predicted_ms", 0.0) / 1000 for timing in timings if not timing.get("cache_hit")]
+
+    print(f"Запросов: {len(results)}, параллельно: {args.concurrency}, время: {elapsed:.1f} с")
+    print(f"Статусы: {dict(sorted(statuses.items()))}")
+    print(f"Пропускная способность: {len(ok) / elapsed:.3f} успешных запросов/с")
+    print(f"Задержка, с: p50={percentile(latencies, 0.5):.2f} p95={percentile(latencies, 0.95):.2f} p99={percentile(latencies, 0.99):.2f}")
+    print(f"Ожидание в очереди, с: p50={percentile(queue, 0.5):.2f} p95={percentile(queue, 0.95):.2f} p99={percentile(queue, 0.99):.2f}")
+    if prefill:
+        print(f"Префилл, с: среднее={statistics.mean(prefill):.2f}; декодирование, с: среднее={statistics.mean(decode):.2f}")
+    print(f"Из кэша: {sum(1 for timing in timings if timing.get('cache_hit'))}, присоединены к идущей генерации: {sum(1 for timing in timings if timing.get('coalesced'))}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load benchmark of the generation endpoints")
+    parser.add_argument("--url", default="http://localhost:8008")
+    parser.add_argument("--endpoint", choices=["section", "free"], default="section",
+                        help="section - генерация раздела (нужны БД и Qdrant), free - произвольный запрос (только LLM)")
+    parser.add_argument("--sections", nargs="+", default=["1.7.", "2.5."])
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--year", type=int, default=2025)
+    parser.add_argument("--subject", default="Математика профильная")
+    parser.add_argument("--exam-type", dest="exam_type", default="ЕГЭ")
+    parser.add_argument("--user-input", dest="user_input", default="")
+    parser.add_argument("--unique", action="store_true", help="Разные промты в каждом запросе (без кэша и объединения запросов)")
+    parser.add_argument("--timeout", type=float, default=900)
+    asyncio.run(run(parser.parse_args()))
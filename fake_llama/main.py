@@ -0,0 +1,181 @@
+from os import getenv
+import asyncio
+import json
+import re
+import time
+import uuid
+import zlib
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+
+# Имитация llama.cpp без модели: задержки префилла и декодирования на токен и число слотов
+FAKE_LLAMA_PREFILL_MS = float(getenv("FAKE_LLAMA_PREFILL_MS", "5"))
+FAKE_LLAMA_DECODE_MS = float(getenv("FAKE_LLAMA_DECODE_MS", "50"))
+FAKE_LLAMA_SLOTS = int(getenv("FAKE_LLAMA_SLOTS", "1"))
+FAKE_LLAMA_ANSWER_TOKENS = int(getenv("FAKE_LLAMA_ANSWER_TOKENS", "150"))
+
+TOKEN_PATTERN = re.compile(r"\w{1,4}|[^\w\s]|\s+")
+ANSWER_WORDS = "результаты экзамена в текущем году по сравнению с двумя предыдущими годами изменились незначительно".split()
+
+app = FastAPI(title="fake llama.cpp server")
+
+
+def tokenize(text: str) -> list[int]:
+    """Грубая токенизация: куски слов до 4 символов, знаки и пробелы
+    """
+    return [zlib.crc32(piece.encode("utf-8")) % 32000 for piece in TOKEN_PATTERN.findall(text)]
+
+
+def common_prefix(first: list[int], second: list[int]) -> int:
+    size = 0
+    for a, b in zip(first, second):
+        if a != b:
+            break
+        size += 1
+    return size
+
+
+class Slot:
+    def __init__(self, slot_id: int) -> None:
+        self.id = slot_id
+        self.busy = False
+        self.tokens: list[int] = []
+
+
+class SlotPool:
+    """
+    Слоты сервера: запрос ждёт свободный (или указанный в id_slot) слот
+    """
+    def __init__(self, size: int) -> None:
+        self.slots = [Slot(i) for i in range(size)]
+        self._condition = asyncio.Condition()
+
+    def _free(self, id_slot: int, tokens: list[int]) -> Slot | None:
+        if 0 <= id_slot < len(self.slots):
+            slot = self.slots[id_slot]
+            return None if slot.busy else slot
+        free = [slot for slot in self.slots if not slot.busy]
+        if not free:
+            return None
+        # Как llama.cpp: свободный слот с самым длинным общим префиксом
+        return max(free, key=lambda slot: common_prefix(slot.tokens, tokens))
+
+    async def acquire(self, id_slot: int, tokens: list[int]) -> Slot:
+        async with self._condition:
+            await self._condition.wait_for(lambda: self._free(id_slot, tokens) is not None)
+            slot = self._free(id_slot, tokens)
+            slot.busy = True
+            return slot
+
+    async def release(self, slot: Slot) -> None:
+        async with self._condition:
+            slot.busy = False
+            self._condition.notify_all()
+
+
+slot_pool = SlotPool(FAKE_LLAMA_SLOTS)
+
+
+def build_answer(max_tokens: int, stop: list[str]) -> tuple[list[str], str]:
+    """Ответ в обёртке <answer>, обрезанный по max_tokens или стоп-последовательности
+
+    Returns:
+        tuple[list[str], str]: Токены ответа (куски текста), finish_reason
+    """
+    words = ["<answer>"] + [ANSWER_WORDS[i % len(ANSWER_WORDS)] + " " for i in range(FAKE_LLAMA_ANSWER_TOKENS)] + ["</answer>"]
+    for stop_text in stop:
+        if stop_text in words:
+            words = words[:words.index(stop_text)]
+    if len(words) > max_tokens:
+        return words[:max_tokens], "length"
+    return words, "stop"
+
+
+def make_timings(prompt_n: int, cache_n: int, predicted_n: int, prompt_ms: float, predicted_ms: float) -> dict:
+    return {
+        "cache_n": cache_n,
+        "prompt_n": prompt_n,
+        "prompt_ms": prompt_ms,
+        "prompt_per_second": prompt_n / prompt_ms * 1000 if prompt_ms else 0.0,
+        "predicted_n": predicted_n,
+        "predicted_ms": predicted_ms,
+        "predicted_per_second": predicted_n / predicted_ms * 1000 if predicted_ms else 0.0,
+    }
+
+
+@app.get("/health")
+async def health() -> dict:
+    return {"status": "ok"}
+
+
+@app.get("/slots")
+async def slots() -> list[dict]:
+    return [{"id": slot.id, "is_processing": slot.busy} for slot in slot_pool.slots]
+
+
+@app.post("/tokenize")
+async def tokenize_text(body: dict) -> dict:
+    return {"tokens": tokenize(body.get("content", ""))}
+
+
+@app.post("/v1/chat/completions")
+async def chat_completions(body: dict, request: Request):
+    prompt = "\n".join(message.get("content", "") for message in body.get("messages", []))
+    tokens = tokenize(prompt)
+    words, finish_reason = build_answer(body.get("max_tokens") or 1024, body.get("stop") or [])
+    completion_id = f"chatcmpl-{uuid.uuid4().hex}"
+    model = body.get("model", "fake")
+
+    async def prefill() -> tuple[Slot, int, float]:
+        slot = await slot_pool.acquire(body.get("id_slot", -1), tokens)
+        cache_n = common_prefix(slot.tokens, tokens) if body.get("cache_prompt") else 0
+        prompt_ms = (len(tokens) - cache_n) * FAKE_LLAMA_PREFILL_MS
+        try:
+            await asyncio.sleep(prompt_ms / 1000)
+        except asyncio.CancelledError:
+            await slot_pool.release(slot)
+            raise
+        slot.tokens = tokens
+        return slot, cache_n, prompt_ms
+
+    if body.get("stream"):
+        async def events():
+            slot, cache_n, prompt_ms = await prefill()
+            started_at = time.perf_counter()
+            try:
+                for word in words:
+                    await asyncio.sleep(FAKE_LLAMA_DECODE_MS / 1000)
+                    chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                             "choices": [{"index": 0, "delta": {"content": word}, "finish_reason": None}]}
+                    yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                predicted_ms = (time.perf_counter() - started_at) * 1000
+                chunk = {"id": completion_id, "object": "chat.completion.chunk", "model": model,
+                         "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+                         "timings": make_timings(len(tokens) - cache_n, cache_n, len(words), prompt_ms, predicted_ms)}
+                yield f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n"
+                yield "data: [DONE]\n\n"
+            finally:
+                await slot_pool.release(slot)
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    slot, cache_n, prompt_ms = await prefill()
+    started_at = time.perf_counter()
+    try:
+        for i, _ in enumerate(words):
+            await asyncio.sleep(FAKE_LLAMA_DECODE_MS / 1000)
+            # Как llama.cpp: клиент отключился - генерация прекращается
+            if i % 10 == 0 and await request.is_disconnected():
+                return {}
+        predicted_ms = (time.perf_counter() - started_at) * 1000
+    finally:
+        await slot_pool.release(slot)
+    return {
+        "id": completion_id,
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(words)}, "finish_reason": finish_reason}],
+        "usage": {"prompt_tokens": len(tokens), "completion_tokens": len(words), "total_tokens": len(tokens) + len(words)},
+        "timings": make_timings(len(tokens) - cache_n, cache_n, len(words), prompt_ms, predicted_ms),
+    }
@@ -0,0 +1,162 @@
+import os
+
+# Модули приложения читают настройки при импорте: подключение к БД создаётся лениво,
+# но строка подключения должна разбираться. Значения из окружения имеют приоритет,
+# кроме имени базы: тесты с БД пересоздают её схему, поэтому работают только с отдельной базой TEST_DB_NAME
+os.environ["DB_NAME"] = os.environ.get("TEST_DB_NAME", "textreports_test")
+os.environ.setdefault("POSTGRES_HOST", "localhost")
+os.environ.setdefault("POSTGRES_USER", "postgres")
+os.environ.setdefault("POSTGRES_PASSWORD", "")
+os.environ.setdefault("DB_PORT", "5432")
+os.environ.setdefault("LLAMA_CACHE_PATH", os.path.join(os.environ.get("TMPDIR", "/tmp"), "test_llm_generation.sqlite3"))
+
+
+from contextlib import asynccontextmanager
+from types import SimpleNamespace
+import asyncio
+import re
+import httpx
+import pytest
+from sqlalchemy import DefaultClause, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from fake_llama import main as fake_main
+from app.services.llm_service import llm_service
+from app.services.llm_service.llama_client import LlamaClient
+from app.services.llm_service.llama_router import LlamaRouter
+from app.services.llm_service.llm_scheduler import LLMScheduler
+from app.services.llm_service.promt_cache import promt_cache
+from app.db.base import Base
+from app.db.connect_db import engine, DB_NAME, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_HOST, DB_PORT
+from app.storage.postgresql import request_for_section_abc
+
+
+class RecordingSlotPool(fake_main.SlotPool):
+    """
+    Слоты заглушки с учётом наибольшего числа одновременно занятых слотов и выданных номеров
+    """
+    def __init__(self, size: int) -> None:
+        super().__init__(size)
+        self.max_busy = 0
+        self.requested: list[int] = []
+
+    async def acquire(self, id_slot: int, tokens: list[int]) -> fake_main.Slot:
+        self.requested.append(id_slot)
+        slot = await super().acquire(id_slot, tokens)
+        self.max_busy = max(self.max_busy, sum(1 for s in self.slots if s.busy))
+        return slot
+
+
+class FakeNetwork(httpx.AsyncBaseTransport):
+    """
+    Все серверы - одна заглушка llama.cpp в процессе; до серверов из down соединение не устанавливается
+    """
+    def __init__(self) -> None:
+        self.down: set[str] = set()
+        self._app = httpx.ASGITransport(app=fake_main.app)
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        if request.url.host in self.down:
+            raise httpx.ConnectError("Connection refused", request=request)
+        return await self._app.handle_async_request(request)
+
+
+@pytest.fixture(autouse=True)
+def promt_cache_disabled(monkeypatch):
+    """Кэш промтов выключен: ключ кэша запрашивает версию данных у БД. Тесты кэша включают его сами
+    """
+    monkeypatch.setattr(promt_cache, "enabled", False)
+
+
+@pytest.fixture
+def fake_llama(monkeypatch):
+    """Запускает llm_service поверх заглушки fake_llama: клиент, планировщик и слоты - на время теста.
+    Кэш генераций выключен, чтобы каждый запрос доходил до заглушки
+    """
+    monkeypatch.setattr(fake_main, "FAKE_LLAMA_PREFILL_MS", 0.0)
+    monkeypatch.setattr(fake_main, "FAKE_LLAMA_DECODE_MS", 5.0)
+    monkeypatch.setattr(fake_main, "FAKE_LLAMA_ANSWER_TOKENS", 10)
+    monkeypatch.setattr(llm_service.generation_cache, "enabled", False)
+
+    @asynccontextmanager
+    async def start(slots: int = 2, urls: tuple[str, ...] = ("http://llama-1",), queue_size: int = 8):
+        pool = RecordingSlotPool(slots)
+        monkeypatch.setattr(fake_main, "slot_pool", pool)
+        network = FakeNetwork()
+        http_client = httpx.AsyncClient(transport=network)
+        client = LlamaClient()
+        client.router = LlamaRouter(list(urls))
+        client._client = http_client
+        client.router._client = http_client
+        scheduler = LLMScheduler(capacity=slots * len(urls), queue_size=queue_size)
+        monkeypatch.setattr(llm_service, "llama_client", client)
+        monkeypatch.setattr(llm_service, "llm_scheduler", scheduler)
+        try:
+            yield SimpleNamespace(client=client, pool=pool, network=network, scheduler=scheduler)
+        finally:
+            await http_client.aclose()
+
+    return start
+
+
+def _create_schema(connection) -> None:
+    """Создаёт таблицы моделей. Рабочая схема восстанавливается из резервной копии, а в моделях
+    серверные значения по умолчанию вроде "gen_random_uuid()" записаны строками, которые create_all
+    вывел бы как строковые литералы, поэтому для тестовой схемы они передаются как SQL-выражения
+    """
+    for table in Base.metadata.tables.values():
+        for column in table.columns:
+            default = column.server_default
+            if isinstance(default, DefaultClause) and isinstance(default.arg, str) and re.fullmatch(r"\w+\(\)|CURRENT_TIMESTAMP", default.arg):
+                column.server_default = DefaultClause(text(default.arg))
+    Base.metadata.create_all(connection)
+
+
+async def _recreate_test_db() -> None:
+    """Создаёт тестовую базу, если её нет, и пересоздаёт в ней схему моделей
+    """
+    server = create_async_engine(
+        f"postgresql+asyncpg://{POSTGRES_USER}:{POSTGRES_PASSWORD}@{POSTGRES_HOST}:{DB_PORT}/postgres",
+        isolation_level="AUTOCOMMIT",
+        connect_args={"timeout": 2},
+    )
+    try:
+        async with server.connect() as connection:
+            exists = await connection.scalar(text("SELECT 1 FROM pg_database WHERE datname = :name"), {"name": DB_NAME})
+            if not exists:
+                await connection.execute(text(f'CREATE DATABASE "{DB_NAME}"'))
+    finally:
+        await server.dispose()
+    try:
+        async with engine.begin() as connection:
+            await connection.execute(text("DROP SCHEMA public CASCADE"))
+            await connection.execute(text("CREATE SCHEMA public"))
+            await connection.run_sync(_create_schema)
+    finally:
+        await engine.dispose()
+
+
+@pytest.fixture
+def pg_db(monkeypatch):
+    """Пустая тестовая база PostgreSQL со схемой моделей; без доступного сервера тест пропускается.
+    Возвращает функцию, выполняющую корутину в своём цикле событий: соединения пула движка
+    привязаны к циклу, поэтому после корутины пул закрывается
+    """
+    try:
+        asyncio.run(_recreate_test_db())
+    except (OSError, asyncio.TimeoutError) as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    monkeypatch.setattr(request_for_section_abc, "_lastResultsTableReady", False)
+    monkeypatch.setattr(request_for_section_abc, "_lastResultsRuns", {})
+    monkeypatch.setattr(request_for_section_abc, "_lastResultsLock", asyncio.Lock())
+    monkeypatch.setattr(request_for_section_abc, "PG_TABLES_CONCURRENT", False)
+
+    def run(coro):
+        async def main():
+            try:
+                return await coro
+            finally:
+                await engine.dispose()
+        return asyncio.run(main())
+
+    return run
@@ -0,0 +1,99 @@
+"""Результаты ЕГЭ для тестов запросов к PostgreSQL (фикстура pg_db)
+"""
+from datetime import date, timedelta
+import random
+import uuid
+
+from sqlalchemy import insert
+
+from app.db.connect_db import async_session
+from app.models.models import *
+
+
+YEARS = [2023, 2024, 2025]
+# Мало различных баллов, чтобы участники совпадали по баллу в разных годах
+POINTS = [None, 20, 45, 45, 61, 70, 85, 95]
+
+
+def exam_result(student_id: uuid.UUID, schema_id: int, points: int | None, exam_date: date, status_id: int = 6) -> dict:
+    return {
+        "base_code": "0000001",
+        "exam_code": uuid.uuid4(),
+        "final_points": points,
+        "score": None if points is None else (2 if points < 27 else 4),
+        "student_id": student_id,
+        "schema_id": schema_id,
+        "status_id": status_id,
+        "exam_date": exam_date,
+        "ppe_code": "000001",
+        "variant": 1,
+    }
+
+
+async def seed() -> None:
+    """Результаты ЕГЭ за три года: пересдачи, повторные попытки, результаты без балла и участники,
+    сдававшие предмет в нескольких годах с тем же баллом
+    """
+    rnd = random.Random(7)
+    async with async_session() as session:
+        await session.execute(insert(Areas), [{"code": code, "name": f"АТЕ {code}"} for code in (1, 2)])
+        await session.execute(insert(SchoolKinds), [{"code": code, "name": f"Тип ОО {code}"} for code in (101, 102, 1001)])
+        await session.execute(insert(SchoolProperties), [{"code": 1, "name": "Муниципальная"}])
+        await session.execute(insert(TownTypes), [{"code": 1, "name": "Город"}])
+        await session.execute(insert(StudentCategories), [{"id": category_id, "description": str(category_id)} for category_id in (1, 3, 4)])
+        await session.execute(insert(ExamResultStatus), [{"id": status_id, "description": str(status_id)} for status_id in (5, 6)])
+        await session.execute(insert(ExamTypes), [{"id": 4, "name": "ЕГЭ"}])
+        await session.execute(insert(Subjects), [{"code": code, "name": f"Предмет {code}"} for code in (1, 2, 22)])
+        await session.execute(insert(Schools), [
+            {
+                "code": code,
+                "law_address": "-",
+                "short_name": f"Школа {code}",
+                "kind_code": kind_code,
+                "area_id": area_id,
+                "property_id": 1,
+                "town_type_id": 1,
+            }
+            for code, kind_code, area_id in ((10, 101, 1), (11, 102, 1), (12, 1001, 2), (13, 101, 2))
+        ])
+        schemes = {}
+        for year in YEARS:
+            for subject_id in (1, 2, 22):
+                schemes[(year, subject_id)] = len(schemes) + 1
+        await session.execute(insert(TestSchemes), [
+            {"id": schema_id, "exam_type_id": 4, "subject_id": subject_id, "exam_year": year, "grade": 11}
+            for (year, subject_id), schema_id in schemes.items()
+        ])
+
+        students = []
+        results = []
+        for _ in range(120):
+            student_id = uuid.uuid4()
+            students.append({
+                "id": student_id,
+                "stud_code": uuid.uuid4(),
+                "school_id": rnd.choice([10, 11, 12, 13]),
+                "category_id": rnd.choice([1, 1, 3, 4]),
+                "person_code": uuid.uuid4(),
+                "class_name": "11А",
+                "is_ovz": rnd.random() < 0.2,
+                "sex": rnd.random() < 0.5,
+            })
+            year = rnd.choice(YEARS)
+            exam_date = date(year, 6, 1)
+            points = rnd.choice(POINTS)
+            for subject_id in rnd.sample([1, 2, 22], rnd.randint(1, 3)):
+                points = points if subject_id == 2 else rnd.choice(POINTS)
+                results.append(exam_result(student_id, schemes[(year, subject_id)], points, exam_date))
+            # Повторная попытка раньше итоговой и попытка не в статусе 6
+            if rnd.random() < 0.2:
+                results.append(exam_result(student_id, schemes[(year, 2)], rnd.choice(POINTS), exam_date - timedelta(days=10)))
+            if rnd.random() < 0.1:
+                results.append(exam_result(student_id, schemes[(year, 2)], rnd.choice(POINTS), exam_date, status_id=5))
+            # Пересдача в следующем году, часто с тем же баллом
+            if year < YEARS[-1] and rnd.random() < 0.4:
+                retake_points = points if rnd.random() < 0.6 else rnd.choice(POINTS)
+                results.append(exam_result(student_id, schemes[(year + 1, 2)], retake_points, date(year + 1, 6, 1)))
+        await session.execute(insert(Students), students)
+        await session.execute(insert(ExamResults), results)
+        await session.commit()
@@ -0,0 +1,58 @@
+from app.db.connect_db import async_session
+from app.services.exam_cube.exam_cube import ExamCubeBuilder, exam_cube_builder
+from app.services.llm_service import promt as promtService
+from exam_data import YEARS, seed
+
+
+async def section_tables(section_code: str, cube: bool) -> list:
+    managers = promtService.CUBE_SECTION_MANAGERS if cube else promtService.SECTION_MANAGERS
+    manager = managers[section_code](year=YEARS[-1], exam_type_id=4, subject_id=2)
+    async with async_session() as session:
+        return await manager.getListOfTables(session)
+
+
+def test_cube_managers_match_row_managers(pg_db):
+    async def scenario():
+        await seed()
+        builder = ExamCubeBuilder(enabled=True)
+        await builder.start()
+        await builder.build(YEARS)
+        assert builder.error == ""
+        return {
+            section_code: (await section_tables(section_code, cube=False), await section_tables(section_code, cube=True))
+            for section_code in promtService.CUBE_SECTION_MANAGERS
+        }
+
+    for section_code, (row_tables, cube_tables) in pg_db(scenario()).items():
+        assert len(row_tables) == len(cube_tables)
+        for row_table, cube_table in zip(row_tables, cube_tables):
+            assert cube_table == row_table, f"{section_code} {row_table.table_name}"
+
+
+def test_section_manager_uses_cube_built_by_another_process(pg_db, monkeypatch):
+    monkeypatch.setattr(exam_cube_builder, "enabled", True)
+
+    async def scenario():
+        await seed()
+        await exam_cube_builder.start()
+        before = await promtService.get_section_manager(section_code="2.5.", exam_year=YEARS[-1])
+        # Сборка в другом процессе: у этого процесса о ней нет сведений, кроме строк в БД
+        other = ExamCubeBuilder(enabled=True)
+        await other.build(YEARS[:-1])
+        partial = await promtService.get_section_manager(section_code="2.5.", exam_year=YEARS[-1])
+        await other.build(YEARS[-1:])
+        after = await promtService.get_section_manager(section_code="2.5.", exam_year=YEARS[-1])
+        return before, partial, after, await exam_cube_builder.state()
+
+    before, partial, after, state = pg_db(scenario())
+    assert type(before) is promtService.SECTION_MANAGERS["2.5."]
+    assert type(partial) is promtService.SECTION_MANAGERS["2.5."]
+    assert type(after) is promtService.CUBE_SECTION_MANAGERS["2.5."]
+    assert state.years == YEARS
+
+
+def test_disabled_cube_is_not_built():
+    builder = ExamCubeBuilder(enabled=False)
+
+    assert builder.trigger(YEARS) is False
+    assert not builder.building
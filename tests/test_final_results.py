@@ -0,0 +1,34 @@
+from app.db.connect_db import async_session
+from app.services.llm_service import promt as promtService
+from app.storage.postgresql import request_for_section_abc
+from app.storage.postgresql.final_results import FinalResultsView
+from exam_data import YEARS, seed
+
+
+async def all_section_tables() -> dict:
+    tables = {}
+    for section_code, manager_class in promtService.SECTION_MANAGERS.items():
+        manager = manager_class(year=YEARS[-1], exam_type_id=4, subject_id=2)
+        async with async_session() as session:
+            tables[section_code] = await manager.getListOfTables(session)
+    return tables
+
+
+def test_view_managers_match_row_managers(pg_db, monkeypatch):
+    monkeypatch.setattr(FinalResultsView, "ready", False)
+    monkeypatch.setattr(request_for_section_abc, "PG_MATERIALIZE_LAST_RESULTS", False)
+
+    async def scenario():
+        await seed()
+        row_tables = await all_section_tables()
+        async with async_session() as session:
+            await FinalResultsView().create(session)
+        monkeypatch.setattr(request_for_section_abc, "PG_FINAL_RESULTS_VIEW", True)
+        return row_tables, await all_section_tables()
+
+    row_tables, view_tables = pg_db(scenario())
+    assert FinalResultsView.ready
+    for section_code in row_tables:
+        assert len(view_tables[section_code]) == len(row_tables[section_code])
+        for row_table, view_table in zip(row_tables[section_code], view_tables[section_code]):
+            assert view_table == row_table, f"{section_code} {row_table.table_name}"
@@ -0,0 +1,89 @@
+import asyncio
+
+import pytest
+
+from app.schemas.qdrant import QdrantReportSection
+from app.schemas.text_reports import TableStandart
+from app.services.llm_service import promt as promtService
+
+
+# Токенами считаются только ячейки таблиц и абзацы примера: по 10 на строку и на абзац
+TOKEN = "¤"
+ROW = TOKEN * 10
+
+
+class StubTokenCounter:
+    async def count(self, text: str) -> int:
+        return text.count(TOKEN)
+
+
+def table(name: str) -> TableStandart:
+    return TableStandart(table_name=name, column_names=["Строка"], data=[[ROW] for _ in range(8)])
+
+
+@pytest.fixture
+def fit(monkeypatch):
+    """fit_promt для раздела из таблиц приоритетов 0, 1, 2 по 8 строк и примера из 4 абзацев (всего 280 токенов)
+    """
+    monkeypatch.setattr(promtService, "token_counter", StubTokenCounter())
+    monkeypatch.setattr(promtService, "PROMT_BUDGET_ENABLED", True)
+    monkeypatch.setitem(promtService.TABLE_PRIORITIES, "test", [0, 1, 2])
+    tables = [table("p0"), table("p1"), table("p2")]
+    example = QdrantReportSection(code="test", name="Тест", text="\n".join([ROW] * 4))
+
+    def run(budget: int):
+        monkeypatch.setattr(promtService, "get_promt_budget", lambda max_tokens: budget)
+        return asyncio.run(promtService.fit_promt(
+            section_code="test",
+            exam_year=2025,
+            tables=tables,
+            section_data=example,
+            user_input="",
+        ))
+
+    return run
+
+
+def test_promt_that_fits_is_not_shrunk(fit):
+    promt, report = fit(1000)
+
+    assert report.fitted
+    assert report.tokens == 280
+    assert report.dropped == []
+    assert promt.count(TOKEN) == 280
+
+
+def test_lowest_priority_tables_are_halved_first(fit):
+    promt, report = fit(250)
+
+    assert report.fitted
+    assert report.tokens == 240
+    assert report.dropped == ["p2: 4 из 8 строк"]
+
+
+def test_example_is_trimmed_before_priority_one(fit):
+    promt, report = fit(170)
+
+    # p2: 8 -> 4 -> 3 -> 0 строк, затем пример: 4 -> 2 -> 1 абзац
+    assert report.fitted
+    assert report.tokens == 170
+    assert report.dropped == ["p2", "Пример: 3 из 4 абзацев"]
+
+
+def test_priority_zero_is_never_trimmed(fit):
+    promt, report = fit(100)
+
+    assert report.fitted
+    assert report.tokens == 80
+    assert report.dropped == ["p1", "p2", "Пример: 4 из 4 абзацев"]
+    assert promt.count(TOKEN) == 80
+
+
+def test_not_fitted_when_minimum_does_not_fit(fit):
+    promt, report = fit(50)
+
+    assert not report.fitted
+    assert report.tokens == 80
+    assert report.budget == 50
+    assert "p0" not in report.dropped
+    assert promt.count(TOKEN) == 80
@@ -0,0 +1,71 @@
+import asyncio
+import itertools
+
+import pytest
+
+from app.services.llm_service import generation_cache as generation_cache_module
+from app.services.llm_service.generation_cache import GenerationCache
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Строго возрастающее время: порядок LRU не зависит от разрешения часов"""
+    ticks = itertools.count(1)
+    monkeypatch.setattr(generation_cache_module.time, "time", lambda: float(next(ticks)))
+
+
+def make_cache(tmp_path, max_entries: int = 10, max_bytes: int = 1024) -> GenerationCache:
+    return GenerationCache(str(tmp_path / "cache.sqlite3"), max_entries=max_entries, max_bytes=max_bytes)
+
+
+def test_key_ignores_execution_fields():
+    payload = {"messages": [{"role": "user", "content": "промт"}], "temperature": 0, "seed": 42}
+    key = GenerationCache.make_key(payload)
+    assert GenerationCache.make_key({**payload, "stream": True, "cache_prompt": True, "id_slot": 1, "max_tokens": 10}) == key
+    assert GenerationCache.make_key({**payload, "seed": 43}) != key
+    assert GenerationCache.make_key({**payload, "messages": [{"role": "user", "content": "другой"}]}) != key
+
+
+def test_only_greedy_generation_is_cacheable(tmp_path):
+    cache = make_cache(tmp_path)
+    assert cache.is_cacheable({"temperature": 0})
+    assert cache.is_cacheable({"temperature": 0.7, "top_k": 1})
+    assert not cache.is_cacheable({"temperature": 0.7, "top_k": 40})
+    cache.enabled = False
+    assert not cache.is_cacheable({"temperature": 0})
+
+
+def test_evicts_least_recently_used_entry(tmp_path, clock):
+    async def scenario():
+        cache = make_cache(tmp_path, max_entries=2)
+        await cache.set("a", "текст a")
+        await cache.set("b", "текст b")
+        assert await cache.get("a") == "текст a"
+        await cache.set("c", "текст c")
+        return [await cache.get(key) for key in ("a", "b", "c")], cache
+
+    values, cache = asyncio.run(scenario())
+    assert values == ["текст a", None, "текст c"]
+    assert (cache.hits, cache.misses) == (3, 1)
+
+
+def test_evicts_by_total_size(tmp_path, clock):
+    async def scenario():
+        cache = make_cache(tmp_path, max_bytes=10)
+        await cache.set("a", "12345")
+        await cache.set("b", "12345")
+        await cache.set("c", "12345")
+        return [await cache.get(key) for key in ("a", "b", "c")], await cache.stats()
+
+    values, stats = asyncio.run(scenario())
+    assert values == [None, "12345", "12345"]
+    assert (stats.entries, stats.size_bytes) == (2, 10)
+
+
+def test_empty_answer_is_not_cached(tmp_path):
+    async def scenario():
+        cache = make_cache(tmp_path)
+        await cache.set("a", "")
+        return await cache.get("a")
+
+    assert asyncio.run(scenario()) is None
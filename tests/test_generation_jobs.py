@@ -0,0 +1,45 @@
+import asyncio
+
+from app.schemas.text_reports import LLMRequest, GenerateData
+from app.services.generation_jobs import generation_jobs
+from app.services.generation_jobs.generation_jobs import GenerationJobManager
+
+
+def run_job(monkeypatch, fake_llama, down: bool, mode: str | None = None):
+    async def get_report_generate_data(session, request, section_code):
+        return GenerateData(promt=f"промт раздела {section_code}", template=["llm_text"])
+
+    monkeypatch.setattr(generation_jobs.promtService, "get_report_generate_data", get_report_generate_data)
+
+    async def scenario():
+        async with fake_llama() as llama:
+            if down:
+                llama.network.down.add("llama-1")
+            manager = GenerationJobManager(workers=1, max_pending=10, ttl=60)
+            job = manager.submit(LLMRequest(year=2025), "1.7.", mode=mode)
+            await manager._run(job)
+            return job
+
+    return asyncio.run(scenario())
+
+
+def test_job_is_done_when_generation_succeeds(monkeypatch, fake_llama):
+    job = run_job(monkeypatch, fake_llama, down=False)
+    assert job.status == "done"
+    assert job.error == ""
+    assert "результаты" in job.result.text
+
+
+def test_job_fails_when_llm_fails(monkeypatch, fake_llama):
+    job = run_job(monkeypatch, fake_llama, down=True)
+    assert job.status == "failed"
+    assert "Connection refused" in job.error
+    assert job.info().status == "failed"
+
+
+def test_job_mode_defaults_to_section_mode(monkeypatch):
+    monkeypatch.setattr(generation_jobs.llmService, "LLAMA_MAP_REDUCE_SECTIONS", ["2.5."])
+    manager = GenerationJobManager(workers=1, max_pending=10, ttl=60)
+    assert manager.submit(LLMRequest(), "1.7.").info().mode == "single"
+    assert manager.submit(LLMRequest(), "2.5.").info().mode == "map_reduce"
+    assert manager.submit(LLMRequest(), "2.5.", mode="single").info().mode == "single"
@@ -0,0 +1,104 @@
+from sqlalchemy import select, literal, literal_column, text
+from sqlalchemy.dialects.postgresql import UUID
+
+from app.db.connect_db import async_session
+from app.services.llm_service import promt as promtService
+from app.storage.postgresql import request_for_section_abc
+from app.storage.postgresql.request_for_section_two import RequestsForSecondSection
+from exam_data import YEARS, seed
+
+
+def last_res_query(exam_id: str):
+    return select(literal_column(exam_id, UUID(as_uuid=True)).label("exam_id"), literal(1).label("rn"))
+
+
+async def table_exists() -> bool:
+    async with async_session() as session:
+        query = await session.execute(text("SELECT to_regclass('last_exam_results') IS NOT NULL"))
+        return query.scalar()
+
+
+def test_table_ready_flag_is_not_set_when_transaction_rolls_back(pg_db):
+    manager = RequestsForSecondSection(year=2025, exam_type_id=4, subject_id=2)
+
+    async def scenario():
+        # Схема тестовой базы создаётся по моделям, а приложение создаёт last_exam_results само при первом запросе
+        async with async_session() as session:
+            await session.execute(text("DROP TABLE last_exam_results"))
+            await session.commit()
+        try:
+            # Таблица создаётся, но вставка падает: создание таблицы откатывается вместе с транзакцией
+            await manager._materializeLastRes(last_res_query("'not-a-uuid'::uuid"))
+        except Exception:
+            pass
+        return await table_exists()
+
+    assert pg_db(scenario()) is False
+    assert request_for_section_abc._lastResultsTableReady is False
+
+
+def test_table_ready_flag_is_set_after_commit(pg_db):
+    manager = RequestsForSecondSection(year=2025, exam_type_id=4, subject_id=2)
+
+    async def scenario():
+        run_id = await manager._materializeLastRes(last_res_query("gen_random_uuid()"))
+        async with async_session() as session:
+            query = await session.execute(text("SELECT count(*) FROM last_exam_results WHERE run_id = :run_id"), {"run_id": run_id})
+            return query.scalar()
+
+    assert pg_db(scenario()) == 1
+    assert request_for_section_abc._lastResultsTableReady is True
+
+
+async def run_ids() -> list:
+    async with async_session() as session:
+        query = await session.execute(text("SELECT DISTINCT run_id FROM last_exam_results"))
+        return [row[0] for row in query.all()]
+
+
+async def all_section_tables() -> list:
+    tables = []
+    for manager_class in promtService.SECTION_MANAGERS.values():
+        manager = manager_class(year=YEARS[-1], exam_type_id=4, subject_id=2)
+        async with async_session() as session:
+            tables += await manager.getListOfTables(session)
+    return tables
+
+
+def test_managers_of_all_sections_share_one_set(pg_db, monkeypatch):
+    async def scenario():
+        await seed()
+        materialized = await all_section_tables()
+        materialized_runs = await run_ids()
+        # Второй запрос отчёта - новые менеджеры, тот же набор
+        await all_section_tables()
+        reused_runs = await run_ids()
+        monkeypatch.setattr(request_for_section_abc, "PG_MATERIALIZE_LAST_RESULTS", False)
+        return materialized, materialized_runs, reused_runs, await all_section_tables()
+
+    materialized, materialized_runs, reused_runs, recomputed = pg_db(scenario())
+    assert len(materialized_runs) == 1
+    assert reused_runs == materialized_runs
+    assert materialized == recomputed
+
+
+def test_expired_sets_are_deleted_unless_still_reused(pg_db, monkeypatch):
+    monkeypatch.setattr(request_for_section_abc, "PG_LAST_RESULTS_TTL", 0)
+
+    async def materialize():
+        manager = RequestsForSecondSection(year=YEARS[-1], exam_type_id=4, subject_id=2)
+        return await manager._getLastResRunId()
+
+    async def scenario():
+        await seed()
+        first = await materialize()
+        # Срок повторного использования истёк: новый набор, а прежний ещё выдан менеджерам и не удаляется
+        second = await materialize()
+        kept = await run_ids()
+        third = await materialize()
+        return first, second, third, kept, await run_ids()
+
+    first, second, third, kept, left = pg_db(scenario())
+    assert len({first, second, third}) == 3
+    assert set(kept) == {first, second}
+    assert set(left) == {second, third}
@@ -0,0 +1,47 @@
+import asyncio
+import time
+
+from app.services.llm_service import llama_router
+from app.services.llm_service.llama_router import LLAMA_EJECT_AFTER_FAILURES
+
+
+def test_healthy_poll_keeps_backend_ejected_until_cooldown(fake_llama):
+    async def scenario():
+        async with fake_llama(urls=("http://llama-1", "http://llama-2")) as llama:
+            router = llama.client.router
+            backend = router.backends[0]
+            for _ in range(LLAMA_EJECT_AFTER_FAILURES):
+                router._mark_failed(backend)
+            await router._poll(backend)
+            still_ejected = not backend.is_available(time.monotonic())
+
+            backend.ejected_until = time.monotonic() - 1
+            await router._poll(backend)
+            return still_ejected, backend.is_available(time.monotonic()), backend.failures
+
+    assert asyncio.run(scenario()) == (True, True, 0)
+
+
+def test_ejection_is_logged(fake_llama, caplog):
+    async def scenario():
+        async with fake_llama() as llama:
+            router = llama.client.router
+            for _ in range(LLAMA_EJECT_AFTER_FAILURES):
+                router._mark_failed(router.backends[0])
+
+    with caplog.at_level("WARNING", logger=llama_router.__name__):
+        asyncio.run(scenario())
+    assert "ejected" in caplog.text
+
+
+def test_stream_fails_over_to_next_backend_before_first_chunk(fake_llama):
+    async def scenario():
+        async with fake_llama(urls=("http://llama-1", "http://llama-2")) as llama:
+            llama.network.down.add("llama-1")
+            payload = {"messages": [{"role": "user", "content": "промт"}], "max_tokens": 100}
+            chunks = [chunk async for chunk in llama.client.stream_chat_completion(payload)]
+            return chunks, [backend.failures for backend in llama.client.router.backends]
+
+    chunks, failures = asyncio.run(scenario())
+    assert chunks[-1]["choices"][0]["finish_reason"] == "stop"
+    assert failures == [1, 0]
@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from app.services.llm_service.llm_scheduler import LLMScheduler, LLMQueueFullError, Priority
+
+
+def test_rejects_when_queue_is_full():
+    async def scenario():
+        scheduler = LLMScheduler(capacity=1, queue_size=1)
+        release = asyncio.Event()
+
+        async def hold(reject_when_full: bool = True):
+            async with scheduler.slot(Priority.BULK, reject_when_full=reject_when_full):
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        assert (scheduler.running, len(scheduler._waiters)) == (1, 1)
+
+        with pytest.raises(LLMQueueFullError) as error:
+            async with scheduler.slot(Priority.BULK):
+                pass
+        assert error.value.retry_after > 0
+        assert scheduler.rejected == 1
+
+        # Без отклонения запрос встаёт в очередь сверх её размера
+        extra = asyncio.create_task(hold(reject_when_full=False))
+        await asyncio.sleep(0)
+        assert len(scheduler._waiters) == 2
+
+        release.set()
+        await asyncio.gather(running, waiting, extra)
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
+
+
+def test_waiting_requests_are_served_by_priority():
+    async def scenario():
+        scheduler = LLMScheduler(capacity=1, queue_size=10)
+        order = []
+        release = asyncio.Event()
+
+        async def run(name: str, priority: Priority):
+            async with scheduler.slot(priority, reject_when_full=False):
+                order.append(name)
+                if name == "first":
+                    await release.wait()
+
+        tasks = [asyncio.create_task(run("first", Priority.BULK))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(run("bulk", Priority.BULK)))
+        tasks.append(asyncio.create_task(run("interactive", Priority.INTERACTIVE)))
+        tasks.append(asyncio.create_task(run("bulk_2", Priority.BULK)))
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(scenario()) == ["first", "interactive", "bulk", "bulk_2"]
+
+
+def test_cancelled_waiter_leaves_queue():
+    async def scenario():
+        scheduler = LLMScheduler(capacity=1, queue_size=10)
+        release = asyncio.Event()
+
+        async def hold():
+            async with scheduler.slot(Priority.BULK):
+                await release.wait()
+
+        running = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(hold())
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        assert scheduler._waiters == []
+        release.set()
+        await running
+        assert scheduler.running == 0
+
+    asyncio.run(scenario())
@@ -0,0 +1,108 @@
+import asyncio
+import json
+
+from app.schemas.text_reports import TableStandart, LLMRequest, GenerateData
+from app.services.llm_service import llm_service
+from app.services.artifact_recorder.artifact_recorder import ArtifactRecorder
+
+
+def test_payload_leaves_slot_choice_to_llama():
+    for slot_key in (None, "1.7.", "2.5.", "map:2.5.:0"):
+        payload = llm_service.build_chat_payload("промт", slot_key)
+        assert payload["id_slot"] == -1
+        assert payload["cache_prompt"] is True
+
+
+def test_two_sections_run_in_two_slots_at_once(fake_llama):
+    async def scenario():
+        async with fake_llama(slots=2) as llama:
+            results = await asyncio.gather(
+                llm_service.generate_with_llama("промт раздела 1.7.", slot_key="1.7."),
+                llm_service.generate_with_llama("промт раздела 2.5.", slot_key="2.5."),
+            )
+            return results, llama.pool
+
+    results, pool = asyncio.run(scenario())
+    assert all("результаты" in text for text, _ in results)
+    assert pool.requested == [-1, -1]
+    assert pool.max_busy == 2
+
+
+def test_started_stream_waits_for_full_queue_instead_of_failing(fake_llama):
+    async def scenario():
+        async with fake_llama(slots=1, queue_size=1) as llama:
+            # Одна генерация идёт, одна ждёт: очередь заполнена
+            busy = [
+                asyncio.create_task(llm_service.generate_with_llama(f"занятый промт {i}", reject_when_full=False))
+                for i in range(2)
+            ]
+            await asyncio.sleep(0.01)
+            assert (llama.scheduler.running, len(llama.scheduler._waiters)) == (1, 1)
+            events = [
+                event async for event in
+                llm_service.stream_text_by_data(GenerateData(promt="потоковый промт", template=["llm_text"]))
+            ]
+            await asyncio.gather(*busy)
+            return events
+
+    events = asyncio.run(scenario())
+    assert not any(event.startswith("event: error") for event in events)
+    assert any(event.startswith("event: token") for event in events)
+
+
+MAP_TABLES = [
+    TableStandart(table_name=f"Таблица {i}", column_names=["Год", "Значение"], data=[[2025, i]])
+    for i in range(8)
+]
+
+
+def patch_map_reduce_data(monkeypatch) -> None:
+    """Данные раздела 2.5. для map-reduce без БД и Qdrant
+    """
+    async def get_promt_data(session, section_code, exam_year):
+        return MAP_TABLES, None, None
+
+    async def get_section_template(session, manager, section_code, request):
+        return ["llm_text"], []
+
+    monkeypatch.setattr(llm_service.promtService, "get_promt_data", get_promt_data)
+    monkeypatch.setattr(llm_service.promtService, "get_section_template", get_section_template)
+
+
+def test_map_calls_spread_over_free_slots(monkeypatch, fake_llama):
+    patch_map_reduce_data(monkeypatch)
+
+    async def scenario():
+        async with fake_llama(slots=2) as llama:
+            result = await llm_service.generate_text_map_reduce(None, LLMRequest(year=2025), "2.5.")
+            return result, llama.pool
+
+    result, pool = asyncio.run(scenario())
+    assert (result.mode, result.error) == ("map_reduce", "")
+    # Этапы map по числу групп и итоговый этап reduce
+    assert pool.requested == [-1] * (len(llm_service.promtService.get_map_groups("2.5.", len(MAP_TABLES))) + 1)
+    assert pool.max_busy == 2
+
+
+def test_map_reduce_records_stage_promts_and_result(monkeypatch, fake_llama, tmp_path):
+    patch_map_reduce_data(monkeypatch)
+    recorder = ArtifactRecorder(str(tmp_path / "artifacts.jsonl"), max_bytes=1024 * 1024, backup_count=1, enabled=True)
+    monkeypatch.setattr(llm_service, "artifact_recorder", recorder)
+
+    async def scenario():
+        async with fake_llama(slots=2):
+            return await llm_service.generate_text_map_reduce(None, LLMRequest(year=2025), "2.5.", request_id="job-1")
+
+    recorder.start()
+    try:
+        result = asyncio.run(scenario())
+    finally:
+        recorder.close()
+    records = [json.loads(line) for line in (tmp_path / "artifacts.jsonl").read_text(encoding="utf-8").splitlines()]
+    groups_count = len(llm_service.promtService.get_map_groups("2.5.", len(MAP_TABLES)))
+
+    assert {record["request_id"] for record in records} == {"job-1"}
+    kinds = [record["kind"] for record in records]
+    assert kinds.count("map_promt") == kinds.count("map_result") == groups_count
+    assert kinds[-2:] == ["promt", "result"]
+    assert records[-1]["text"] == result.text
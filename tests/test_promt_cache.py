@@ -0,0 +1,96 @@
+import asyncio
+
+import pytest
+
+from app.schemas.text_reports import LLMRequest, TableStandart
+from app.services.llm_service import promt as promtService
+from app.services.llm_service.promt_cache import PromtCache
+from app.services.report_pipeline.report_pipeline import ReportPipeline
+from app.storage.postgresql import request_for_section_abc
+
+
+TABLES = [TableStandart(table_name="Результаты", column_names=["Год", "Балл"], data=[[2025, 60]])]
+
+
+@pytest.fixture
+def loads(monkeypatch):
+    """Кэш промтов без БД (версия данных постоянна) и данные раздела 2.5. со счётчиком загрузок из БД и Qdrant
+    """
+    cache = PromtCache(max_entries=8)
+
+    async def get_db_version():
+        return (1,)
+
+    monkeypatch.setattr(cache, "get_db_version", get_db_version)
+    monkeypatch.setattr(promtService, "promt_cache", cache)
+    monkeypatch.setattr(promtService, "PROMT_BUDGET_ENABLED", False)
+    monkeypatch.setattr(request_for_section_abc, "PG_MATERIALIZE_LAST_RESULTS", False)
+    counter = {"tables": 0, "examples": 0}
+
+    async def get_promt_data(session, section_code, exam_year):
+        counter["tables"] += 1
+        counter["examples"] += 1
+        return TABLES, None, None
+
+    async def get_section_tables(manager):
+        counter["tables"] += 1
+        return TABLES
+
+    def get_section_example(manager, section_code, exam_year):
+        counter["examples"] += 1
+        return None
+
+    async def get_section_template(session, manager, section_code, request):
+        return ["obligatury_text-0", "llm_text"], ["Обязательный текст"]
+
+    monkeypatch.setattr(promtService, "get_promt_data", get_promt_data)
+    monkeypatch.setattr(promtService, "get_section_tables", get_section_tables)
+    monkeypatch.setattr(promtService, "get_section_example", get_section_example)
+    monkeypatch.setattr(promtService, "get_section_template", get_section_template)
+    return counter
+
+
+def pipeline_promt(request: LLMRequest):
+    return ReportPipeline(request=request, section_codes=["2.5."])._promt("2.5.")
+
+
+def test_pipeline_reuses_promt_cached_by_single_request(loads):
+    async def scenario():
+        single = await promtService.get_report_generate_data(None, LLMRequest(year=2025, user_input="первый"), "2.5.")
+        pipeline = await pipeline_promt(LLMRequest(year=2025, user_input="второй"))
+        return single, pipeline
+
+    single, pipeline = asyncio.run(scenario())
+    assert loads == {"tables": 1, "examples": 1}
+    assert pipeline.promt == single.promt.replace("первый", "второй")
+    assert pipeline.promt.endswith(promtService.build_user_block("второй"))
+    assert (pipeline.template, pipeline.obligatury_text) == (single.template, single.obligatury_text)
+
+
+def test_single_request_reuses_promt_cached_by_pipeline(loads):
+    async def scenario():
+        pipeline = await pipeline_promt(LLMRequest(year=2025))
+        single = await promtService.get_report_generate_data(None, LLMRequest(year=2025), "2.5.")
+        return pipeline, single
+
+    pipeline, single = asyncio.run(scenario())
+    assert loads == {"tables": 1, "examples": 1}
+    assert single.promt == pipeline.promt
+
+
+def test_map_reduce_data_is_shared_with_single_request(loads):
+    async def scenario():
+        section = await promtService.get_section_data(None, LLMRequest(year=2025), "2.5.")
+        again = await promtService.get_section_data(None, LLMRequest(year=2025), "2.5.")
+        single = await promtService.get_report_generate_data(None, LLMRequest(year=2025), "2.5.")
+        manager = promtService.SECTION_MANAGERS["2.5."](year=2025, exam_type_id=4, subject_id=2)
+        cached = promtService.promt_cache.get(await promtService.get_promt_cache_key(manager, LLMRequest(year=2025), "2.5."))
+        return section, again, single, cached
+
+    section, again, single, cached = asyncio.run(scenario())
+    assert loads == {"tables": 1, "examples": 1}
+    assert again is section
+    assert (section.tables, section.obligatury_text) == (TABLES, ["Обязательный текст"])
+    # Промт собран по данным из map-reduce, и его префикс запомнен для следующих запросов
+    assert cached.prefix is not None
+    assert single.promt == cached.prefix + promtService.build_user_block("")
@@ -0,0 +1,114 @@
+import asyncio
+
+from app.db.connect_db import async_session
+from app.schemas.text_reports import LLMRequest, TableStandart
+from app.services.llm_service import llm_service
+from app.services.llm_service import promt as promtService
+from app.services.report_pipeline.report_pipeline import ReportPipeline
+from app.storage.postgresql import request_for_section_abc
+from exam_data import YEARS, seed
+
+
+TABLES = [
+    TableStandart(table_name=f"Таблица {i}", column_names=["Год", "Значение"], data=[[2025, i]])
+    for i in range(8)
+]
+
+
+def no_example(manager, section_code, exam_year):
+    return None
+
+
+def patch_section_data(monkeypatch) -> None:
+    """Данные разделов без БД и Qdrant
+    """
+    async def get_section_tables(manager):
+        return TABLES
+
+    async def get_section_template(session, manager, section_code, request):
+        return ["llm_text"], []
+
+    monkeypatch.setattr(request_for_section_abc, "PG_MATERIALIZE_LAST_RESULTS", False)
+    monkeypatch.setattr(promtService, "PROMT_BUDGET_ENABLED", False)
+    monkeypatch.setattr(promtService, "get_section_tables", get_section_tables)
+    monkeypatch.setattr(promtService, "get_section_example", no_example)
+    monkeypatch.setattr(promtService, "get_section_template", get_section_template)
+
+
+def run_report(fake_llama, mode: str | None = None):
+    async def scenario():
+        async with fake_llama(slots=2):
+            return await ReportPipeline(LLMRequest(year=2025), ["1.7.", "2.5."], mode=mode).run()
+
+    return asyncio.run(scenario())
+
+
+def test_sections_use_their_default_mode(monkeypatch, fake_llama):
+    patch_section_data(monkeypatch)
+    monkeypatch.setattr(llm_service, "LLAMA_MAP_REDUCE_SECTIONS", ["2.5."])
+
+    report = run_report(fake_llama)
+
+    assert [(section.error, section.response.mode) for section in report.sections] == [("", "single"), ("", "map_reduce")]
+
+
+def test_explicit_mode_applies_to_all_sections(monkeypatch, fake_llama):
+    patch_section_data(monkeypatch)
+    monkeypatch.setattr(llm_service, "LLAMA_MAP_REDUCE_SECTIONS", ["2.5."])
+
+    report = run_report(fake_llama, mode="single")
+
+    assert [section.response.mode for section in report.sections] == ["single", "single"]
+
+
+def test_managers_of_all_sections_read_one_last_results_set(pg_db, monkeypatch):
+    materialized = []
+    materialize = request_for_section_abc.RequestsForSections._materializeLastRes
+
+    async def counting_materialize(self, query):
+        run_id = await materialize(self, query)
+        materialized.append(run_id)
+        return run_id
+
+    monkeypatch.setattr(request_for_section_abc.RequestsForSections, "_materializeLastRes", counting_materialize)
+    # Общий набор процесса не переиспользуется: один набор на отчёт даёт только узел графа
+    monkeypatch.setattr(request_for_section_abc, "PG_LAST_RESULTS_TTL", 0)
+    monkeypatch.setattr(promtService, "get_section_example", no_example)
+
+    async def scenario():
+        await seed()
+        pipeline = ReportPipeline(LLMRequest(year=YEARS[-1]), list(promtService.SECTION_MANAGERS))
+        sections = await asyncio.gather(*(pipeline._section_data(section_code) for section_code in pipeline.section_codes))
+        managers = [(await pipeline._manager(section_code))[1] for section_code in pipeline.section_codes]
+        recomputed = []
+        monkeypatch.setattr(request_for_section_abc, "PG_MATERIALIZE_LAST_RESULTS", False)
+        for manager_class in promtService.SECTION_MANAGERS.values():
+            async with async_session() as session:
+                recomputed.append(await manager_class(year=YEARS[-1], exam_type_id=4, subject_id=2).getListOfTables(session))
+        return [section.tables for _, section, _ in sections], managers, recomputed
+
+    tables, managers, recomputed = pg_db(scenario())
+    assert len(materialized) == 1
+    assert all(list(manager._lastResults.values()) == materialized for manager in managers)
+    assert tables == recomputed
+
+
+def test_section_fails_when_data_is_not_gathered_in_time(monkeypatch):
+    patch_section_data(monkeypatch)
+    monkeypatch.setattr(promtService, "PROMT_DATA_TIMEOUT", 0.05)
+
+    async def get_section_tables(manager):
+        await asyncio.sleep(10)
+
+    monkeypatch.setattr(promtService, "get_section_tables", get_section_tables)
+
+    async def scenario():
+        pipeline = ReportPipeline(LLMRequest(year=2025), ["1.7.", "2.5."])
+        started_at = asyncio.get_running_loop().time()
+        report = await pipeline.run()
+        return report, asyncio.get_running_loop().time() - started_at, pipeline._nodes
+
+    report, elapsed, nodes = asyncio.run(scenario())
+    assert elapsed < 1
+    assert all(section.error.startswith("Prompt data for section") for section in report.sections)
+    assert all(task.done() for task in nodes.values())
@@ -0,0 +1,94 @@
+import asyncio
+import threading
+
+from app.schemas.qdrant import QdrantReportSection, QdrantReportData
+from app.services.llm_service import promt as promtService
+from app.services.qdrant_service import qdrant_service, section_examples as section_examples_module
+from app.services.qdrant_service.section_examples import SectionExamplesIndex
+
+
+def section(text: str) -> QdrantReportSection:
+    return QdrantReportSection(code="2.5.", name="Результаты", text=text)
+
+
+class FakeStorage:
+    """
+    Хранилище Qdrant в памяти: разделы отчётов и число полных загрузок индекса
+    """
+    sections: list[tuple[int, int, int, QdrantReportSection]] = []
+    loads = 0
+
+    def get_all_sections(self):
+        type(self).loads += 1
+        return list(self.sections)
+
+    def get_section_data_by_params(self, subject, exam_type, year, section_code):
+        return None
+
+    def delete_report(self, report_id):
+        type(self).sections = []
+
+
+class FakeResponse:
+    ok = False
+    status_code = 503
+
+
+def make_index(monkeypatch) -> SectionExamplesIndex:
+    monkeypatch.setattr(FakeStorage, "sections", [(2, 4, 2024, section("Пример 2024"))])
+    monkeypatch.setattr(FakeStorage, "loads", 0)
+    monkeypatch.setattr(section_examples_module, "QdrantReportsStorage", FakeStorage)
+    monkeypatch.setattr(qdrant_service, "QdrantReportsStorage", FakeStorage)
+    index = SectionExamplesIndex(enabled=True)
+    monkeypatch.setattr(qdrant_service, "section_examples", index)
+    return index
+
+
+def test_delete_report_bumps_version_and_reloads(monkeypatch):
+    index = make_index(monkeypatch)
+    assert index.get(2, 4, 2024, "2.5.").text == "Пример 2024"
+    version = index.version
+
+    asyncio.run(qdrant_service.QdrantReportsService().delete_report("report-id"))
+
+    assert index.version > version
+    assert index.get(2, 4, 2024, "2.5.") is None
+    assert FakeStorage.loads == 2
+
+
+def test_add_report_bumps_version_and_reloads(monkeypatch):
+    index = make_index(monkeypatch)
+    index.get(2, 4, 2024, "2.5.")
+    version = index.version
+
+    def post(url, json):
+        FakeStorage.sections = FakeStorage.sections + [(2, 4, 2025, section("Пример 2025"))]
+        return FakeResponse()
+
+    monkeypatch.setattr(qdrant_service.requests, "post", post)
+    service = qdrant_service.QdrantReportsService()
+    service.vectoriser_port = "8000"
+    asyncio.run(service.add_report(QdrantReportData(year=2025, title="Отчёт", subject=2, exam_type=4, sections=[section("Пример 2025")])))
+
+    assert index.version > version
+    assert index.get(2, 4, 2025, "2.5.").text == "Пример 2025"
+    assert FakeStorage.loads == 2
+
+
+def test_sequential_promt_data_reads_example_off_the_event_loop(monkeypatch):
+    threads = []
+
+    async def getTablesBySection(session, section_code, exam_year):
+        return [], None
+
+    def get_section_example(manager, section_code, exam_year):
+        threads.append(threading.current_thread())
+        return None
+
+    monkeypatch.setattr(promtService, "PROMT_DATA_CONCURRENT", False)
+    monkeypatch.setattr(promtService, "getTablesBySection", getTablesBySection)
+    monkeypatch.setattr(promtService, "get_section_example", get_section_example)
+
+    asyncio.run(promtService.get_promt_data(session=None, section_code="2.5.", exam_year=2025))
+
+    assert threads and threads[0] is not threading.main_thread()
@@ -0,0 +1,34 @@
+from decimal import Decimal
+
+from app.db.connect_db import async_session
+from app.storage.postgresql.request_for_section_two import RequestsForSecondSection
+from exam_data import YEARS, seed
+
+
+BREAKDOWN_TABLES = ["getTable_resultByStudCat", "getTable_resultBySchoolKinds", "getTable_resultBySex", "getTable_resultByAreas"]
+
+
+def test_procent_value_rounds_half_up_like_postgresql():
+    manager = RequestsForSecondSection(year=2025, exam_type_id=4, subject_id=2)
+    assert manager._calculteProcentValue(1, 16) == Decimal("6.3")
+    assert manager._calculteProcentValue(1, 3) == Decimal("33.3")
+    assert manager._calculteProcentValue(2, 3) == Decimal("66.7")
+    assert manager._calculteProcentValue(5, 5) == Decimal("100.0")
+    assert manager._calculteProcentValue(None, 7) == Decimal("0.0")
+
+
+def test_grouping_sets_breakdowns_match_per_table_queries(pg_db):
+    async def tables(use_breakdowns: bool) -> dict:
+        manager = RequestsForSecondSection(year=YEARS[-1], exam_type_id=4, subject_id=2)
+        manager.useBreakdowns = use_breakdowns
+        async with async_session() as session:
+            return {name: await getattr(manager, name)(session) for name in BREAKDOWN_TABLES}
+
+    async def scenario():
+        await seed()
+        return await tables(use_breakdowns=True), await tables(use_breakdowns=False)
+
+    grouped, separate = pg_db(scenario())
+    for name in BREAKDOWN_TABLES:
+        assert grouped[name].data, name
+        assert grouped[name] == separate[name], name
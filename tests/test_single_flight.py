@@ -0,0 +1,101 @@
+import asyncio
+
+from app.services.llm_service.single_flight import SingleFlight
+
+
+def test_identical_requests_share_one_generation():
+    async def scenario():
+        flights = SingleFlight()
+        calls = 0
+        release = asyncio.Event()
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return "ответ"
+
+        first = asyncio.create_task(flights.run("key", generate))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.run("key", generate))
+        await asyncio.sleep(0)
+        release.set()
+        return await first, await second, calls, flights.is_running("key")
+
+    first, second, calls, running = asyncio.run(scenario())
+    assert first == ("ответ", False)
+    assert second == ("ответ", True)
+    assert calls == 1
+    assert not running
+
+
+def test_late_stream_subscriber_gets_chunks_from_start():
+    async def scenario():
+        flights = SingleFlight()
+        second_chunk = asyncio.Event()
+
+        async def generate():
+            yield "начало "
+            await second_chunk.wait()
+            yield "конец"
+
+        first_chunks = []
+        first_stream = flights.stream("key", generate)
+        first_chunks.append(await first_stream.__anext__())
+
+        async def read_all(stream):
+            return [chunk async for chunk in stream]
+
+        late = asyncio.create_task(read_all(flights.stream("key", generate)))
+        await asyncio.sleep(0)
+        second_chunk.set()
+        first_chunks += [chunk async for chunk in first_stream]
+        return first_chunks, await late
+
+    first, late = asyncio.run(scenario())
+    assert first == ["начало ", "конец"]
+    assert late == ["начало ", "конец"]
+
+
+def test_generation_continues_while_someone_waits():
+    async def scenario():
+        flights = SingleFlight()
+        release = asyncio.Event()
+
+        async def generate():
+            await release.wait()
+            return "ответ"
+
+        first = asyncio.create_task(flights.run("key", generate))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(flights.run("key", generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.gather(first, return_exceptions=True)
+        release.set()
+        return await second
+
+    assert asyncio.run(scenario()) == ("ответ", True)
+
+
+def test_generation_is_cancelled_when_everyone_leaves():
+    async def scenario():
+        flights = SingleFlight()
+        cancelled = asyncio.Event()
+
+        async def generate():
+            try:
+                await asyncio.Event().wait()
+            except asyncio.CancelledError:
+                cancelled.set()
+                raise
+
+        waiters = [asyncio.create_task(flights.run("key", generate)) for _ in range(2)]
+        await asyncio.sleep(0)
+        for waiter in waiters:
+            waiter.cancel()
+        await asyncio.gather(*waiters, return_exceptions=True)
+        await asyncio.wait_for(cancelled.wait(), 1)
+        return flights.is_running("key")
+
+    assert asyncio.run(scenario()) is False
@@ -0,0 +1,61 @@
+import pytest
+
+from app.schemas.text_reports import TableStandart
+from app.services.llm_service.table_format import serialize_table, format_cell
+
+
+TABLE = TableStandart(
+    table_name="Результаты",
+    column_names=["№ п/п", "Доля участников | ниже минимального", "Доля участников | от 81 до 100 баллов"],
+    data=[["1.", 12.5, 3.0], ["2.", 0.04, 100]],
+)
+
+
+def test_format_cell_drops_trailing_zeros():
+    assert format_cell(3.0) == "3"
+    assert format_cell(12.46) == "12.5"
+    assert format_cell(0.04) == "0"
+    assert format_cell(100) == "100"
+    assert format_cell("1.") == "1."
+
+
+def test_markdown():
+    assert serialize_table(TABLE, "markdown") == (
+        "|№ п/п|Доля участников, ниже минимального|Доля участников, от 81 до 100 баллов|\n"
+        "|-|-|-|\n"
+        "|1.|12.5|3.0|\n"
+        "|2.|0.04|100|\n"
+    )
+
+
+def test_compact_markdown_rounds_values():
+    assert serialize_table(TABLE, "markdown_compact") == (
+        "|№ п/п|Доля участников, ниже минимального|Доля участников, от 81 до 100 баллов|\n"
+        "|-|-|-|\n"
+        "|1.|12.5|3|\n"
+        "|2.|0|100|\n"
+    )
+
+
+def test_grouped_markdown_writes_common_header_once():
+    assert serialize_table(TABLE, "grouped") == (
+        "||Доля участников||\n"
+        "|№ п/п|ниже минимального|от 81 до 100 баллов|\n"
+        "|-|-|-|\n"
+        "|1.|12.5|3|\n"
+        "|2.|0|100|\n"
+    )
+
+
+def test_tsv_abbreviates_long_headers():
+    assert serialize_table(TABLE, "tsv") == (
+        "№ п/п\tК1\tК2\n"
+        "1.\t12.5\t3\n"
+        "2.\t0\t100\n"
+        "Обозначения: К1 - Доля участников, ниже минимального; К2 - Доля участников, от 81 до 100 баллов\n"
+    )
+
+
+def test_unknown_format():
+    with pytest.raises(ValueError):
+        serialize_table(TABLE, "html")